@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Nifty OHLC Trading Strategy Returns Calculator
+
+Generates seeded synthetic OHLC files of any size and times each phase of a
+run separately:
+- parse: separator sniffing and the single read_csv pass
+- clean: date/number coercion, sorting and OHLC validation
+- run_strategy, calculate_statistics and the generate_trade_log CSV write
+
+Every size runs in a fresh process so its peak RSS is measured in isolation.
+Results are written as JSON; a stored baseline makes the run fail when a phase
+regresses beyond the allowed threshold.
+
+Author: SMBC Trading Analytics
+Date: October 2025
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import nifty_returns_calculator as nrc
+
+
+PHASES = ['parse', 'clean', 'run_strategy', 'calculate_statistics', 'generate_trade_log']
+DEFAULT_SIZES = '10k,100k,1m'
+
+# Synthetic bars are one minute apart at every size: 50m daily bars would run
+# past the last date datetime64[ns] can hold, and one timestamp format keeps
+# the parse phase comparable across sizes
+BAR_FREQUENCY = 'min'
+BAR_DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def generate_synthetic_ohlc(n_bars, seed=0, start='1990-01-01', base_price=10000.0, volatility=0.01):
+    """
+    Generate a seeded random-walk OHLC series that load_data accepts unchanged.
+    
+    Prices are rounded to two decimals and High/Low are then widened to cover
+    the rounded Open/Close, so every row satisfies High >= max(Open, Close),
+    Low <= min(Open, Close) and Low > 0. Dates are consecutive minutes
+    (BAR_FREQUENCY) at every size. Roughly one bar in fifty has High == Low (no trading opportunity).
+    
+    Args:
+        n_bars (int): Number of bars
+        seed (int): Random seed
+        start (str): First timestamp
+        base_price (float): Starting price level
+        volatility (float): Daily log-return standard deviation
+    
+    Returns:
+        pandas.DataFrame: Date, Open, High, Low, Close columns
+    """
+    rng = np.random.default_rng(seed)
+    
+    close = base_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = close * np.exp(rng.normal(0, volatility / 2, n_bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n_bars)))
+    
+    open_, high, low, close = (np.round(values, 2) for values in (open_, high, low, close))
+    
+    # Flat bars: every price equal
+    flat = rng.random(n_bars) < 0.02
+    high[flat] = low[flat] = open_[flat] = close[flat]
+    
+    # Re-establish the invariants after rounding
+    high = np.maximum.reduce([high, open_, close])
+    low = np.maximum(np.minimum.reduce([low, open_, close]), 0.01)
+    
+    dates = pd.date_range(pd.Timestamp(start), periods=n_bars, freq=BAR_FREQUENCY)
+    
+    return pd.DataFrame({'Date': dates, 'Open': open_, 'High': high, 'Low': low, 'Close': close})
+
+
+def write_synthetic_csv(path, n_bars, seed=0, chunk_bars=1_000_000):
+    """
+    Write a synthetic OHLC CSV in chunks so huge sizes never sit in memory at once.
+    
+    Chunks are generated from consecutive child seeds and chained on price
+    and date, so a file is fully determined by (n_bars, seed, chunk_bars).
+    """
+    seeds = np.random.SeedSequence(seed).spawn(max(1, -(-n_bars // chunk_bars)))
+    start = pd.Timestamp('1990-01-01')
+    step = pd.Timedelta(1, unit=BAR_FREQUENCY)
+    price = 10000.0
+    
+    with open(path, 'w', newline='') as f:
+        for i, child in enumerate(seeds):
+            size = min(chunk_bars, n_bars - i * chunk_bars)
+            chunk = generate_synthetic_ohlc(size, seed=child, start=start, base_price=price)
+            chunk.to_csv(f, index=False, header=(i == 0), date_format=BAR_DATE_FORMAT)
+            price = float(chunk['Close'].iloc[-1])
+            start = start + size * step
+
+
+def parse_size(text):
+    """
+    Parse a bar count such as '10k', '2.5m' or '50000'.
+    """
+    text = text.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if multiplier != 1 else text
+    return int(float(number) * multiplier)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None where unsupported.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _timed(timings, phase, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[phase] = time.perf_counter() - start
+    return result
+
+
+def run_benchmark_case(data_file, capital, risk, trade_type, engine, repeat, trade_log):
+    """
+    Time every phase on one data file; executed in a fresh worker process.
+    
+    Returns:
+        dict: Bars, trades, best-of-``repeat`` phase times in seconds and peak RSS
+    """
+    best = {}
+    rows = trades = 0
+    
+    for _ in range(repeat):
+        timings = {}
+        calculator = nrc.NiftyTradeCalculator(initial_capital=capital, risk_per_trade=risk)
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            layout = nrc.sniff_ohlc_format(data_file)
+            raw, _ = _timed(timings, 'parse', nrc.read_ohlc_columns, data_file, layout)
+            df = _timed(timings, 'clean', calculator.clean_ohlc, raw)
+            _timed(timings, 'run_strategy', calculator.run_strategy, df, trade_type=trade_type, engine=engine)
+            _timed(timings, 'calculate_statistics', calculator.calculate_statistics)
+            _timed(timings, 'generate_trade_log', calculator.generate_trade_log, trade_log)
+        
+        rows, trades = len(df), len(calculator.trades)
+        for phase, seconds in timings.items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+        del raw, df, calculator
+    
+    best['total'] = sum(best[phase] for phase in PHASES)
+    return {
+        'bars': rows,
+        'trades': trades,
+        'bars_per_second': rows / best['run_strategy'] if best['run_strategy'] else None,
+        'seconds': best,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold, rss_threshold):
+    """
+    List phases (and peak RSS) that regressed against a stored baseline.
+    
+    Phases shorter than 10 ms in the baseline are skipped as timer noise.
+    
+    Returns:
+        list: Human-readable regression messages (empty if none)
+    """
+    reference = {case['bars']: case for case in baseline.get('results', [])}
+    regressions = []
+    
+    for case in results:
+        base = reference.get(case['bars'])
+        if base is None:
+            continue
+        for phase, seconds in case['seconds'].items():
+            base_seconds = base['seconds'].get(phase)
+            if base_seconds is None or base_seconds < 0.01:
+                continue
+            if seconds > base_seconds * (1 + threshold):
+                regressions.append(f"{case['bars']:,} bars / {phase}: {seconds:.3f}s vs "
+                                   f"baseline {base_seconds:.3f}s (+{seconds / base_seconds - 1:.0%})")
+        if case['peak_rss_mb'] and base.get('peak_rss_mb'):
+            if case['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_threshold):
+                regressions.append(f"{case['bars']:,} bars / peak RSS: {case['peak_rss_mb']:.0f} MB vs "
+                                   f"baseline {base['peak_rss_mb']:.0f} MB")
+    
+    return regressions
+
+
+def main():
+    """
+    Run the benchmark suite from the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Nifty returns calculator on synthetic OHLC data',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default sizes (10k, 100k, 1m bars), results to benchmark_results.json
+  python nifty_benchmark.py
+  
+  # Record a baseline, then fail later runs that are >25% slower
+  python nifty_benchmark.py --sizes 10k,1m --save-baseline benchmark_baseline.json
+  python nifty_benchmark.py --sizes 10k,1m --baseline benchmark_baseline.json
+  
+  # Large sizes, keeping the generated files for later runs
+  python nifty_benchmark.py --sizes 10m,50m --data-dir bench_data
+        """
+    )
+    
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f'Comma-separated bar counts, k/m suffixes allowed (default: {DEFAULT_SIZES})')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data (default: 0)')
+    parser.add_argument('--capital', type=float, default=1e12,
+                        help='Initial capital; large so trades keep executing (default: 1e12)')
+    parser.add_argument('--risk', type=float, default=0.001, help='Risk per trade (default: 0.001)')
+    parser.add_argument('--type', choices=['long', 'short', 'both'], default='both',
+                        help='Type of trades to execute (default: both)')
+    parser.add_argument('--engine', choices=list(nrc.ENGINES), default='array',
+                        help='Backtest engine to time (default: array)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per size; best time is kept (default: 1)')
+    parser.add_argument('--data-dir', help='Keep generated data files here and reuse them on later runs')
+    parser.add_argument('--output', '-o', default='benchmark_results.json',
+                        help='Output JSON file (default: benchmark_results.json)')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against; regressions fail the run')
+    parser.add_argument('--save-baseline', help='Also save these results as a baseline JSON')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown per phase as a fraction (default: 0.25)')
+    parser.add_argument('--rss-threshold', type=float, default=0.25,
+                        help='Allowed peak RSS growth as a fraction (default: 0.25)')
+    
+    args = parser.parse_args()
+    
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    except ValueError:
+        parser.error(f"invalid --sizes: {args.sizes}")
+    
+    with tempfile.TemporaryDirectory(prefix='nifty_bench_') as tmpdir:
+        data_dir = Path(args.data_dir or tmpdir)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        
+        for n_bars in sizes:
+            data_file = data_dir / f"synthetic_{n_bars}_seed{args.seed}_{BAR_FREQUENCY}.csv"
+            if not data_file.exists():
+                print(f"Generating {n_bars:,} bars -> {data_file}")
+                write_synthetic_csv(data_file, n_bars, seed=args.seed)
+            
+            # A fresh process per size keeps peak RSS measurements independent
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(
+                    run_benchmark_case, str(data_file), args.capital, args.risk, args.type,
+                    args.engine, args.repeat, os.path.join(tmpdir, 'trades.csv')
+                ).result()
+            
+            results.append(case)
+            phases = '  '.join(f"{phase}={case['seconds'][phase]:.3f}s" for phase in PHASES)
+            rss = f"{case['peak_rss_mb']:.0f} MB" if case['peak_rss_mb'] else 'n/a'
+            print(f"{n_bars:>12,} bars  {case['trades']:>10,} trades  {phases}  peak RSS {rss}")
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'engine': args.engine,
+            'trade_type': args.type,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {args.output}")
+    
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.save_baseline}")
+    
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.rss_threshold)
+        if regressions:
+            print("\n❌ Performance regressions:")
+            for message in regressions:
+                print(f"  - {message}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,482 +15,4620 @@ Author: SMBC Trading Analytics
 Date: October 2025
 """
 
-import pandas as pd
-import numpy as np
 import argparse
+import contextlib
+import csv
+import glob
+import gzip
+import hashlib
+import heapq
+import importlib
+import inspect
+import io
+import itertools
+import json
+import os
+import shutil
+import sqlite3
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 
 
-class NiftyTradeCalculator:
+class _LazyModule:
     """
-    Calculator for Nifty trading returns based on OHLC strategy with risk management.
+    Stand-in for a heavy module that is imported on first attribute access.
+    
+    pandas and NumPy dominate start-up time, so they are only imported once
+    a command touches data: ``--help`` and argument errors return without
+    them. The first access replaces the stand-in in this module's globals
+    with the real module, so later lookups cost nothing extra.
     """
     
-    def __init__(self, initial_capital=100000, risk_per_trade=0.02):
-        """
-        Initialize the calculator with capital and risk parameters.
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+    
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+pd = _LazyModule('pandas', 'pd')
+np = _LazyModule('numpy', 'np')
+
+
+ENGINES = ('array', 'rows', 'fractional')
+
+# Direction codes stored in TradeStore: the code is the index into this tuple
+DIRECTIONS = ('LONG', 'SHORT')
+LONG = 0
+SHORT = 1
+
+
+SEPARATORS = [',', '\t', ';', '|']
+SEPARATOR_NAMES = {',': 'comma', '\t': 'tab', ';': 'semicolon', '|': 'pipe'}
+OHLC_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close']
+SNIFF_BYTES = 64 * 1024
+
+
+def _map_ohlc_column(name):
+    """
+    Map a header name to its standard OHLC column (case-insensitive), or None.
+    """
+    name = name.lower()
+    for column in OHLC_COLUMNS:
+        if column.lower() in name:
+            return column
+    return None
+
+
+def sniff_ohlc_format(filepath, sample_bytes=SNIFF_BYTES):
+    """
+    Detect the separator and header layout of an OHLC file from its first bytes.
+    
+    The first separator (in SEPARATORS order) that splits the header line
+    into at least five fields, with the same field count on every sampled
+    data line, wins; csv.Sniffer is consulted only when none does. The
+    header is then matched case-insensitively against Date/Open/High/Low/Close.
+    A file whose first line names none of them but has at least five fields
+    is treated as headerless Date, Open, High, Low, Close.
+    
+    Args:
+        filepath (str or Path): Path to the data file
+        sample_bytes (int): Number of leading bytes to inspect
         
-        Args:
-            initial_capital (float): Starting capital amount (default: 100,000)
-            risk_per_trade (float): Maximum risk per trade as fraction (default: 0.02 for 2%)
-        """
-        self.initial_capital = initial_capital
-        self.current_capital = initial_capital
-        self.risk_per_trade = risk_per_trade
-        self.trades = []
+    Returns:
+        dict: 'separator', 'header' (True/False), 'usecols' (positional
+        indices), 'names' (standard names in usecols order), 'columns'
+        (total field count) and 'method' describing how it was detected
         
-    def load_data(self, filepath):
-        """
-        Load OHLC data from CSV or TXT file.
+    Raises:
+        ValueError: If no separator yields Date + OHLC columns
+    """
+    with open(filepath, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        sample = f.read(sample_bytes)
+    
+    lines = [line for line in sample.splitlines() if line.strip()]
+    if len(sample) == sample_bytes and len(lines) > 1:
+        # The last line is probably cut off
+        lines = lines[:-1]
+    if not lines:
+        raise ValueError("Unable to parse file. Expected columns: Date, Open, High, Low, Close")
+    
+    separator = None
+    method = 'header line'
+    for sep in SEPARATORS:
+        rows = list(csv.reader(lines[:50], delimiter=sep))
+        if len(rows[0]) >= 5 and all(len(row) == len(rows[0]) for row in rows[1:]):
+            separator = sep
+            break
+    
+    if separator is None:
+        try:
+            separator = csv.Sniffer().sniff('\n'.join(lines[:50]), delimiters=''.join(SEPARATORS)).delimiter
+            method = 'csv.Sniffer'
+        except csv.Error:
+            separator = None
+    
+    header = next(csv.reader(lines[:1], delimiter=separator)) if separator else []
+    if len(header) < 5:
+        raise ValueError("Unable to parse file. Expected columns: Date, Open, High, Low, Close")
+    
+    positions = {}
+    for index, name in enumerate(header):
+        column = _map_ohlc_column(name.strip())
+        if column and column not in positions:
+            positions[column] = index
+    
+    has_header = True
+    if not positions:
+        # No recognizable names: assume a headerless Date, Open, High, Low, Close file
+        has_header = False
+        positions = {column: index for index, column in enumerate(OHLC_COLUMNS)}
+    
+    missing = set(OHLC_COLUMNS) - set(positions)
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+    
+    usecols = sorted(positions.values())
+    names_by_index = {index: column for column, index in positions.items()}
+    
+    return {
+        'separator': separator,
+        'header': has_header,
+        'usecols': usecols,
+        'names': [names_by_index[index] for index in usecols],
+        'columns': len(header),
+        'method': method,
+    }
+
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'nifty_calculator'
+# Bump when load_data's cleaning rules change so stale entries are re-parsed
+DATA_CACHE_VERSION = 3
+
+
+def file_content_hash(filepath, chunk_size=1 << 20):
+    """
+    Hash a file's contents (BLAKE2b, 128-bit hex digest).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_ohlc_columns(source, layout, header=None):
+    """
+    Parse the five mapped columns of an OHLC file in one pass.
+    
+    Args:
+        source (str, Path or file): Path, or a binary file positioned at the
+            first line to read
+        layout (dict): Layout as returned by sniff_ohlc_format
+        header (bool, optional): Whether the first line read is a header
+            (default: layout['header'])
         
-        Expected format: Date, Open, High, Low, Close
-        Handles various date formats and separators (comma, tab, semicolon).
+    Returns:
+        tuple: (DataFrame with Date/Open/High/Low/Close columns, parse note)
+    """
+    if header is None:
+        header = layout['header']
+    read_options = {
+        'sep': layout['separator'],
+        'header': 0 if header else None,
+        'names': list(range(layout['columns'])),
+        'usecols': layout['usecols'],
+        'encoding': 'utf-8-sig',
+    }
+    price_dtypes = {index: np.float64 for index, name in zip(layout['usecols'], layout['names'])
+                    if name != 'Date'}
+    date_index = layout['usecols'][layout['names'].index('Date')]
+    position = source.tell() if hasattr(source, 'tell') else None
+    
+    try:
+        df = pd.read_csv(source, dtype={date_index: str, **price_dtypes}, **read_options)
+        parse_note = 'single pass'
+    except ValueError:
+        # Non-numeric price tokens: read as text and coerce later
+        if position is not None:
+            source.seek(position)
+        df = pd.read_csv(source, dtype=str, **read_options)
+        parse_note = 'text prices, coerced'
+    
+    df.columns = layout['names']
+    return df[OHLC_COLUMNS].copy(), parse_note
+
+
+# Candidate date formats, tried in order; day-first layouts come before
+# month-first ones, so a sample that fits both is read as DD/MM
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y/%m/%d', '%Y%m%d',
+    '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y', '%m/%d/%Y', '%m-%d-%Y',
+    '%d-%b-%Y', '%d %b %Y', '%d-%b-%y', '%b %d, %Y',
+]
+TIME_FORMATS = [' %H:%M:%S', ' %H:%M', 'T%H:%M:%S', ' %H:%M:%S.%f']
+# Integer epoch timestamps below each bound are read in that unit
+EPOCH_UNITS = [(1e11, 's'), (1e14, 'ms'), (1e17, 'us'), (float('inf'), 'ns')]
+DATE_SAMPLE_SIZE = 500
+
+
+def infer_date_format(values, sample_size=DATE_SAMPLE_SIZE):
+    """
+    Infer one date format for a column of date strings from a sample.
+    
+    Up to ``sample_size`` values spread evenly over the column are tried
+    against DATE_FORMATS (with TIME_FORMATS appended when the values carry a
+    time) and the format matching most of them wins. The first format that
+    matches the whole sample is taken without trying the rest; it is only
+    reported as ambiguous when its day/month-swapped twin also matches the
+    whole sample and reads it differently. Integer columns that are
+    not YYYYMMDD dates are epoch timestamps, in seconds, ms, us or ns
+    depending on their magnitude.
+    
+    Args:
+        values (pandas.Series): Date strings
+        sample_size (int): Number of values to test
         
-        Args:
-            filepath (str or Path): Path to the data file
-            
-        Returns:
-            pandas.DataFrame: Loaded and validated OHLC data
-            
-        Raises:
-            FileNotFoundError: If file doesn't exist
-            ValueError: If data format is invalid
-        """
-        filepath = Path(filepath)
+    Returns:
+        tuple: (format or 'epoch:<unit>' or None if nothing matched,
+        list of other formats that fit the sample equally well but read it
+        differently)
+    """
+    present = values.dropna()
+    if present.empty:
+        return None, []
+    positions = np.unique(np.linspace(0, len(present) - 1, min(sample_size, len(present))).astype(int))
+    sample = present.iloc[positions].astype(str).str.strip()
+    
+    if sample.str.fullmatch(r'\d+').all():
+        if not (sample.str.len() == 8).all() or \
+                pd.to_datetime(sample, format='%Y%m%d', errors='coerce').isna().any():
+            largest = float(sample.astype(np.int64).max())
+            return f"epoch:{next(unit for bound, unit in EPOCH_UNITS if largest < bound)}", []
+    
+    candidates = DATE_FORMATS
+    if sample.str.contains(':').any():
+        candidates = [date + time for date in DATE_FORMATS for time in TIME_FORMATS]
+    
+    best, best_count, best_parsed, ambiguous = None, 0, None, []
+    for fmt in candidates:
+        parsed = pd.to_datetime(sample, format=fmt, errors='coerce')
+        count = int(parsed.notna().sum())
+        if count == len(sample):
+            # A complete match: only its day/month-swapped twin can rival it
+            swapped = fmt.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+            if swapped != fmt and swapped in candidates:
+                twin = pd.to_datetime(sample, format=swapped, errors='coerce')
+                if twin.notna().all() and not twin.equals(parsed):
+                    return fmt, [swapped]
+            return fmt, []
+        if count > best_count:
+            best, best_count, best_parsed, ambiguous = fmt, count, parsed, []
+        elif count == best_count and count > 0 and not parsed.equals(best_parsed):
+            ambiguous.append(fmt)
+    
+    return best, ambiguous
+
+
+def parse_dates(values, date_format=None):
+    """
+    Parse a date column with one format in a single vectorized pass.
+    
+    Args:
+        values (pandas.Series): Date strings, epoch integers or datetimes
+        date_format (str, optional): strptime format, or 'epoch:s', 'epoch:ms',
+            'epoch:us' or 'epoch:ns'; inferred with infer_date_format if None
         
-        if not filepath.exists():
-            raise FileNotFoundError(f"Data file not found: {filepath}")
+    Returns:
+        tuple: (datetime64 Series with NaT for unparsable values, info dict
+        with 'date_format', 'date_inferred' and 'date_failures')
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, {}
+    
+    inferred = date_format is None
+    ambiguous = []
+    if inferred:
+        date_format, ambiguous = infer_date_format(values)
+    
+    # Text columns are object dtype on pandas < 3 and str dtype from pandas 3
+    if not pd.api.types.is_numeric_dtype(values):
+        sample = values.dropna().head(DATE_SAMPLE_SIZE).astype(str)
+        if (sample.str.len() != sample.str.strip().str.len()).any():
+            values = values.str.strip()
+    
+    if date_format is None:
+        # No known format fits: fall back to pandas' own inference
+        parsed = pd.to_datetime(values, errors='coerce')
+    elif date_format.startswith('epoch:'):
+        parsed = pd.to_datetime(pd.to_numeric(values, errors='coerce'),
+                                unit=date_format.split(':', 1)[1], errors='coerce')
+    else:
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    
+    failed = parsed.isna() & values.notna()
+    if inferred and ambiguous:
+        print(f"Warning: Dates also fit {', '.join(ambiguous)}; assuming {date_format} "
+              f"(use --date-format to override)")
+    if failed.any():
+        print(f"Warning: {int(failed.sum())} dates did not match format "
+              f"{date_format or 'inferred by pandas'} (first: {values[failed].iloc[0]!r})")
+    
+    return parsed, {
+        'date_format': date_format,
+        'date_inferred': inferred,
+        'date_failures': int(failed.sum()),
+    }
+
+
+INTRADAY_CHUNK_ROWS = 1_000_000
+
+
+def _daily_bars(bars):
+    """
+    Aggregate bars keyed by a normalized 'Date' to one OHLC row per day.
+    
+    Rows must be in time order within each day: Open is the day's first open
+    and Close its last close. Days keep their order of first appearance.
+    """
+    grouped = bars.groupby('Date', sort=False)
+    return pd.DataFrame({
+        'Open': grouped['Open'].first(),
+        'High': grouped['High'].max(),
+        'Low': grouped['Low'].min(),
+        'Close': grouped['Close'].last(),
+    }).reset_index()
+
+
+def aggregate_intraday(filepath, layout, chunksize=INTRADAY_CHUNK_ROWS, date_format=None):
+    """
+    Stream an intraday OHLC file and aggregate it to daily bars.
+    
+    The file is read ``chunksize`` rows at a time; each chunk is reduced to
+    daily bars with a vectorized group-by on the calendar date. The last day
+    of a chunk may continue in the next one, so it is carried over and merged
+    with the next chunk's first day instead of being emitted. Peak memory
+    therefore depends on the chunk size, not the file size. Rows must be in
+    time order within each day. The date format is inferred from the first
+    chunk (unless given) and used for every chunk.
+    
+    Args:
+        filepath (str or Path): Intraday data file (timestamp or date column
+            plus Open/High/Low/Close; a separate time column is ignored)
+        layout (dict): Layout as returned by sniff_ohlc_format
+        chunksize (int): Rows per chunk
+        date_format (str, optional): Date format (see parse_dates)
         
-        # Try different separators
-        separators = [',', '\t', ';', '|']
-        df = None
+    Returns:
+        tuple: (daily DataFrame with Date/Open/High/Low/Close, dict of
+        'rows', 'invalid_rows', 'chunks' and 'date_failures' counts plus
+        the 'date_format' used)
+    """
+    read_options = {
+        'sep': layout['separator'],
+        'header': 0 if layout['header'] else None,
+        'names': list(range(layout['columns'])),
+        'usecols': layout['usecols'],
+        'encoding': 'utf-8-sig',
+        'chunksize': chunksize,
+    }
+    date_index = layout['usecols'][layout['names'].index('Date')]
+    price_dtypes = {index: np.float64 for index, name in zip(layout['usecols'], layout['names'])
+                    if name != 'Date'}
+    
+    try:
+        return _aggregate_chunks(pd.read_csv(filepath, dtype={date_index: str, **price_dtypes},
+                                             **read_options), layout, date_format)
+    except ValueError:
+        # Non-numeric price tokens: stream again as text and coerce
+        return _aggregate_chunks(pd.read_csv(filepath, dtype=str, **read_options), layout, date_format)
+
+
+def _aggregate_chunks(chunks, layout, date_format=None):
+    complete = []
+    carry = None
+    counts = {'rows': 0, 'invalid_rows': 0, 'chunks': 0, 'date_failures': 0,
+              'date_format': date_format, 'date_inferred': date_format is None}
+    
+    for chunk in chunks:
+        chunk.columns = layout['names']
+        counts['rows'] += len(chunk)
+        counts['chunks'] += 1
         
-        for sep in separators:
-            try:
-                df = pd.read_csv(filepath, sep=sep)
-                if len(df.columns) >= 5:  # At least Date + OHLC
-                    break
-            except Exception:
-                continue
+        dates, date_info = parse_dates(chunk['Date'], counts['date_format'])
+        if counts['chunks'] == 1:
+            counts['date_format'] = date_info['date_format']
+        counts['date_failures'] += date_info['date_failures']
         
-        if df is None or len(df.columns) < 5:
-            raise ValueError("Unable to parse file. Expected columns: Date, Open, High, Low, Close")
-        
-        # Standardize column names (case-insensitive matching)
-        df.columns = df.columns.str.strip()
-        column_mapping = {}
-        
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'date' in col_lower:
-                column_mapping[col] = 'Date'
-            elif 'open' in col_lower:
-                column_mapping[col] = 'Open'
-            elif 'high' in col_lower:
-                column_mapping[col] = 'High'
-            elif 'low' in col_lower:
-                column_mapping[col] = 'Low'
-            elif 'close' in col_lower:
-                column_mapping[col] = 'Close'
-        
-        df = df.rename(columns=column_mapping)
-        
-        # Validate required columns
-        required = ['Date', 'Open', 'High', 'Low', 'Close']
-        missing = set(required) - set(df.columns)
-        if missing:
-            raise ValueError(f"Missing required columns: {missing}")
-        
-        # Keep only required columns
-        df = df[required].copy()
-        
-        # Parse dates
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        
-        # Convert OHLC to numeric
+        bars = pd.DataFrame({'Date': dates.dt.normalize()})
         for col in ['Open', 'High', 'Low', 'Close']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+            bars[col] = pd.to_numeric(chunk[col], errors='coerce')
+        valid = bars.notna().all(axis=1)
+        counts['invalid_rows'] += int((~valid).sum())
         
-        # Remove rows with missing data
-        initial_rows = len(df)
-        df = df.dropna()
-        removed_rows = initial_rows - len(df)
+        daily = _daily_bars(bars[valid])
+        if daily.empty:
+            continue
+        if carry is not None:
+            # The carried day may continue at the start of this chunk
+            daily = _daily_bars(pd.concat([carry, daily], ignore_index=True))
         
-        if removed_rows > 0:
-            print(f"Warning: Removed {removed_rows} rows with missing/invalid data")
+        complete.append(daily.iloc[:-1])
+        carry = daily.iloc[-1:]
+    
+    if carry is not None:
+        complete.append(carry)
+    if not complete:
+        return pd.DataFrame(columns=OHLC_COLUMNS), counts
+    
+    daily = pd.concat(complete, ignore_index=True)
+    if daily['Date'].duplicated().any():
+        # A day reappeared after other days (file not grouped by day)
+        daily = _daily_bars(daily)
+    
+    return daily[OHLC_COLUMNS], counts
+
+
+class OHLCCache:
+    """
+    On-disk cache of cleaned OHLC arrays, one directory per source file.
+    
+    Each entry holds Date/Open/High/Low/Close as ``.npy`` files plus a
+    ``meta.json`` recording the source path, size, mtime and content hash.
+    A matching size and mtime is a hit without touching the source; if only
+    the mtime changed, the content hash decides. Arrays are memory-mapped on
+    load and sliced by binary search on the sorted dates, so rows outside a
+    requested date range are never read into memory.
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.root = Path(cache_dir) / 'ohlc'
+    
+    def entry_dir(self, filepath, variant=''):
+        key = f"{DATA_CACHE_VERSION}|{Path(filepath).resolve()}"
+        if variant:
+            # Separate entries for different derivations of the same file
+            key = f"{key}|{variant}"
+        return self.root / hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def load(self, filepath, start=None, end=None, variant=''):
+        """
+        Return the cached cleaned data for ``filepath`` restricted to [start, end].
         
-        if len(df) == 0:
-            raise ValueError("No valid data rows after cleaning")
+        Args:
+            filepath (str or Path): Source data file
+            start (str or datetime, optional): First date to include
+            end (str or datetime, optional): Last date to include
+            variant (str): Derivation of the source the entry holds (e.g. 'intraday')
         
-        # Sort by date
-        df = df.sort_values('Date').reset_index(drop=True)
+        Returns:
+            tuple: (DataFrame, meta dict), or None on a cache miss
+        """
+        entry = self.entry_dir(filepath, variant)
+        try:
+            with open(entry / 'meta.json', 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
         
-        # Validate OHLC relationships
-        invalid_rows = (df['High'] < df['Low']) | (df['High'] < df['Open']) | \
-                      (df['High'] < df['Close']) | (df['Low'] > df['Open']) | \
-                      (df['Low'] > df['Close'])
+        stat = Path(filepath).stat()
+        if meta.get('size') != stat.st_size:
+            return None
+        if meta.get('mtime_ns') != stat.st_mtime_ns:
+            if meta.get('content_hash') != file_content_hash(filepath):
+                return None
+            # Touched but unchanged: refresh the mtime so the next hit is instant
+            meta['mtime_ns'] = stat.st_mtime_ns
+            self._write_meta(entry, meta)
         
-        if invalid_rows.any():
-            print(f"Warning: Found {invalid_rows.sum()} rows with invalid OHLC relationships (High < Low, etc.)")
-            df = df[~invalid_rows].reset_index(drop=True)
+        try:
+            arrays = {name: np.load(entry / f"{name}.npy", mmap_mode='r') for name in OHLC_COLUMNS}
+        except (OSError, ValueError):
+            return None
         
-        print(f"\nData loaded successfully:")
-        print(f"  - Total records: {len(df)}")
-        print(f"  - Date range: {df['Date'].min().date()} to {df['Date'].max().date()}")
-        print(f"  - Price range: {df['Low'].min():.2f} to {df['High'].max():.2f}")
+        lo, hi = date_range_bounds(arrays['Date'], start, end)
+        df = pd.DataFrame({name: np.array(array[lo:hi]) for name, array in arrays.items()})
         
-        return df
+        return df, meta
     
-    def calculate_position_size(self, entry_price, stop_loss_price):
+    def store(self, filepath, df, load_info, variant=''):
         """
-        Calculate position size based on risk management rules.
-        
-        Maximum risk per trade is 2% of total capital.
-        Risk per share = |entry_price - stop_loss_price|
-        Position size = (Capital * Risk%) / Risk per share
-        
-        However, maximum capital deployed cannot exceed current capital.
-        
-        Args:
-            entry_price (float): Entry price per unit
-            stop_loss_price (float): Stop loss price per unit
-            
-        Returns:
-            int: Number of units to trade
+        Save cleaned, date-sorted data for ``filepath``.
         """
-        risk_amount = self.current_capital * self.risk_per_trade
-        risk_per_unit = abs(entry_price - stop_loss_price)
-        
-        if risk_per_unit == 0:
-            return 0
+        entry = self.entry_dir(filepath, variant)
+        entry.mkdir(parents=True, exist_ok=True)
+        stat = Path(filepath).stat()
         
-        # Calculate position size based on risk
-        position_size = int(risk_amount / risk_per_unit)
+        for name in OHLC_COLUMNS:
+            tmp = entry / f"{name}.{os.getpid()}.tmp.npy"
+            np.save(tmp, df[name].to_numpy())
+            os.replace(tmp, entry / f"{name}.npy")
         
-        # Ensure we don't exceed current capital
-        max_affordable = int(self.current_capital / entry_price)
-        position_size = min(position_size, max_affordable)
+        # meta.json is written last and marks the entry as complete
+        self._write_meta(entry, {
+            'source': str(Path(filepath).resolve()),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': file_content_hash(filepath),
+            'rows': len(df),
+            'load_info': load_info,
+        })
+    
+    @staticmethod
+    def _write_meta(entry, meta):
+        tmp = entry / f"meta.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, entry / 'meta.json')
+
+
+def date_range_bounds(dates, start=None, end=None):
+    """
+    Binary-search the positional bounds of [start, end] in sorted dates.
+    
+    Args:
+        dates (numpy.ndarray): Ascending datetime64 values
+        start (str or datetime, optional): First date to include
+        end (str or datetime, optional): Last date to include
         
-        return position_size
+    Returns:
+        tuple: (lo, hi) such that dates[lo:hi] lies within the range
+    """
+    lo, hi = 0, len(dates)
+    if start is not None:
+        lo = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side='left'))
+    if end is not None:
+        hi = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side='right'))
+    return lo, max(lo, hi)
+
+
+# Bump when the cached result layout changes; code changes are picked up
+# through the module hash in code_version()
+RESULT_CACHE_VERSION = 1
+_CODE_VERSION = None
+
+
+def code_version():
+    """
+    Hash of this module's source, so cached results expire with any code change.
+    """
+    global _CODE_VERSION
+    if _CODE_VERSION is None:
+        _CODE_VERSION = f"{RESULT_CACHE_VERSION}-{file_content_hash(__file__)}"
+    return _CODE_VERSION
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk memoization of backtest results.
     
-    def execute_long_trade(self, date, high, low):
+    An entry is keyed by a hash of the cleaned OHLC arrays, the run
+    parameters and code_version(), so it can never be served for other data,
+    settings or code. It holds the final capital, the statistics accumulator
+    and the last date (``result.json``) and, when requested, the trade arrays
+    (``trades.npz``). Entries not used for ``max_age_days`` are removed, and
+    the least recently used ones go once the cache exceeds ``max_bytes``.
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=512 * 2**20, max_age_days=30):
+        self.root = Path(cache_dir) / 'results'
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+    
+    @staticmethod
+    def key(df, **params):
         """
-        Execute a long trade: Buy at high, sell at low.
+        Content hash of the cleaned data plus parameters and code version.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(code_version().encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        for name in OHLC_COLUMNS:
+            values = np.ascontiguousarray(df[name].to_numpy())
+            digest.update(name.encode('utf-8'))
+            digest.update(values.view(np.uint8) if values.dtype != object else str(values).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def load(self, key, calculator, need_trades=False):
+        """
+        Restore a cached result into ``calculator``.
         
         Args:
-            date: Trading date
-            high (float): Day's high price (entry)
-            low (float): Day's low price (exit)
+            key (str): Key from ResultCache.key
+            calculator (NiftyTradeCalculator): Calculator to fill
+            need_trades (bool): Only accept entries that include the trades
             
         Returns:
-            dict: Trade details
+            bool: True on a cache hit
         """
-        entry_price = high
-        exit_price = low
-        
-        # Position sizing with stop loss at exit price
-        quantity = self.calculate_position_size(entry_price, exit_price)
+        entry = self.root / key
+        try:
+            with open(entry / 'result.json', 'r') as f:
+                result = json.load(f)
+            if need_trades and not result['trades']:
+                return False
+            trades = TradeStore()
+            if result['trades']:
+                with np.load(entry / 'trades.npz') as arrays:
+                    trades.arrays = {name: arrays[name] for name, _ in TradeStore.FIELDS}
+                trades.size = len(trades.arrays['Bar'])
+        except (OSError, ValueError, KeyError):
+            return False
         
-        if quantity == 0:
-            return None
+        calculator.current_capital = result['current_capital']
+        calculator.stats = TradeStatsAccumulator.from_state(result['stats'])
+        calculator.trades = trades
+        # Every restored trade is already counted in the restored statistics
+        calculator._stats_offset = calculator.stats.count - len(trades)
+        calculator.last_date = pd.Timestamp(result['last_date']) if result['last_date'] else None
         
-        # Calculate P&L
-        pnl = (exit_price - entry_price) * quantity
-        pnl_percent = ((exit_price - entry_price) / entry_price) * 100
+        # Mark as recently used for eviction
+        os.utime(entry / 'result.json')
+        return True
+    
+    def store(self, key, calculator, with_trades=False):
+        """
+        Save the result of a finished run, then apply the eviction limits.
+        """
+        entry = self.root / key
+        entry.mkdir(parents=True, exist_ok=True)
+        calculator._sync_accumulator()
         
-        # Update capital
-        self.current_capital += pnl
+        if with_trades:
+            tmp = entry / f"trades.{os.getpid()}.tmp.npz"
+            np.savez(tmp, **{name: calculator.trades.column(name) for name, _ in TradeStore.FIELDS})
+            os.replace(tmp, entry / 'trades.npz')
         
-        trade = {
-            'Date': date,
-            'Direction': 'LONG',
-            'Entry_Price': entry_price,
-            'Exit_Price': exit_price,
-            'Quantity': quantity,
-            'PnL': pnl,
-            'PnL_Percent': pnl_percent,
-            'Capital_After': self.current_capital
-        }
+        # result.json is written last and marks the entry as complete
+        tmp = entry / f"result.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({
+                'current_capital': float(calculator.current_capital),
+                'stats': calculator.stats.state(),
+                'last_date': None if calculator.last_date is None else str(pd.Timestamp(calculator.last_date)),
+                'trades': with_trades,
+            }, f, indent=2)
+        os.replace(tmp, entry / 'result.json')
         
-        return trade
+        self.evict()
     
-    def execute_short_trade(self, date, high, low):
+    def evict(self):
         """
-        Execute a short trade: Sell at low, buy back at high.
-        
-        Args:
-            date: Trading date
-            high (float): Day's high price (exit/cover)
-            low (float): Day's low price (entry)
-            
-        Returns:
-            dict: Trade details
+        Remove entries older than max_age_days, then least recently used
+        entries until the cache fits in max_bytes.
         """
-        entry_price = low
-        exit_price = high
-        
-        # Position sizing with stop loss at exit price
-        quantity = self.calculate_position_size(entry_price, exit_price)
-        
-        if quantity == 0:
-            return None
+        if not self.root.exists():
+            return
         
-        # Calculate P&L (short trade: profit when price falls)
-        pnl = (entry_price - exit_price) * quantity
-        pnl_percent = ((entry_price - exit_price) / entry_price) * 100
+        entries = []
+        for entry in self.root.iterdir():
+            files = [f for f in entry.iterdir() if f.is_file()] if entry.is_dir() else []
+            try:
+                used = (entry / 'result.json').stat().st_mtime
+            except OSError:
+                # Incomplete entry: evict first
+                used = 0
+            entries.append((used, sum(f.stat().st_size for f in files), entry))
         
-        # Update capital
-        self.current_capital += pnl
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age_days * 86400
+        for used, size, entry in entries:
+            if used >= cutoff and total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+CHECKPOINT_VERSION = 2
+
+
+def _prefix_fingerprint(filepath, offset, length=4096):
+    """
+    Fingerprint the first ``offset`` bytes of a file by their head and tail.
+    
+    Hashes the first and last ``length`` bytes of that prefix, which detects
+    rewritten or truncated files without reading the whole history.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        digest.update(f.read(min(length, offset)))
+        f.seek(max(0, offset - length))
+        digest.update(f.read(offset - f.tell()))
+    return digest.hexdigest()
+
+
+# Decimals that compact float32 prices are rounded back to when decoded
+PRICE_DECIMALS = 2
+
+
+def encode_prices(values, decimals=PRICE_DECIMALS):
+    """
+    Store prices as float32 when rounding back to ``decimals`` restores them.
+    
+    Below 2**17 a float32 is within 2**-8 of any price, so prices with 2
+    decimals up to 131,072 round back exactly. Each value is checked, so a
+    column is only narrowed when decode_prices reproduces every float64 value
+    bit for bit.
+    
+    Returns:
+        numpy.ndarray: float32 array, or the float64 input when not exact
+    """
+    values = np.asarray(values, dtype=np.float64)
+    narrow = values.astype(np.float32)
+    if np.array_equal(decode_prices(narrow, decimals), values):
+        return narrow
+    return values
+
+
+def decode_prices(values, decimals=PRICE_DECIMALS):
+    """
+    Return float64 prices from encode_prices output.
+    """
+    if values.dtype == np.float64:
+        return values
+    return np.round(values.astype(np.float64), decimals)
+
+
+def encode_dates(values):
+    """
+    Store midnight datetime64 values as int32 day numbers since 1970-01-01.
+    
+    Returns:
+        numpy.ndarray: int32 day numbers, or the datetime64 input when any
+        value carries a time of day
+    """
+    values = np.asarray(values, dtype='datetime64[ns]')
+    days = values.astype('datetime64[D]')
+    if not np.array_equal(days.astype('datetime64[ns]'), values):
+        return values
+    return days.astype(np.int32)
+
+
+def decode_dates(values):
+    """
+    Return datetime64[ns] dates from encode_dates output.
+    """
+    if values.dtype.kind == 'M':
+        return values
+    return values.astype(np.int64).astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def smallest_int_dtype(values):
+    """
+    Smallest signed integer dtype that holds every value.
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        limits = np.iinfo(dtype)
+        if len(values) == 0 or (limits.min <= values.min() and values.max() <= limits.max):
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class CompactOHLC:
+    """
+    OHLC data held in compact form: int32 day numbers and float32 prices.
+    
+    Columns are encoded with encode_dates/encode_prices, each falling back
+    to its full type where the compact one would not be exact. Indexing a
+    column (``data['High']``) decodes it to the float64/datetime64 Series that
+    load_data returns, so the strategy engines, statistics and outputs see
+    exactly the same values as in the default mode while only the compact
+    arrays stay resident.
+    """
+    
+    def __init__(self, arrays):
+        self.arrays = arrays
+    
+    @classmethod
+    def from_frame(cls, df):
+        arrays = {'Date': encode_dates(df['Date'].to_numpy())}
+        for name in OHLC_COLUMNS[1:]:
+            arrays[name] = encode_prices(df[name].to_numpy())
+        return cls(arrays)
+    
+    def __len__(self):
+        return len(self.arrays['Date'])
+    
+    def __getitem__(self, name):
+        values = self.arrays[name]
+        decoded = decode_dates(values) if name == 'Date' else decode_prices(values)
+        return pd.Series(decoded, name=name)
+    
+    @property
+    def columns(self):
+        return pd.Index(OHLC_COLUMNS)
+    
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+    
+    def to_frame(self):
+        """
+        Decode every column into a regular OHLC DataFrame.
+        """
+        return pd.DataFrame({name: self[name] for name in OHLC_COLUMNS})
+
+
+class TradeStore:
+    """
+    Columnar, preallocated storage for executed trades.
+    
+    Each trade field lives in its own typed NumPy array (datetime64 dates,
+    int8 direction codes, int64 quantities, float64 prices/P&L) instead of a
+    dict per trade. The arrays are allocated up front for the worst case of
+    the run (one trade per bar and leg) and exposed as zero-copy views.
+    
+    compact() narrows a finished store further (int32 bars and day numbers,
+    float32 entry/exit prices, the smallest integer type for quantities);
+    column() then decodes transparently. A ``fractional`` store holds
+    float64 quantities (see simulate_fractional).
+    """
+    
+    FIELDS = (
+        ('Bar', 'int64'),
+        ('Date', 'datetime64[ns]'),
+        ('Direction', 'int8'),
+        ('Entry_Price', 'float64'),
+        ('Exit_Price', 'float64'),
+        ('Quantity', 'int64'),
+        ('PnL', 'float64'),
+        ('PnL_Percent', 'float64'),
+        ('Capital_After', 'float64'),
+    )
+    
+    def __init__(self, capacity=0, fractional=False):
+        """
+        Allocate an empty store.
+        
+        Args:
+            capacity (int): Number of trades to preallocate room for
+            fractional (bool): Store float64 instead of int64 quantities
+        """
+        self.size = 0
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.FIELDS}
+        if fractional:
+            self.arrays['Quantity'] = np.empty(capacity, dtype=np.float64)
+        self.compacted = False
+    
+    def __len__(self):
+        return self.size
+    
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+    
+    def __getitem__(self, index):
+        """
+        Return trade ``index`` as a dict in the execute_*_trade layout.
+        """
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("trade index out of range")
+        
+        trade = {name: self.column(name)[index].item() for name, _ in self.FIELDS[3:]}
+        return {
+            'Date': pd.Timestamp(self.column('Date')[index]),
+            'Direction': DIRECTIONS[self.arrays['Direction'][index]],
+            **trade
+        }
+    
+    @property
+    def capacity(self):
+        return len(self.arrays['Bar'])
+    
+    @property
+    def fractional(self):
+        return self.arrays['Quantity'].dtype.kind == 'f'
+    
+    def reserve(self, capacity):
+        """
+        Grow the underlying arrays so they can hold at least ``capacity`` trades.
+        """
+        if capacity <= self.capacity:
+            return
+        if self.compacted:
+            raise ValueError("Cannot add trades to a compacted TradeStore")
+        for name, array in self.arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+    
+    def append(self, trade, bar=-1):
+        """
+        Append one trade dict as returned by execute_long_trade/execute_short_trade.
+        
+        Args:
+            trade (dict): Trade details
+            bar (int): Positional index of the bar the trade was taken on
+        """
+        if self.size == self.capacity:
+            self.reserve(max(16, 2 * self.capacity))
+        
+        i = self.size
+        arrays = self.arrays
+        arrays['Bar'][i] = bar
+        arrays['Date'][i] = pd.Timestamp(trade['Date']).to_datetime64()
+        arrays['Direction'][i] = DIRECTIONS.index(trade['Direction'])
+        for name in ('Entry_Price', 'Exit_Price', 'Quantity', 'PnL', 'PnL_Percent', 'Capital_After'):
+            arrays[name][i] = trade[name]
+        self.size = i + 1
+    
+    def trim(self):
+        """
+        Release the unused preallocated capacity (e.g. before pickling).
+        """
+        for name, array in self.arrays.items():
+            if len(array) > self.size:
+                self.arrays[name] = array[:self.size].copy()
+    
+    def compact(self):
+        """
+        Narrow the arrays of a finished store to their smallest exact types.
+        
+        Bar becomes int32, Date int32 day numbers (if all dates are midnight),
+        Entry/Exit_Price float32 (if exact to 2 decimals) and Quantity the
+        smallest adequate integer type (fractional quantities stay float64).
+        P&L, PnL_Percent and Capital_After stay float64. The store can no
+        longer grow afterwards.
+        """
+        self.trim()
+        arrays = self.arrays
+        if self.size == 0 or arrays['Bar'].max() <= np.iinfo(np.int32).max:
+            arrays['Bar'] = arrays['Bar'].astype(np.int32)
+        arrays['Date'] = encode_dates(arrays['Date'])
+        arrays['Entry_Price'] = encode_prices(arrays['Entry_Price'])
+        arrays['Exit_Price'] = encode_prices(arrays['Exit_Price'])
+        if not self.fractional:
+            arrays['Quantity'] = arrays['Quantity'].astype(smallest_int_dtype(arrays['Quantity']))
+        self.compacted = True
+    
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+    
+    def column(self, name):
+        """
+        Return one column over the filled trades: a zero-copy view, or the
+        decoded values of a compacted column.
+        """
+        values = self.arrays[name][:self.size]
+        if self.compacted:
+            if name == 'Date':
+                return decode_dates(values)
+            if name in ('Entry_Price', 'Exit_Price'):
+                return decode_prices(values)
+            if name == 'Bar' or (name == 'Quantity' and not self.fractional):
+                return values.astype(np.int64)
+        return values
+    
+    def to_frame(self):
+        """
+        Expose the trades as a DataFrame backed by views of the store arrays.
+        
+        Direction is returned as a categorical over DIRECTIONS whose codes are
+        the stored int8 codes.
+        
+        Returns:
+            pandas.DataFrame: Trades with the standard trade-log columns
+        """
+        columns = {name: self.column(name) for name, _ in self.FIELDS[1:]}
+        columns['Direction'] = pd.Categorical.from_codes(columns['Direction'], categories=DIRECTIONS)
+        return pd.DataFrame(columns, copy=False)
+
+
+TRADE_LOG_BATCH_ROWS = 100_000
+# Trade-log file extension -> format; any other extension is written as CSV
+TRADE_LOG_FORMATS = {
+    '.gz': 'csv.gz',
+    '.zst': 'csv.zst',
+    '.zstd': 'csv.zst',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather',
+}
+TRADE_LOG_COLUMNS = ['Date', 'Direction', 'Entry_Price', 'Exit_Price', 'Quantity',
+                     'PnL', 'PnL_Percent', 'Capital_After']
+
+
+def _import_optional(module, feature):
+    """
+    Import an optional dependency, explaining what needs it when it is missing.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise ImportError(f"{feature} requires the optional '{module.split('.')[0]}' package "
+                          f"(pip install {module.split('.')[0]})") from None
+
+
+def trade_log_format(path):
+    """
+    Return the trade-log format for ``path``: 'csv', 'csv.gz', 'csv.zst',
+    'parquet' or 'feather'.
+    """
+    return TRADE_LOG_FORMATS.get(Path(path).suffix.lower(), 'csv')
+
+
+class TradeLogWriter:
+    """
+    Write a trade log in batches, in a format chosen by file extension.
+    
+    CSV output (plain, ``.gz`` or ``.zst``) has the same layout as before:
+    YYYY-MM-DD dates and values rounded to 2 decimals. Parquet and
+    Feather/Arrow IPC output keep native types at full precision: Date as
+    timestamp[ns], Direction dictionary-encoded over DIRECTIONS. Each batch is
+    formatted and written on its own, so only one batch is ever copied.
+    Compressed CSV can be appended to (a new gzip member / zstd frame);
+    Parquet and Feather files cannot.
+    
+    pyarrow (Parquet/Feather) and zstandard (.zst) are optional and only
+    imported when those formats are requested.
+    
+    With ``instruments`` the log gets an Instrument column after Date, fed
+    as integer codes into that list (see PortfolioCalculator). With
+    ``fractional`` quantities are floats, rounded to 4 decimals in CSV.
+    """
+    
+    def __init__(self, path, append=False, instruments=None, fractional=False):
+        """
+        Args:
+            path (str or Path): Output file
+            append (bool): Append rows (without header) to an existing CSV log
+            instruments (list, optional): Instrument names for an Instrument column
+            fractional (bool): Quantities are fractional units
+            
+        Raises:
+            ValueError: If appending to a Parquet or Feather log
+            ImportError: If the format's optional package is not installed
+        """
+        self.path = str(path)
+        self.format = trade_log_format(path)
+        self.rows = 0
+        self._header = not append
+        self.quantity_decimals = 4 if fractional else None
+        self.instruments = None if instruments is None else np.asarray(instruments, dtype=object)
+        
+        if self.format == 'csv':
+            self._file = open(path, 'a' if append else 'w', newline='')
+        elif self.format == 'csv.gz':
+            self._file = gzip.open(path, 'at' if append else 'wt', newline='')
+        elif self.format == 'csv.zst':
+            zstandard = _import_optional('zstandard', "Writing .zst trade logs")
+            raw = open(path, 'ab' if append else 'wb')
+            self._file = io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(raw),
+                                          encoding='utf-8', newline='')
+        else:
+            if append:
+                raise ValueError(f"Cannot append to a {self.format} trade log: {path}")
+            pa = _import_optional('pyarrow', f"Writing {self.format} trade logs")
+            self._pa = pa
+            instrument_field = []
+            if instruments is not None:
+                instrument_field = [('Instrument', pa.dictionary(pa.int32(), pa.string()))]
+            self._schema = pa.schema([
+                ('Date', pa.timestamp('ns')),
+                *instrument_field,
+                ('Direction', pa.dictionary(pa.int8(), pa.string())),
+                ('Entry_Price', pa.float64()),
+                ('Exit_Price', pa.float64()),
+                ('Quantity', pa.float64() if fractional else pa.int64()),
+                ('PnL', pa.float64()),
+                ('PnL_Percent', pa.float64()),
+                ('Capital_After', pa.float64()),
+            ])
+            if self.format == 'parquet':
+                parquet = _import_optional('pyarrow.parquet', "Writing parquet trade logs")
+                self._file = parquet.ParquetWriter(path, self._schema)
+            else:
+                self._file = pa.ipc.new_file(path, self._schema)
+    
+    def write(self, columns):
+        """
+        Write one batch of trades.
+        
+        Args:
+            columns (dict): TradeStore-style arrays for TRADE_LOG_COLUMNS
+                (datetime64 Date, int8 Direction codes), plus 'Instrument'
+                codes when the writer has instruments
+        """
+        count = len(columns['Date'])
+        if count == 0:
+            return
+        
+        if self.format.startswith('csv'):
+            if self.quantity_decimals is not None:
+                columns = {**columns, 'Quantity': np.round(columns['Quantity'], self.quantity_decimals)}
+            batch = pd.DataFrame({
+                'Date': np.datetime_as_string(columns['Date'], unit='D'),
+                'Direction': np.asarray(DIRECTIONS)[columns['Direction']],
+                **{name: columns[name] if name == 'Quantity' else np.round(columns[name], 2)
+                   for name in TRADE_LOG_COLUMNS[2:]}
+            })
+            if self.instruments is not None:
+                batch.insert(1, 'Instrument', self.instruments[columns['Instrument']])
+            batch.to_csv(self._file, index=False, header=self._header)
+            self._header = False
+        else:
+            pa = self._pa
+            arrays = [
+                pa.array(columns['Date'], type=pa.timestamp('ns')),
+                pa.DictionaryArray.from_arrays(pa.array(columns['Direction'], type=pa.int8()),
+                                               pa.array(DIRECTIONS)),
+            ] + [pa.array(columns[name]) for name in TRADE_LOG_COLUMNS[2:]]
+            if self.instruments is not None:
+                arrays.insert(1, pa.DictionaryArray.from_arrays(
+                    pa.array(columns['Instrument'], type=pa.int32()), pa.array(self.instruments.tolist())))
+            batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+            if self.format == 'parquet':
+                self._file.write_table(pa.Table.from_batches([batch]))
+            else:
+                self._file.write_batch(batch)
+        
+        self.rows += count
+    
+    def write_store(self, store, batch_rows=TRADE_LOG_BATCH_ROWS, instrument_codes=None):
+        """
+        Write all trades of a TradeStore, ``batch_rows`` at a time.
+        """
+        for start in range(0, len(store), batch_rows):
+            columns = {name: store.column(name)[start:start + batch_rows] for name in TRADE_LOG_COLUMNS}
+            if instrument_codes is not None:
+                columns['Instrument'] = instrument_codes[start:start + batch_rows]
+            self.write(columns)
+    
+    def close(self):
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TradeStatsAccumulator:
+    """
+    Running trade statistics, updated as trades execute.
+    
+    Tracks trade/win/loss counts, gross profit and loss, largest win and
+    loss, the Welford mean and variance of PnL_Percent, and the running
+    capital peak with the maximum drawdown from it. calculate_statistics
+    reads the finished numbers instead of rescanning the trade log.
+    
+    Trades can be added one at a time (update) or as array batches
+    (update_arrays). Batches are reduced with NumPy and merged with Chan's
+    parallel form of Welford's update. A single batch therefore reproduces
+    the pandas/NumPy reductions of the trade log exactly.
+    """
+    
+    def __init__(self):
+        self.count = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.largest_win = 0.0
+        self.largest_loss = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.peak = None
+        self.max_drawdown = 0.0
+    
+    def update(self, pnl, pnl_percent, capital_after):
+        """
+        Add one trade.
+        
+        Args:
+            pnl (float): Trade profit/loss
+            pnl_percent (float): Trade return in percent
+            capital_after (float): Capital after the trade
+        """
+        self.count += 1
+        
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+            self.largest_win = pnl if self.wins == 1 else max(self.largest_win, pnl)
+        elif pnl < 0:
+            self.losses += 1
+            self.gross_loss += pnl
+            self.largest_loss = pnl if self.losses == 1 else min(self.largest_loss, pnl)
+        
+        # Welford's online mean/variance
+        delta = pnl_percent - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (pnl_percent - self.mean)
+        
+        # Drawdown from the running peak of Capital_After
+        if self.peak is None or capital_after > self.peak:
+            self.peak = capital_after
+        drawdown = ((capital_after - self.peak) / self.peak) * 100
+        if self.count == 1 or drawdown < self.max_drawdown:
+            self.max_drawdown = drawdown
+    
+    def update_arrays(self, pnl, pnl_percent, capital_after):
+        """
+        Add a batch of trades given as equal-length arrays.
+        """
+        n = len(pnl)
+        if n == 0:
+            return
+        
+        winners = pnl[pnl > 0]
+        losers = pnl[pnl < 0]
+        if len(winners):
+            largest = winners.max()
+            self.largest_win = largest if self.wins == 0 else max(self.largest_win, largest)
+            self.wins += len(winners)
+            self.gross_profit += winners.sum()
+        if len(losers):
+            largest = losers.min()
+            self.largest_loss = largest if self.losses == 0 else min(self.largest_loss, largest)
+            self.losses += len(losers)
+            self.gross_loss += losers.sum()
+        
+        batch_mean = pnl_percent.mean()
+        centered = pnl_percent - batch_mean
+        batch_m2 = (centered * centered).sum()
+        if self.count == 0:
+            self.mean, self.m2 = batch_mean, batch_m2
+        else:
+            total = self.count + n
+            delta = batch_mean - self.mean
+            self.mean += delta * n / total
+            self.m2 += batch_m2 + delta * delta * self.count * n / total
+        
+        running_max = np.maximum.accumulate(capital_after)
+        if self.peak is not None:
+            running_max = np.maximum(running_max, self.peak)
+        drawdown = ((capital_after - running_max) / running_max).min() * 100
+        self.max_drawdown = drawdown if self.count == 0 else min(self.max_drawdown, drawdown)
+        self.peak = running_max[-1]
+        self.count += n
+    
+    def state(self):
+        """
+        Return the accumulator as a JSON-serializable dict.
+        """
+        return {
+            'count': int(self.count),
+            'wins': int(self.wins),
+            'losses': int(self.losses),
+            'gross_profit': float(self.gross_profit),
+            'gross_loss': float(self.gross_loss),
+            'largest_win': float(self.largest_win),
+            'largest_loss': float(self.largest_loss),
+            'mean': float(self.mean),
+            'm2': float(self.m2),
+            'peak': None if self.peak is None else float(self.peak),
+            'max_drawdown': float(self.max_drawdown),
+        }
+    
+    @classmethod
+    def from_state(cls, state):
+        """
+        Rebuild an accumulator from a dict produced by state().
+        """
+        accumulator = cls()
+        for name, value in state.items():
+            setattr(accumulator, name, value)
+        return accumulator
+    
+    @property
+    def std(self):
+        """
+        Sample standard deviation of PnL_Percent (NaN below two trades).
+        """
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - 1))
+
+
+class DrawdownSegmentTree:
+    """
+    Segment tree answering "largest drop" queries over a series in O(log n).
+    
+    For a range of values (e.g. log equity) the query returns the most negative
+    ``values[t] - values[s]`` with ``s <= t`` inside the range, i.e. the maximum
+    drawdown measured from the running peak within that range. Each node keeps
+    the range's max, min and largest drop; two adjacent ranges combine as
+    ``min(left.drop, right.drop, right.min - left.max)``.
+    """
+    
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.n = len(values)
+        size = 1
+        while size < max(1, self.n):
+            size *= 2
+        self.size = size
+        
+        self.max = np.full(2 * size, -np.inf)
+        self.min = np.full(2 * size, np.inf)
+        self.drop = np.zeros(2 * size)
+        self.max[size:size + self.n] = values
+        self.min[size:size + self.n] = values
+        
+        # Build level by level, each level in one vectorized step
+        level = size
+        while level > 1:
+            parents = np.arange(level // 2, level)
+            left, right = 2 * parents, 2 * parents + 1
+            self.max[parents] = np.maximum(self.max[left], self.max[right])
+            self.min[parents] = np.minimum(self.min[left], self.min[right])
+            cross = self.min[right] - self.max[left]
+            cross[~np.isfinite(cross)] = 0.0
+            self.drop[parents] = np.minimum(np.minimum(self.drop[left], self.drop[right]), cross)
+            level //= 2
+    
+    def query(self, lo, hi, peak=None):
+        """
+        Return the largest drop (<= 0) within values[lo:hi].
+        
+        With ``peak`` the range is measured as if that value preceded it
+        (e.g. the equity before the range's first trade).
+        """
+        if hi - lo < (2 if peak is None else 1):
+            return 0.0
+        if peak is None:
+            peak = -np.inf
+        
+        left_nodes = []
+        right_nodes = []
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                left_nodes.append(lo)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                right_nodes.append(hi)
+            lo //= 2
+            hi //= 2
+        
+        drop, running_max = 0.0, peak
+        for node in left_nodes + right_nodes[::-1]:
+            drop = min(drop, self.drop[node], self.min[node] - running_max)
+            running_max = max(running_max, self.max[node])
+        return float(drop)
+
+
+def parse_date_range(spec):
+    """
+    Parse a ``START:END`` date range; either side may be left empty.
+    
+    Each side is a period such as '2020', '2020-03', '2020Q1' or
+    '2020-03-23': START is the beginning of its period and END the end of
+    its period, so '2020:2021' covers 2020-01-01 to 2021-12-31. A spec
+    without a colon is a single period ('2020' is the calendar year).
+    
+    Returns:
+        tuple: (label, start Timestamp or None, end Timestamp or None)
+        
+    Raises:
+        ValueError: If a side is not a valid date or period
+    """
+    first, separator, last = spec.partition(':')
+    if not separator:
+        last = first
+    try:
+        start = pd.Period(first.strip()).start_time if first.strip() else None
+        end = pd.Period(last.strip()).end_time if last.strip() else None
+    except ValueError:
+        raise ValueError(f"Invalid date range {spec!r}: expected START:END, e.g. 2020-02-19:2020-03-23 or 2020")
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"Invalid date range {spec!r}: start is after end")
+    return spec, start, end
+
+
+class TradeRangeIndex:
+    """
+    Statistics of a finished run over any date range, without rescanning trades.
+    
+    Built once over the trades, in date order: prefix counts of wins and
+    losses, prefix sums of gross profit, gross loss, and centered
+    PnL_Percent and its square, plus a DrawdownSegmentTree over log
+    Capital_After. A [start, end] query locates its trades with two binary
+    searches and answers from the prefix arrays in O(1) and the tree in
+    O(log n).
+    
+    A range's drawdown counts the equity before its first trade as the
+    starting peak, so a range opening with a loss reports it. Over the whole
+    run the figures match calculate_statistics, except that its drawdown
+    starts from the first trade's Capital_After rather than the capital
+    before it.
+    """
+    
+    def __init__(self, trades):
+        """
+        Args:
+            trades (TradeStore): Trades of a finished run
+        """
+        self.dates = np.asarray(trades.column('Date'))
+        pnl = np.asarray(trades.column('PnL'), dtype=np.float64)
+        returns = np.asarray(trades.column('PnL_Percent'), dtype=np.float64)
+        self.capital_after = np.asarray(trades.column('Capital_After'), dtype=np.float64)
+        self.capital_before = self.capital_after - pnl
+        
+        def prefix(values):
+            return np.concatenate([[0], np.cumsum(values)])
+        
+        # Position k of each prefix array holds the total of trades [0, k)
+        self.wins = prefix(pnl > 0)
+        self.losses = prefix(pnl < 0)
+        self.gross_profit = prefix(np.where(pnl > 0, pnl, 0.0))
+        self.gross_loss = prefix(np.where(pnl < 0, pnl, 0.0))
+        self.shift = returns.mean() if len(returns) else 0.0
+        centered = returns - self.shift
+        self.sum_returns = prefix(centered)
+        self.sum_squares = prefix(centered * centered)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.drawdown_tree = DrawdownSegmentTree(np.log(self.capital_after))
+    
+    def __len__(self):
+        return len(self.dates)
+    
+    def bounds(self, start=None, end=None):
+        """
+        Return the trade positions [lo, hi) dated within [start, end].
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)), 'left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end)), 'right'))
+        return lo, max(lo, hi)
+    
+    def query(self, start=None, end=None):
+        """
+        Statistics of the trades dated within [start, end] (both inclusive).
+        
+        Args:
+            start (str or Timestamp, optional): First date (default: first trade)
+            end (str or Timestamp, optional): Last date (default: last trade)
+            
+        Returns:
+            dict: First_Trade, Last_Trade, Total_Trades, Winning_Trades,
+            Losing_Trades, Win_Rate_Percent, Starting_Capital, Ending_Capital,
+            Total_Return, Total_Return_Percent, Average_Trade_Return_Percent,
+            Max_Drawdown_Percent (from the equity at the range start),
+            Sharpe_Ratio and Profit_Factor, computed as in calculate_statistics
+        """
+        lo, hi = self.bounds(start, end)
+        n = hi - lo
+        if n == 0:
+            return {'First_Trade': pd.NaT, 'Last_Trade': pd.NaT, 'Total_Trades': 0,
+                    'Winning_Trades': 0, 'Losing_Trades': 0, 'Win_Rate_Percent': 0.0,
+                    'Starting_Capital': np.nan, 'Ending_Capital': np.nan, 'Total_Return': 0.0,
+                    'Total_Return_Percent': 0.0, 'Average_Trade_Return_Percent': np.nan,
+                    'Max_Drawdown_Percent': 0.0, 'Sharpe_Ratio': np.nan, 'Profit_Factor': np.nan}
+        
+        wins = int(self.wins[hi] - self.wins[lo])
+        losses = int(self.losses[hi] - self.losses[lo])
+        starting, ending = self.capital_before[lo], self.capital_after[hi - 1]
+        
+        total = self.sum_returns[hi] - self.sum_returns[lo]
+        mean = total / n + self.shift
+        variance = ((self.sum_squares[hi] - self.sum_squares[lo]) - total * total / n) / (n - 1) \
+            if n > 1 else np.nan
+        std = np.sqrt(max(variance, 0.0)) if n > 1 else np.nan
+        
+        # Profit factor as in calculate_statistics
+        total_wins = self.gross_profit[hi] - self.gross_profit[lo] if wins > 0 else 0
+        total_losses = abs(self.gross_loss[hi] - self.gross_loss[lo]) if losses > 0 else 1
+        
+        return {
+            'First_Trade': pd.Timestamp(self.dates[lo]),
+            'Last_Trade': pd.Timestamp(self.dates[hi - 1]),
+            'Total_Trades': n,
+            'Winning_Trades': wins,
+            'Losing_Trades': losses,
+            'Win_Rate_Percent': wins / n * 100,
+            'Starting_Capital': starting,
+            'Ending_Capital': ending,
+            'Total_Return': ending - starting,
+            'Total_Return_Percent': (ending - starting) / starting * 100,
+            'Average_Trade_Return_Percent': mean,
+            'Max_Drawdown_Percent': np.expm1(self.drawdown_tree.query(lo, hi, np.log(starting))) * 100,
+            'Sharpe_Ratio': (mean / std) * np.sqrt(252) if std != 0 else 0,
+            'Profit_Factor': total_wins / total_losses if total_losses != 0 else float('inf'),
+        }
+    
+    def query_many(self, ranges):
+        """
+        Answer many range queries at once.
+        
+        Args:
+            ranges (list): Range specs for parse_date_range ('2020',
+                '2020-02-19:2020-03-23', ...) or (start, end) tuples
+                
+        Returns:
+            pandas.DataFrame: One row per range, with a Range column first
+        """
+        rows = []
+        for spec in ranges:
+            if isinstance(spec, str):
+                label, start, end = parse_date_range(spec)
+            else:
+                start, end = spec
+                label = f"{'' if start is None else start}:{'' if end is None else end}"
+            rows.append({'Range': label, **self.query(start, end)})
+        return pd.DataFrame(rows)
+
+
+def fractional_trade_legs(highs, lows, risk_per_trade, trade_long=True, trade_short=True):
+    """
+    Vectorized per-trade returns of the high/low strategy with fractional units.
+    
+    With fractional quantities, calculate_position_size sizes every trade to
+    ``min(capital * risk / |high - low|, capital / entry)`` units, so each
+    trade changes capital by a fixed fraction of the capital before it:
+    ``(low - high) * min(risk / |high - low|, 1 / entry)``. The integer engine
+    differs from this only through ``int()`` truncation, by less than one
+    unit, i.e. less than ``|high - low|`` of P&L per trade.
+    
+    Args:
+        highs (numpy.ndarray): Day highs
+        lows (numpy.ndarray): Day lows
+        risk_per_trade (float): Maximum risk per trade as fraction
+        trade_long (bool): Include long trades
+        trade_short (bool): Include short trades
+        
+    Returns:
+        dict: Arrays in execution order (bar by bar, long before short):
+        'Bar', 'Direction', 'Entry_Price', 'Exit_Price', 'Range' (|high - low|),
+        'Fraction' (P&L / capital before the trade) and 'PnL_Percent'
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    
+    # Skip if high equals low (no opportunity)
+    bars = np.flatnonzero(highs != lows)
+    high, low = highs[bars], lows[bars]
+    price_range = np.abs(high - low)
+    
+    legs = []
+    if trade_long:
+        legs.append((LONG, high, low))
+    if trade_short:
+        legs.append((SHORT, low, high))
+    
+    entries = np.column_stack([entry for _, entry, _ in legs]).ravel()
+    exits = np.column_stack([exit_ for _, _, exit_ in legs]).ravel()
+    directions = np.tile(np.array([code for code, _, _ in legs], dtype=np.int8), len(bars))
+    price_range = np.repeat(price_range, len(legs))
+    move = np.repeat(low - high, len(legs))
+    
+    return {
+        'Bar': np.repeat(bars, len(legs)),
+        'Direction': directions,
+        'Entry_Price': entries,
+        'Exit_Price': exits,
+        'Range': price_range,
+        'Fraction': move * np.minimum(risk_per_trade / price_range, 1 / entries),
+        'PnL_Percent': (move / entries) * 100,
+    }
+
+
+def simulate_high_low(highs, lows, initial_capital, risk_per_trade,
+                      trade_long=True, trade_short=True, store=None):
+    """
+    Run the high/low strategy over plain price arrays.
+    
+    This is the array-backed kernel behind ``run_strategy(engine='array')``.
+    It reproduces ``calculate_position_size``, ``execute_long_trade`` and
+    ``execute_short_trade`` operation for operation (same float arithmetic,
+    same ``int()`` truncation, same ``max_affordable`` cap, same skipping of
+    ``high == low`` bars), so it yields bit-identical trades to the row engine
+    without building a Series per bar or a dict per trade.
+    
+    Trades are written straight into the preallocated arrays of ``store``.
+    The Date column is left for the caller to fill from the 'Bar' indices.
+    
+    Args:
+        highs (numpy.ndarray): Day highs as float64
+        lows (numpy.ndarray): Day lows as float64
+        initial_capital (float): Starting capital
+        risk_per_trade (float): Maximum risk per trade as fraction
+        trade_long (bool): Execute long trades (enter at high, exit at low)
+        trade_short (bool): Execute short trades (enter at low, exit at high)
+        store (TradeStore, optional): Store to append trades to; a new one
+            sized for the worst case is created when omitted
+        
+    Returns:
+        tuple: (store, final_capital)
+    """
+    # Python floats iterate far faster than NumPy scalars in a scalar loop
+    # and give the same IEEE-754 results
+    high_list = np.ascontiguousarray(highs, dtype=np.float64).tolist()
+    low_list = np.ascontiguousarray(lows, dtype=np.float64).tolist()
+    
+    legs = int(trade_long) + int(trade_short)
+    if store is None:
+        store = TradeStore(legs * len(high_list))
+    else:
+        store.reserve(len(store) + legs * len(high_list))
+    
+    bars = store.arrays['Bar']
+    directions = store.arrays['Direction']
+    entries = store.arrays['Entry_Price']
+    exits = store.arrays['Exit_Price']
+    quantities = store.arrays['Quantity']
+    pnls = store.arrays['PnL']
+    pnl_percents = store.arrays['PnL_Percent']
+    capitals = store.arrays['Capital_After']
+    
+    n = len(store)
+    capital = initial_capital
+    
+    for i, (high, low) in enumerate(zip(high_list, low_list)):
+        # Skip if high equals low (no opportunity)
+        if high == low:
+            continue
+        
+        # risk_per_unit is |high - low| for both legs
+        risk_per_unit = abs(high - low)
+        
+        if trade_long:
+            # Long: buy at high, sell at low
+            position_size = int(capital * risk_per_trade / risk_per_unit)
+            max_affordable = int(capital / high)
+            quantity = min(position_size, max_affordable)
+            
+            if quantity != 0:
+                pnl = (low - high) * quantity
+                capital += pnl
+                bars[n] = i
+                directions[n] = LONG
+                entries[n] = high
+                exits[n] = low
+                quantities[n] = quantity
+                pnls[n] = pnl
+                pnl_percents[n] = ((low - high) / high) * 100
+                capitals[n] = capital
+                n += 1
+        
+        if trade_short:
+            # Short: sell at low, buy back at high
+            position_size = int(capital * risk_per_trade / risk_per_unit)
+            max_affordable = int(capital / low)
+            quantity = min(position_size, max_affordable)
+            
+            if quantity != 0:
+                pnl = (low - high) * quantity
+                capital += pnl
+                bars[n] = i
+                directions[n] = SHORT
+                entries[n] = low
+                exits[n] = high
+                quantities[n] = quantity
+                pnls[n] = pnl
+                pnl_percents[n] = ((low - high) / low) * 100
+                capitals[n] = capital
+                n += 1
+    
+    store.size = n
+    
+    return store, capital
+
+
+def simulate_fractional(highs, lows, initial_capital, risk_per_trade,
+                        trade_long=True, trade_short=True, store=None):
+    """
+    Run the high/low strategy with fractional units, in closed form.
+    
+    Every trade changes capital by a fixed fraction of the capital before it
+    (see fractional_trade_legs), so the equity curve is a single
+    ``initial_capital * cumprod(1 + fraction)`` and quantities and P&L follow
+    from it without a Python loop. This is the kernel behind
+    ``run_strategy(engine='fractional')``; fractional_deviation measures how
+    far it drifts from the integer-quantity engine.
+    
+    Args:
+        highs (numpy.ndarray): Day highs
+        lows (numpy.ndarray): Day lows
+        initial_capital (float): Starting capital
+        risk_per_trade (float): Maximum risk per trade as fraction
+        trade_long (bool): Execute long trades (enter at high, exit at low)
+        trade_short (bool): Execute short trades (enter at low, exit at high)
+        store (TradeStore, optional): Fractional store to append trades to;
+            a new one is created when omitted
+        
+    Returns:
+        tuple: (store, final_capital)
+    """
+    legs = fractional_trade_legs(highs, lows, risk_per_trade, trade_long, trade_short)
+    count = len(legs['Bar'])
+    
+    capital_after = initial_capital * np.cumprod(1 + legs['Fraction'])
+    capital_before = np.concatenate([[initial_capital], capital_after[:-1]])
+    
+    if store is None:
+        store = TradeStore(count, fractional=True)
+    elif not store.fractional:
+        raise ValueError("simulate_fractional needs a TradeStore(fractional=True)")
+    else:
+        store.reserve(len(store) + count)
+    
+    n = len(store)
+    window = slice(n, n + count)
+    arrays = store.arrays
+    arrays['Bar'][window] = legs['Bar']
+    arrays['Direction'][window] = legs['Direction']
+    arrays['Entry_Price'][window] = legs['Entry_Price']
+    arrays['Exit_Price'][window] = legs['Exit_Price']
+    arrays['Quantity'][window] = capital_before * np.minimum(risk_per_trade / legs['Range'],
+                                                             1 / legs['Entry_Price'])
+    arrays['PnL'][window] = capital_after - capital_before
+    arrays['PnL_Percent'][window] = legs['PnL_Percent']
+    arrays['Capital_After'][window] = capital_after
+    store.size = n + count
+    
+    final_capital = float(capital_after[-1]) if count else initial_capital
+    return store, final_capital
+
+
+def fractional_deviation(highs, lows, initial_capital, risk_per_trade,
+                         trade_long=True, trade_short=True):
+    """
+    Measure how far the fractional-unit equity curve drifts from the exact one.
+    
+    Both simulate_fractional and simulate_high_low are run and their equity
+    is compared after every bar (the integer engine skips trades whose
+    quantity truncates to zero, so trades cannot be paired one to one).
+    
+    Args:
+        highs (numpy.ndarray): Day highs
+        lows (numpy.ndarray): Day lows
+        initial_capital (float): Starting capital
+        risk_per_trade (float): Maximum risk per trade as fraction
+        trade_long (bool): Include long trades
+        trade_short (bool): Include short trades
+        
+    Returns:
+        dict: 'Max_Equity_Deviation_Percent' (largest relative difference in
+        equity over all bars), 'Max_Deviation_Bar' (bar where it occurs),
+        'Final_Capital_Fractional', 'Final_Capital_Exact' and
+        'Final_Capital_Deviation_Percent'
+    """
+    fractional, fractional_capital = simulate_fractional(
+        highs, lows, initial_capital, risk_per_trade, trade_long, trade_short)
+    exact, exact_capital = simulate_high_low(
+        highs, lows, initial_capital, risk_per_trade, trade_long, trade_short)
+    
+    bars = np.arange(len(highs))
+    
+    def equity_by_bar(store):
+        # Capital after the last trade on or before each bar
+        done = np.searchsorted(store.column('Bar'), bars, side='right')
+        return np.concatenate([[initial_capital], store.column('Capital_After')])[done]
+    
+    exact_equity = equity_by_bar(exact)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = np.abs(equity_by_bar(fractional) - exact_equity) / np.abs(exact_equity)
+    deviation = np.nan_to_num(deviation, nan=0.0, posinf=np.inf)
+    worst = int(np.argmax(deviation)) if len(deviation) else 0
+    
+    return {
+        'Max_Equity_Deviation_Percent': float(deviation[worst]) * 100 if len(deviation) else 0.0,
+        'Max_Deviation_Bar': worst,
+        'Final_Capital_Fractional': fractional_capital,
+        'Final_Capital_Exact': exact_capital,
+        'Final_Capital_Deviation_Percent':
+            abs(fractional_capital - exact_capital) / abs(exact_capital) * 100 if exact_capital else np.inf,
+    }
+
+
+def simulate_signals(legs, initial_capital, risk_per_trade, store=None):
+    """
+    Run precomputed strategy signals through the position-sizing engine.
+    
+    The generic form of simulate_high_low: each leg supplies per-bar entry,
+    exit and stop prices plus a mask of the bars it trades, and every trade is
+    sized and compounded exactly as calculate_position_size and
+    execute_long_trade/execute_short_trade do (risk per unit = |entry - stop|,
+    ``int()`` truncation, ``max_affordable`` cap). Legs trade in list order on
+    each bar.
+    
+    Args:
+        legs (list): Dicts with 'direction' (LONG or SHORT) and float64
+            'entry', 'exit', 'stop' arrays and a boolean 'mask' array
+        initial_capital (float): Starting capital
+        risk_per_trade (float): Maximum risk per trade as fraction
+        store (TradeStore, optional): Store to append trades to
+        
+    Returns:
+        tuple: (store, final_capital)
+    """
+    active = np.zeros(len(legs[0]['mask']) if legs else 0, dtype=bool)
+    for leg in legs:
+        active |= leg['mask']
+    bar_list = np.flatnonzero(active).tolist()
+    
+    if store is None:
+        store = TradeStore(len(legs) * len(bar_list))
+    else:
+        store.reserve(len(store) + len(legs) * len(bar_list))
+    
+    # Python floats iterate far faster than NumPy scalars in a scalar loop
+    leg_lists = [(leg['direction'],
+                  leg['entry'][active].tolist(), leg['exit'][active].tolist(),
+                  leg['stop'][active].tolist(), leg['mask'][active].tolist())
+                 for leg in legs]
+    
+    bars = store.arrays['Bar']
+    directions = store.arrays['Direction']
+    entries = store.arrays['Entry_Price']
+    exits = store.arrays['Exit_Price']
+    quantities = store.arrays['Quantity']
+    pnls = store.arrays['PnL']
+    pnl_percents = store.arrays['PnL_Percent']
+    capitals = store.arrays['Capital_After']
+    
+    n = len(store)
+    capital = initial_capital
+    
+    for j, bar in enumerate(bar_list):
+        for direction, entry_list, exit_list, stop_list, mask_list in leg_lists:
+            if not mask_list[j]:
+                continue
+            entry, exit_, stop = entry_list[j], exit_list[j], stop_list[j]
+            
+            risk_per_unit = abs(entry - stop)
+            if risk_per_unit == 0:
+                continue
+            position_size = int(capital * risk_per_trade / risk_per_unit)
+            max_affordable = int(capital / entry)
+            quantity = min(position_size, max_affordable)
+            
+            if quantity != 0:
+                move = exit_ - entry if direction == LONG else entry - exit_
+                pnl = move * quantity
+                capital += pnl
+                bars[n] = bar
+                directions[n] = direction
+                entries[n] = entry
+                exits[n] = exit_
+                quantities[n] = quantity
+                pnls[n] = pnl
+                pnl_percents[n] = (move / entry) * 100
+                capitals[n] = capital
+                n += 1
+    
+    store.size = n
+    
+    return store, capital
+
+
+DEFAULT_STRATEGY = 'high_low'
+STRATEGIES = {}
+
+
+def register_strategy(name, description=''):
+    """
+    Register a vectorized strategy under ``name``.
+    
+    A strategy is a function ``strategy(df, **params)`` over the whole OHLC
+    frame. It returns a dict mapping LONG and/or SHORT to a leg dict of
+    float arrays 'entry' and 'exit', a boolean 'mask' of the bars to trade
+    and optionally 'stop' (the stop-loss used for position sizing; defaults
+    to 'exit', as in the built-in strategy). Use as a decorator.
+    """
+    def decorator(func):
+        func.description = description
+        STRATEGIES[name] = func
+        return func
+    return decorator
+
+
+@register_strategy('high_low', 'Long high->low and short low->high on every bar with a range (default)')
+def high_low_strategy(df):
+    high = df['High'].to_numpy(dtype=np.float64)
+    low = df['Low'].to_numpy(dtype=np.float64)
+    # Skip if high equals low (no opportunity)
+    mask = high != low
+    return {
+        LONG: {'entry': high, 'exit': low, 'mask': mask},
+        SHORT: {'entry': low, 'exit': high, 'mask': mask},
+    }
+
+
+@register_strategy('open_close', 'Long and short from the open to the close')
+def open_close_strategy(df):
+    open_ = df['Open'].to_numpy(dtype=np.float64)
+    close = df['Close'].to_numpy(dtype=np.float64)
+    mask = open_ != close
+    return {
+        LONG: {'entry': open_, 'exit': close, 'mask': mask},
+        SHORT: {'entry': open_, 'exit': close, 'mask': mask},
+    }
+
+
+@register_strategy('wide_range', 'high_low only on bars whose range is at least min_range_pct of the close')
+def wide_range_strategy(df, min_range_pct=1.0):
+    legs = high_low_strategy(df)
+    close = df['Close'].to_numpy(dtype=np.float64)
+    wide = (legs[LONG]['entry'] - legs[LONG]['exit']) / close * 100 >= float(min_range_pct)
+    for leg in legs.values():
+        leg['mask'] = leg['mask'] & wide
+    return legs
+
+
+def parse_strategy_spec(spec):
+    """
+    Split a strategy spec ``name`` or ``name:key=value,key=value``.
+    
+    Returns:
+        tuple: (name, params dict)
+        
+    Raises:
+        ValueError: If the strategy is not registered, a parameter is malformed
+            or the strategy function does not take it
+    """
+    name, _, param_text = spec.partition(':')
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {name}. Registered: {', '.join(STRATEGIES)}")
+    
+    # Keyword parameters of the strategy, after the data frame
+    signature = list(inspect.signature(STRATEGIES[name]).parameters.values())[1:]
+    accepted = [p.name for p in signature if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+    any_keyword = any(p.kind == p.VAR_KEYWORD for p in signature)
+    
+    params = {}
+    for item in filter(None, param_text.split(',')):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Invalid strategy parameter '{item}' in '{spec}' (expected key=value)")
+        key = key.strip()
+        if key not in accepted and not any_keyword:
+            raise ValueError(f"Strategy '{name}' has no parameter '{key}' "
+                             f"(accepts: {', '.join(accepted) or 'none'})")
+        params[key] = value.strip()
+    return name, params
+
+
+def strategy_legs(df, strategy=DEFAULT_STRATEGY, trade_type='both'):
+    """
+    Evaluate a strategy over ``df`` and return its legs for simulate_signals.
+    
+    Args:
+        df (pandas.DataFrame): OHLC data
+        strategy (str or callable): Strategy spec (see parse_strategy_spec)
+            or a strategy function
+        trade_type (str): 'long', 'short' or 'both'
+        
+    Returns:
+        list: Leg dicts, long before short
+    """
+    if callable(strategy):
+        signals = strategy(df)
+    else:
+        name, params = parse_strategy_spec(strategy)
+        signals = STRATEGIES[name](df, **params)
+    
+    legs = []
+    for direction, wanted in ((LONG, ['long', 'both']), (SHORT, ['short', 'both'])):
+        if trade_type in wanted and direction in signals:
+            leg = signals[direction]
+            entry = np.asarray(leg['entry'], dtype=np.float64)
+            exit_ = np.asarray(leg['exit'], dtype=np.float64)
+            stop = np.asarray(leg.get('stop', exit_), dtype=np.float64)
+            mask = np.asarray(leg['mask'], dtype=bool) & np.isfinite(entry) & np.isfinite(exit_)
+            legs.append({'direction': direction, 'entry': entry, 'exit': exit_, 'stop': stop, 'mask': mask})
+    return legs
+
+
+class NiftyTradeCalculator:
+    """
+    Calculator for Nifty trading returns based on OHLC strategy with risk management.
+    """
+    
+    def __init__(self, initial_capital=100000, risk_per_trade=0.02):
+        """
+        Initialize the calculator with capital and risk parameters.
+        
+        Args:
+            initial_capital (float): Starting capital amount (default: 100,000)
+            risk_per_trade (float): Maximum risk per trade as fraction (default: 0.02 for 2%)
+        """
+        self.initial_capital = initial_capital
+        self.current_capital = initial_capital
+        self.risk_per_trade = risk_per_trade
+        self.trades = TradeStore()
+        self.stats = TradeStatsAccumulator()
+        self._stats_offset = 0
+        self.last_date = None
+        self.load_info = {}
+        self._range_index = None
+        
+    def load_data(self, filepath, cache_dir=None, start=None, end=None, intraday=False,
+                  chunksize=INTRADAY_CHUNK_ROWS, date_format=None, compact=False):
+        """
+        Load OHLC data from CSV or TXT file.
+        
+        Expected format: Date, Open, High, Low, Close
+        Handles various date formats and separators (comma, tab, semicolon, pipe).
+        The separator and header layout are detected from the first few KB
+        (see sniff_ohlc_format) and the file is then parsed once, reading only
+        the five mapped columns. How the format was detected is recorded in
+        ``self.load_info``.
+        
+        With ``cache_dir`` the cleaned data is kept in an OHLCCache, so an
+        unchanged file is loaded from memory-mapped arrays without parsing.
+        The cleaning warnings printed on the first load are stored with the
+        entry and printed again on every cache hit.
+        
+        With ``intraday`` the file holds intraday (e.g. 1-minute) bars; it is
+        streamed in chunks of ``chunksize`` rows and aggregated to daily bars
+        (see aggregate_intraday) before the usual cleaning and validation.
+        
+        Dates are parsed with one format, ``date_format`` or one inferred from
+        a sample of the column (see parse_dates), in a single vectorized pass;
+        dates that do not match it are counted and reported.
+        
+        With ``compact`` the data is returned as a CompactOHLC (int32 day
+        numbers, float32 prices where exact), which decodes to the same values
+        column by column at about half the memory.
+        
+        Args:
+            filepath (str or Path): Path to the data file
+            cache_dir (str or Path, optional): Directory of the binary data cache
+            start (str or datetime, optional): Keep only dates on or after this
+            end (str or datetime, optional): Keep only dates on or before this
+            intraday (bool): Aggregate intraday bars to daily bars while reading
+            chunksize (int): Rows per chunk when streaming intraday data
+            date_format (str, optional): strptime format or 'epoch:<unit>' of
+                the Date column (default: inferred)
+            compact (bool): Return the data as a CompactOHLC
+            
+        Returns:
+            pandas.DataFrame or CompactOHLC: Loaded and validated OHLC data
+            
+        Raises:
+            FileNotFoundError: If file doesn't exist
+            ValueError: If data format is invalid
+        """
+        filepath = Path(filepath)
+        
+        if not filepath.exists():
+            raise FileNotFoundError(f"Data file not found: {filepath}")
+        
+        source_size = filepath.stat().st_size
+        cache = OHLCCache(cache_dir) if cache_dir else None
+        variant = '|'.join(part for part in ('intraday' if intraday else '',
+                                             f"date_format={date_format}" if date_format else '') if part)
+        cached = cache.load(filepath, start, end, variant=variant) if cache else None
+        
+        if cached:
+            df, meta = cached
+            self.load_info = dict(meta['load_info'], cache='hit')
+            for warning in self.load_info.get('warnings', []):
+                print(warning)
+        else:
+            with _capture_warnings() as warnings:
+                if intraday:
+                    df = self._aggregate_and_clean(filepath, chunksize, date_format)
+                else:
+                    df = self._parse_and_clean(filepath, date_format)
+            self.load_info['warnings'] = warnings
+            if cache:
+                cache.store(filepath, df, self.load_info, variant=variant)
+                self.load_info['cache'] = 'stored'
+            
+            lo, hi = date_range_bounds(df['Date'].to_numpy(), start, end)
+            if (lo, hi) != (0, len(df)):
+                df = df.iloc[lo:hi].reset_index(drop=True)
+        
+        if len(df) == 0:
+            raise ValueError("No data rows in the requested date range")
+        
+        self.load_info['source_size'] = source_size
+        info = self.load_info
+        source = 'binary cache' if info.get('cache') == 'hit' else info['parse']
+        print(f"\nData loaded successfully:")
+        print(f"  - Format: {SEPARATOR_NAMES.get(info['separator'], repr(info['separator']))}-separated, "
+              f"{'header row' if info['header'] else 'no header'} "
+              f"(detected via {info['method']}, {source})")
+        if 'date_format' in info:
+            print(f"  - Date format: {info['date_format'] or 'inferred by pandas'} "
+                  f"({'inferred' if info['date_inferred'] else 'given'}"
+                  f"{', %d unparsable' % info['date_failures'] if info['date_failures'] else ''})")
+        print(f"  - Total records: {len(df)}")
+        print(f"  - Date range: {df['Date'].min().date()} to {df['Date'].max().date()}")
+        print(f"  - Price range: {df['Low'].min():.2f} to {df['High'].max():.2f}")
+        
+        if compact:
+            full_bytes = int(df.memory_usage(index=False).sum())
+            df = CompactOHLC.from_frame(df)
+            narrowed = [name for name, array in df.arrays.items() if array.itemsize == 4]
+            print(f"  - Compact storage: {df.nbytes / 2**20:.2f} MB instead of {full_bytes / 2**20:.2f} MB "
+                  f"({', '.join(narrowed) or 'no columns'} narrowed)")
+        
+        return df
+    
+    def _parse_and_clean(self, filepath, date_format=None):
+        """
+        Parse an OHLC file and apply load_data's cleaning and validation rules.
+        """
+        # Detect separator and header layout from the first few KB, then parse once
+        layout = sniff_ohlc_format(filepath)
+        df, parse_note = read_ohlc_columns(filepath, layout)
+        
+        self.load_info = {
+            'separator': layout['separator'],
+            'header': layout['header'],
+            'method': layout['method'],
+            'parse': parse_note,
+        }
+        
+        return self.clean_ohlc(df, date_format=date_format)
+    
+    def _aggregate_and_clean(self, filepath, chunksize, date_format=None):
+        """
+        Stream an intraday file into daily bars and apply load_data's cleaning rules.
+        """
+        layout = sniff_ohlc_format(filepath)
+        daily, counts = aggregate_intraday(filepath, layout, chunksize, date_format)
+        
+        if counts['invalid_rows'] > 0:
+            print(f"Warning: Removed {counts['invalid_rows']} intraday rows with missing/invalid data")
+        
+        self.load_info = {
+            'separator': layout['separator'],
+            'header': layout['header'],
+            'method': layout['method'],
+            'parse': f"{counts['rows']:,} intraday rows in {counts['chunks']} chunks "
+                     f"aggregated to {len(daily):,} daily bars",
+            'date_format': counts['date_format'],
+            'date_inferred': counts['date_inferred'],
+            'date_failures': counts['date_failures'],
+        }
+        
+        return self.clean_ohlc(daily)
+    
+    def clean_ohlc(self, df, allow_empty=False, date_format=None):
+        """
+        Coerce types, drop invalid rows, sort by date and validate OHLC relationships.
+        
+        Args:
+            df (pandas.DataFrame): Raw Date/Open/High/Low/Close columns
+            allow_empty (bool): Return an empty frame instead of raising when
+                no valid rows remain
+            date_format (str, optional): Date format (see parse_dates);
+                inferred when None
+            
+        Returns:
+            pandas.DataFrame: Cleaned OHLC data
+        """
+        # Parse dates with a single (given or inferred) format
+        df['Date'], date_info = parse_dates(df['Date'], date_format)
+        self.load_info.update(date_info)
+        
+        # Convert OHLC to numeric (no-op for columns already parsed as float64)
+        for col in ['Open', 'High', 'Low', 'Close']:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        
+        # Remove rows with missing data
+        initial_rows = len(df)
+        df = df.dropna()
+        removed_rows = initial_rows - len(df)
+        
+        if removed_rows > 0:
+            print(f"Warning: Removed {removed_rows} rows with missing/invalid data")
+        
+        if len(df) == 0 and not allow_empty:
+            raise ValueError("No valid data rows after cleaning")
+        
+        # Sort by date
+        df = df.sort_values('Date').reset_index(drop=True)
+        
+        # Validate OHLC relationships
+        invalid_rows = (df['High'] < df['Low']) | (df['High'] < df['Open']) | \
+                      (df['High'] < df['Close']) | (df['Low'] > df['Open']) | \
+                      (df['Low'] > df['Close'])
+        
+        if invalid_rows.any():
+            print(f"Warning: Found {invalid_rows.sum()} rows with invalid OHLC relationships (High < Low, etc.)")
+            df = df[~invalid_rows].reset_index(drop=True)
+        
+        return df
+    
+    def calculate_position_size(self, entry_price, stop_loss_price):
+        """
+        Calculate position size based on risk management rules.
+        
+        Maximum risk per trade is 2% of total capital.
+        Risk per share = |entry_price - stop_loss_price|
+        Position size = (Capital * Risk%) / Risk per share
+        
+        However, maximum capital deployed cannot exceed current capital.
+        
+        Args:
+            entry_price (float): Entry price per unit
+            stop_loss_price (float): Stop loss price per unit
+            
+        Returns:
+            int: Number of units to trade
+        """
+        risk_amount = self.current_capital * self.risk_per_trade
+        risk_per_unit = abs(entry_price - stop_loss_price)
+        
+        if risk_per_unit == 0:
+            return 0
+        
+        # Calculate position size based on risk
+        position_size = int(risk_amount / risk_per_unit)
+        
+        # Ensure we don't exceed current capital
+        max_affordable = int(self.current_capital / entry_price)
+        position_size = min(position_size, max_affordable)
+        
+        return position_size
+    
+    def execute_long_trade(self, date, high, low):
+        """
+        Execute a long trade: Buy at high, sell at low.
+        
+        Args:
+            date: Trading date
+            high (float): Day's high price (entry)
+            low (float): Day's low price (exit)
+            
+        Returns:
+            dict: Trade details
+        """
+        entry_price = high
+        exit_price = low
+        
+        # Position sizing with stop loss at exit price
+        quantity = self.calculate_position_size(entry_price, exit_price)
+        
+        if quantity == 0:
+            return None
+        
+        # Calculate P&L
+        pnl = (exit_price - entry_price) * quantity
+        pnl_percent = ((exit_price - entry_price) / entry_price) * 100
+        
+        # Update capital
+        self.current_capital += pnl
+        
+        trade = {
+            'Date': date,
+            'Direction': 'LONG',
+            'Entry_Price': entry_price,
+            'Exit_Price': exit_price,
+            'Quantity': quantity,
+            'PnL': pnl,
+            'PnL_Percent': pnl_percent,
+            'Capital_After': self.current_capital
+        }
+        
+        return trade
+    
+    def execute_short_trade(self, date, high, low):
+        """
+        Execute a short trade: Sell at low, buy back at high.
+        
+        Args:
+            date: Trading date
+            high (float): Day's high price (exit/cover)
+            low (float): Day's low price (entry)
+            
+        Returns:
+            dict: Trade details
+        """
+        entry_price = low
+        exit_price = high
+        
+        # Position sizing with stop loss at exit price
+        quantity = self.calculate_position_size(entry_price, exit_price)
+        
+        if quantity == 0:
+            return None
+        
+        # Calculate P&L (short trade: profit when price falls)
+        pnl = (entry_price - exit_price) * quantity
+        pnl_percent = ((entry_price - exit_price) / entry_price) * 100
+        
+        # Update capital
+        self.current_capital += pnl
+        
+        trade = {
+            'Date': date,
+            'Direction': 'SHORT',
+            'Entry_Price': entry_price,
+            'Exit_Price': exit_price,
+            'Quantity': quantity,
+            'PnL': pnl,
+            'PnL_Percent': pnl_percent,
+            'Capital_After': self.current_capital
+        }
+        
+        return trade
+    
+    def run_strategy(self, df, trade_type='both', engine='array', resume=False,
+                     strategy=DEFAULT_STRATEGY):
+        """
+        Run the trading strategy on OHLC data.
+        
+        Any other registered ``strategy`` (see register_strategy) is evaluated
+        vectorized over the whole frame and its signals are sized and
+        compounded by simulate_signals. With a CompactOHLC ``df`` the finished
+        trades are compacted as well (see TradeStore.compact).
+        
+        Args:
+            df (pandas.DataFrame): OHLC data
+            trade_type (str): Type of trades - 'long', 'short', or 'both'
+            engine (str): 'array' runs the NumPy-backed kernel over the
+                High/Low columns; 'rows' walks the DataFrame row by row through
+                execute_long_trade/execute_short_trade. Both produce identical
+                trades; use 'rows' when those methods are overridden.
+                'fractional' trades fractional units in closed form
+                (simulate_fractional), an approximation for fast screening.
+            resume (bool): Continue the statistics of a restored checkpoint
+                instead of starting them afresh
+            strategy (str or callable): Strategy spec such as 'open_close' or
+                'wide_range:min_range_pct=1.5', or a strategy function
+            
+        Returns:
+            TradeStore: All trades executed
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}. Expected one of {ENGINES}")
+        custom = strategy != DEFAULT_STRATEGY
+        if custom and engine != 'array':
+            raise ValueError("Strategies other than the default run on the 'array' engine only")
+        compact = isinstance(df, CompactOHLC)
+        if compact and engine == 'rows':
+            df = df.to_frame()
+        signal_legs = strategy_legs(df, strategy, trade_type) if custom else None
+        
+        # At most one trade per bar and leg
+        legs = 2 if trade_type == 'both' else 1
+        self.trades = TradeStore(legs * len(df), fractional=engine == 'fractional')
+        if not resume:
+            self.stats = TradeStatsAccumulator()
+        self._stats_offset = self.stats.count
+        
+        print(f"\nExecuting {trade_type.upper()} strategy...")
+        print(f"Initial Capital: ₹{self.initial_capital:,.2f}")
+        print(f"Risk per trade: {self.risk_per_trade * 100}%")
+        if custom:
+            print(f"Strategy: {getattr(strategy, '__name__', strategy)}")
+        
+        if custom:
+            _, self.current_capital = simulate_signals(
+                signal_legs, self.current_capital, self.risk_per_trade, store=self.trades)
+            self.trades.column('Date')[:] = df['Date'].to_numpy()[self.trades.column('Bar')]
+            self._sync_accumulator()
+        elif engine == 'array':
+            self._run_array_engine(df, trade_type)
+        elif engine == 'fractional':
+            self._run_fractional_engine(df, trade_type)
+        else:
+            self._run_row_engine(df, trade_type)
+        
+        if len(df):
+            self.last_date = df['Date'].iloc[-1]
+        if compact:
+            self._sync_accumulator()
+            self.trades.compact()
+        
+        print(f"Total trades executed: {len(self.trades)}")
+        
+        return self.trades
+    
+    def _run_row_engine(self, df, trade_type):
+        """
+        Execute the strategy one DataFrame row at a time.
+        """
+        for bar, (idx, row) in enumerate(df.iterrows()):
+            date = row['Date']
+            high = row['High']
+            low = row['Low']
+            
+            # Skip if high equals low (no opportunity)
+            if high == low:
+                continue
+            
+            if trade_type in ['long', 'both']:
+                trade = self.execute_long_trade(date, high, low)
+                if trade:
+                    self.trades.append(trade, bar)
+                    self.stats.update(trade['PnL'], trade['PnL_Percent'], trade['Capital_After'])
+            
+            if trade_type in ['short', 'both']:
+                trade = self.execute_short_trade(date, high, low)
+                if trade:
+                    self.trades.append(trade, bar)
+                    self.stats.update(trade['PnL'], trade['PnL_Percent'], trade['Capital_After'])
+    
+    def _run_array_engine(self, df, trade_type):
+        """
+        Execute the strategy with simulate_high_low over the High/Low arrays.
+        """
+        _, self.current_capital = simulate_high_low(
+            df['High'].to_numpy(dtype=np.float64),
+            df['Low'].to_numpy(dtype=np.float64),
+            self.current_capital,
+            self.risk_per_trade,
+            trade_long=trade_type in ['long', 'both'],
+            trade_short=trade_type in ['short', 'both'],
+            store=self.trades
+        )
+        
+        self.trades.column('Date')[:] = df['Date'].to_numpy()[self.trades.column('Bar')]
+        self._sync_accumulator()
+    
+    def _run_fractional_engine(self, df, trade_type):
+        """
+        Execute the strategy in fractional units with simulate_fractional.
+        """
+        _, self.current_capital = simulate_fractional(
+            df['High'].to_numpy(dtype=np.float64),
+            df['Low'].to_numpy(dtype=np.float64),
+            self.current_capital,
+            self.risk_per_trade,
+            trade_long=trade_type in ['long', 'both'],
+            trade_short=trade_type in ['short', 'both'],
+            store=self.trades
+        )
+        
+        self.trades.column('Date')[:] = df['Date'].to_numpy()[self.trades.column('Bar')]
+        self._sync_accumulator()
+    
+    def _sync_accumulator(self):
+        """
+        Feed any trades not yet seen by self.stats into it and return it.
+        """
+        start = self.stats.count - self._stats_offset
+        if start < len(self.trades):
+            self.stats.update_arrays(
+                self.trades.column('PnL')[start:],
+                self.trades.column('PnL_Percent')[start:],
+                self.trades.column('Capital_After')[start:]
+            )
+        return self.stats
+    
+    def calculate_statistics(self):
+        """
+        Calculate comprehensive trading statistics.
+        
+        The figures come from the TradeStatsAccumulator maintained while the
+        strategy runs, so this is O(1) however many trades were executed.
+        
+        Returns:
+            dict: Dictionary containing all statistics
+        """
+        accumulator = self._sync_accumulator()
+        
+        if accumulator.count == 0:
+            return {
+                'error': 'No trades executed'
+            }
+        
+        # Basic statistics
+        total_trades = accumulator.count
+        
+        total_return = self.current_capital - self.initial_capital
+        total_return_percent = (total_return / self.initial_capital) * 100
+        
+        # Win/Loss statistics
+        num_wins = accumulator.wins
+        num_losses = accumulator.losses
+        win_rate = (num_wins / total_trades) * 100 if total_trades > 0 else 0
+        
+        avg_win = accumulator.gross_profit / num_wins if num_wins > 0 else 0
+        avg_loss = accumulator.gross_loss / num_losses if num_losses > 0 else 0
+        
+        max_drawdown = accumulator.max_drawdown
+        
+        # Risk-adjusted metrics
+        avg_return = accumulator.mean
+        std_return = accumulator.std
+        
+        # Sharpe Ratio (assuming 0% risk-free rate, annualized)
+        # Using 252 trading days per year approximation
+        sharpe_ratio = (avg_return / std_return) * np.sqrt(252) if std_return != 0 else 0
+        
+        # Profit factor
+        total_wins = accumulator.gross_profit if num_wins > 0 else 0
+        total_losses = abs(accumulator.gross_loss) if num_losses > 0 else 1
+        profit_factor = total_wins / total_losses if total_losses != 0 else float('inf')
+        
+        # Expectancy
+        expectancy = (win_rate/100 * avg_win) - ((100-win_rate)/100 * abs(avg_loss))
+        
+        stats = {
+            'Initial_Capital': self.initial_capital,
+            'Final_Capital': self.current_capital,
+            'Total_Return': total_return,
+            'Total_Return_Percent': total_return_percent,
+            'Total_Trades': total_trades,
+            'Winning_Trades': num_wins,
+            'Losing_Trades': num_losses,
+            'Win_Rate_Percent': win_rate,
+            'Average_Win': avg_win,
+            'Average_Loss': avg_loss,
+            'Largest_Win': accumulator.largest_win if num_wins > 0 else 0,
+            'Largest_Loss': accumulator.largest_loss if num_losses > 0 else 0,
+            'Average_Trade_Return_Percent': avg_return,
+            'Max_Drawdown_Percent': max_drawdown,
+            'Sharpe_Ratio': sharpe_ratio,
+            'Profit_Factor': profit_factor,
+            'Expectancy': expectancy
+        }
+        
+        return stats
+    
+    def range_index(self):
+        """
+        Return the TradeRangeIndex over the current trades.
+        
+        It is built on first use after a run and reused until the trades change.
+        """
+        if (self._range_index is None or self._range_index[0] is not self.trades or
+                self._range_index[1] != len(self.trades)):
+            self._range_index = (self.trades, len(self.trades), TradeRangeIndex(self.trades))
+        return self._range_index[2]
+    
+    def range_statistics(self, ranges):
+        """
+        Statistics for many date ranges of the finished run, e.g.
+        ``['2020', '2020-02-19:2020-03-23', '2021:']``.
+        
+        Args:
+            ranges (list): Range specs (see parse_date_range) or (start, end) tuples
+            
+        Returns:
+            pandas.DataFrame: One row per range (see TradeRangeIndex.query)
+        """
+        return self.range_index().query_many(ranges)
+    
+    def generate_trade_log(self, output_file=None, append=False):
+        """
+        Generate detailed trade log.
+        
+        The log is always returned as a formatted DataFrame. With
+        ``output_file`` it is also saved (see write_trade_log); to save a
+        large log without building the formatted copy, call write_trade_log
+        directly.
+        
+        Args:
+            output_file (str, optional): Path to save the trade log
+            append (bool): Append rows (without header) to an existing CSV log
+            
+        Returns:
+            pandas.DataFrame: Trade log dataframe (string dates, rounded values)
+        """
+        if not self.trades:
+            print("No trades to log")
+            return None
+        
+        df_trades = self.trades.to_frame()
+        
+        # Format for better readability
+        df_trades['Date'] = df_trades['Date'].dt.strftime('%Y-%m-%d')
+        
+        # Round numeric columns
+        numeric_cols = ['Entry_Price', 'Exit_Price', 'PnL', 'PnL_Percent', 'Capital_After']
+        for col in numeric_cols:
+            df_trades[col] = df_trades[col].round(2)
+        
+        if output_file:
+            self.write_trade_log(output_file, append=append)
+        
+        return df_trades
+    
+    def write_trade_log(self, output_file, append=False):
+        """
+        Stream the trade log to ``output_file`` without building a DataFrame.
+        
+        The trades are written in batches by a TradeLogWriter; the format
+        follows the extension (.csv, .csv.gz, .csv.zst, .parquet,
+        .feather/.arrow). CSV output matches generate_trade_log's formatting.
+        
+        Args:
+            output_file (str): Path to save the trade log
+            append (bool): Append rows (without header) to an existing CSV log
+            
+        Returns:
+            int: Number of trades written
+        """
+        if not self.trades:
+            print("No trades to log")
+            return 0
+        
+        with TradeLogWriter(output_file, append=append, fractional=self.trades.fractional) as writer:
+            writer.write_store(self.trades)
+        print(f"\nTrade log {'appended to' if append else 'saved to'}: {output_file}")
+        return len(self.trades)
+    
+    def save_checkpoint(self, checkpoint_file, source, trade_type, trade_log=None,
+                        engine='array'):
+        """
+        Save the state needed to continue this run on rows appended to ``source``.
+        
+        The checkpoint records current_capital, the last processed date, the
+        statistics accumulator, the byte offset up to which the source was
+        processed (plus a fingerprint of the bytes before it), the date format
+        of the source and the size of the trade log written so far.
+        
+        Args:
+            checkpoint_file (str): Path of the JSON checkpoint to write
+            source (str or Path): Data file the run was loaded from
+            trade_type (str): Trade type of the run
+            trade_log (str, optional): Trade log CSV written by this run
+            engine (str): Simulation engine of the run (one of ENGINES)
+        """
+        source = Path(source)
+        offset = self.load_info.get('source_size', source.stat().st_size)
+        self._sync_accumulator()
+        
+        log_state = None
+        if trade_log and Path(trade_log).exists():
+            log_state = {
+                'path': str(Path(trade_log).resolve()),
+                'offset': Path(trade_log).stat().st_size,
+                'rows': self.stats.count,
+            }
+        
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'source': str(source.resolve()),
+            'source_offset': offset,
+            'source_fingerprint': _prefix_fingerprint(source, offset),
+            'initial_capital': self.initial_capital,
+            'risk_per_trade': self.risk_per_trade,
+            'trade_type': trade_type,
+            'engine': engine,
+            'current_capital': float(self.current_capital),
+            'last_date': None if self.last_date is None else str(pd.Timestamp(self.last_date)),
+            'date_format': self.load_info.get('date_format'),
+            'stats': self.stats.state(),
+            'trade_log': log_state,
+        }
+        
+        tmp = f"{checkpoint_file}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, checkpoint_file)
+        
+        print(f"\nCheckpoint saved to: {checkpoint_file}")
+    
+    def resume_from_checkpoint(self, checkpoint_file, source, trade_type, trade_log=None,
+                               date_format=None, engine='array'):
+        """
+        Restore a checkpoint and load only the rows appended to ``source`` since.
+        
+        The source is read from the saved byte offset, so the already processed
+        history is neither parsed nor simulated again. If ``trade_log`` is the log
+        recorded in the checkpoint it is truncated back to the recorded size, so
+        new trades can be appended to it. Appended dates are parsed with the
+        format recorded in the checkpoint, since a few new rows are often too
+        few to tell DD/MM from MM/DD.
+        
+        Args:
+            checkpoint_file (str): Path of the JSON checkpoint
+            source (str or Path): Data file to continue on
+            trade_type (str): Trade type of this run
+            trade_log (str, optional): Trade log CSV this run will write
+            date_format (str, optional): Date format overriding the recorded one
+            engine (str): Simulation engine of this run (one of ENGINES)
+            
+        Returns:
+            tuple: (DataFrame of new rows, append_trade_log flag), or
+            (None, False) if the source was rewritten rather than appended to
+            
+        Raises:
+            ValueError: If the checkpoint belongs to another source or parameters
+        """
+        with open(checkpoint_file, 'r') as f:
+            state = json.load(f)
+        
+        source = Path(source)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version in {checkpoint_file}")
+        if state['source'] != str(source.resolve()):
+            raise ValueError(f"Checkpoint {checkpoint_file} was created for {state['source']}")
+        if (state['initial_capital'], state['risk_per_trade'], state['trade_type'], state['engine']) != \
+                (self.initial_capital, self.risk_per_trade, trade_type, engine):
+            raise ValueError("Checkpoint was created with different capital, risk, trade type or engine")
+        
+        offset = state['source_offset']
+        size = source.stat().st_size
+        if size < offset or _prefix_fingerprint(source, offset) != state['source_fingerprint']:
+            print("Warning: Data file was modified, not just appended to; processing full history")
+            return None, False
+        
+        layout = sniff_ohlc_format(source)
+        self.load_info = {
+            'separator': layout['separator'],
+            'header': layout['header'],
+            'method': layout['method'],
+            'parse': 'appended rows',
+            'source_size': size,
+        }
+        if size == offset:
+            raw = pd.DataFrame({name: pd.Series(dtype=object) for name in OHLC_COLUMNS})
+        else:
+            with open(source, 'rb') as f:
+                f.seek(offset)
+                raw, _ = read_ohlc_columns(f, layout, header=False)
+        df = self.clean_ohlc(raw, allow_empty=True, date_format=date_format or state.get('date_format'))
+        
+        last_date = pd.Timestamp(state['last_date']) if state['last_date'] else None
+        if last_date is not None:
+            stale = df['Date'] <= last_date
+            if stale.any():
+                print(f"Warning: Skipped {stale.sum()} appended rows dated on or before {last_date.date()}")
+                df = df[~stale].reset_index(drop=True)
+        
+        self.current_capital = state['current_capital']
+        self.stats = TradeStatsAccumulator.from_state(state['stats'])
+        self._stats_offset = self.stats.count
+        self.trades = TradeStore()
+        self.last_date = last_date
+        
+        append = False
+        log_state = state.get('trade_log')
+        if trade_log and log_state and log_state['path'] == str(Path(trade_log).resolve()) \
+                and Path(trade_log).exists() and Path(trade_log).stat().st_size >= log_state['offset']:
+            with open(trade_log, 'r+b') as f:
+                f.truncate(log_state['offset'])
+            append = True
+        
+        print(f"\nResumed from checkpoint: {checkpoint_file}")
+        print(f"  - Processed through: {last_date.date() if last_date is not None else '-'}")
+        print(f"  - Capital carried over: ₹{self.current_capital:,.2f}")
+        print(f"  - New records: {len(df)} (read from byte {offset:,})")
+        
+        return df, append
+    
+    def print_summary(self):
+        """
+        Print a formatted summary of trading results.
+        """
+        stats = self.calculate_statistics()
+        
+        if 'error' in stats:
+            print(f"\nError: {stats['error']}")
+            return
+        
+        print("\n" + "="*70)
+        print("NIFTY OHLC TRADING STRATEGY - SUMMARY REPORT")
+        print("="*70)
+        
+        print("\n📊 CAPITAL & RETURNS")
+        print(f"  Initial Capital:        ₹{stats['Initial_Capital']:,.2f}")
+        print(f"  Final Capital:          ₹{stats['Final_Capital']:,.2f}")
+        print(f"  Total Return:           ₹{stats['Total_Return']:,.2f}")
+        print(f"  Total Return (%):       {stats['Total_Return_Percent']:.2f}%")
+        
+        print("\n📈 TRADE STATISTICS")
+        print(f"  Total Trades:           {stats['Total_Trades']}")
+        print(f"  Winning Trades:         {stats['Winning_Trades']}")
+        print(f"  Losing Trades:          {stats['Losing_Trades']}")
+        print(f"  Win Rate:               {stats['Win_Rate_Percent']:.2f}%")
+        
+        print("\n💰 PROFIT/LOSS ANALYSIS")
+        print(f"  Average Win:            ₹{stats['Average_Win']:,.2f}")
+        print(f"  Average Loss:           ₹{stats['Average_Loss']:,.2f}")
+        print(f"  Largest Win:            ₹{stats['Largest_Win']:,.2f}")
+        print(f"  Largest Loss:           ₹{stats['Largest_Loss']:,.2f}")
+        print(f"  Avg Trade Return (%):   {stats['Average_Trade_Return_Percent']:.2f}%")
+        
+        print("\n⚠️  RISK METRICS")
+        print(f"  Max Drawdown:           {stats['Max_Drawdown_Percent']:.2f}%")
+        print(f"  Sharpe Ratio:           {stats['Sharpe_Ratio']:.2f}")
+        print(f"  Profit Factor:          {stats['Profit_Factor']:.2f}")
+        print(f"  Expectancy:             ₹{stats['Expectancy']:.2f}")
+        
+        print("\n" + "="*70)
+    
+    def save_summary(self, output_file):
+        """
+        Save summary statistics to a text file.
+        
+        Args:
+            output_file (str): Path to output file
+        """
+        stats = self.calculate_statistics()
+        
+        if 'error' in stats:
+            print(f"Cannot save summary: {stats['error']}")
+            return
+        
+        with open(output_file, 'w') as f:
+            f.write("="*70 + "\n")
+            f.write("NIFTY OHLC TRADING STRATEGY - SUMMARY REPORT\n")
+            f.write("="*70 + "\n\n")
+            
+            f.write("CAPITAL & RETURNS\n")
+            f.write(f"  Initial Capital:        ₹{stats['Initial_Capital']:,.2f}\n")
+            f.write(f"  Final Capital:          ₹{stats['Final_Capital']:,.2f}\n")
+            f.write(f"  Total Return:           ₹{stats['Total_Return']:,.2f}\n")
+            f.write(f"  Total Return (%):       {stats['Total_Return_Percent']:.2f}%\n\n")
+            
+            f.write("TRADE STATISTICS\n")
+            f.write(f"  Total Trades:           {stats['Total_Trades']}\n")
+            f.write(f"  Winning Trades:         {stats['Winning_Trades']}\n")
+            f.write(f"  Losing Trades:          {stats['Losing_Trades']}\n")
+            f.write(f"  Win Rate:               {stats['Win_Rate_Percent']:.2f}%\n\n")
+            
+            f.write("PROFIT/LOSS ANALYSIS\n")
+            f.write(f"  Average Win:            ₹{stats['Average_Win']:,.2f}\n")
+            f.write(f"  Average Loss:           ₹{stats['Average_Loss']:,.2f}\n")
+            f.write(f"  Largest Win:            ₹{stats['Largest_Win']:,.2f}\n")
+            f.write(f"  Largest Loss:           ₹{stats['Largest_Loss']:,.2f}\n")
+            f.write(f"  Avg Trade Return (%):   {stats['Average_Trade_Return_Percent']:.2f}%\n\n")
+            
+            f.write("RISK METRICS\n")
+            f.write(f"  Max Drawdown:           {stats['Max_Drawdown_Percent']:.2f}%\n")
+            f.write(f"  Sharpe Ratio:           {stats['Sharpe_Ratio']:.2f}\n")
+            f.write(f"  Profit Factor:          {stats['Profit_Factor']:.2f}\n")
+            f.write(f"  Expectancy:             ₹{stats['Expectancy']:.2f}\n\n")
+            
+            f.write("="*70 + "\n")
+        
+        print(f"\nSummary saved to: {output_file}")
+
+
+@contextlib.contextmanager
+def _quiet():
+    """
+    Silence the progress output of load_data/run_strategy inside workers.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class _WarningTee(io.TextIOBase):
+    """
+    Pass output through to a stream, keeping the lines that are warnings.
+    """
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.warnings = []
+        self._line = ''
+    
+    def write(self, text):
+        self.stream.write(text)
+        *lines, self._line = (self._line + text).split('\n')
+        self.warnings.extend(line for line in lines if line.startswith('Warning:'))
+        return len(text)
+    
+    def flush(self):
+        self.stream.flush()
+
+
+@contextlib.contextmanager
+def _capture_warnings():
+    """
+    Yield a list collecting the 'Warning:' lines printed inside the block.
+    """
+    tee = _WarningTee(sys.stdout)
+    with contextlib.redirect_stdout(tee):
+        yield tee.warnings
+
+
+# Price arrays of the dataset being swept, memory-mapped in each worker
+_SWEEP_ARRAYS = {}
+
+
+def _init_sweep_worker(array_paths):
+    """
+    Map the shared sweep arrays into this worker process (read-only, no copy).
+    """
+    for name, path in array_paths.items():
+        _SWEEP_ARRAYS[name] = np.load(path, mmap_mode='r')
+
+
+def _run_sweep_job(job):
+    """
+    Backtest one (risk, capital, trade_type) combination on the shared arrays.
+    """
+    risk, capital, trade_type, engine = job
+    calculator = NiftyTradeCalculator(initial_capital=capital, risk_per_trade=risk)
+    highs = _SWEEP_ARRAYS['High']
+    lows = _SWEEP_ARRAYS['Low']
+    
+    if engine in ('array', 'fractional'):
+        simulate = simulate_high_low if engine == 'array' else simulate_fractional
+        calculator.trades = TradeStore(fractional=engine == 'fractional')
+        _, calculator.current_capital = simulate(
+            highs, lows, capital, risk,
+            trade_long=trade_type in ['long', 'both'],
+            trade_short=trade_type in ['short', 'both'],
+            store=calculator.trades
+        )
+    else:
+        df = pd.DataFrame({
+            'Date': np.asarray(_SWEEP_ARRAYS['Date']),
+            'High': np.asarray(highs),
+            'Low': np.asarray(lows),
+        })
+        with _quiet():
+            calculator.run_strategy(df, trade_type=trade_type, engine=engine)
+    
+    row = {'Risk_Per_Trade': risk, 'Capital': capital, 'Trade_Type': trade_type}
+    row.update(calculator.calculate_statistics())
+    return row
+
+
+def run_sweep(df, risks, capitals, trade_types, workers=None, engine='array'):
+    """
+    Backtest every combination of risk fraction, initial capital and trade type.
+    
+    The OHLC data is loaded once by the caller. Its High/Low/Date columns are
+    written to ``.npy`` files in a temporary directory which every worker maps
+    read-only, so the data is shared through the OS page cache instead of
+    being pickled to each process.
+    
+    Args:
+        df (pandas.DataFrame): OHLC data as returned by load_data
+        risks (list): Risk-per-trade fractions
+        capitals (list): Initial capital amounts
+        trade_types (list): Any of 'long', 'short', 'both'
+        workers (int, optional): Worker processes (default: CPU count);
+            1 runs every combination in this process
+        engine (str): Backtest engine, see run_strategy
+        
+    Returns:
+        pandas.DataFrame: One row of calculate_statistics output per combination
+    """
+    jobs = [(risk, capital, trade_type, engine)
+            for risk, capital, trade_type in itertools.product(risks, capitals, trade_types)]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    
+    with tempfile.TemporaryDirectory(prefix='nifty_sweep_') as tmpdir:
+        array_paths = {}
+        for name in ['Date', 'High', 'Low']:
+            path = os.path.join(tmpdir, f"{name}.npy")
+            values = df[name].to_numpy()
+            np.save(path, values if name == 'Date' else values.astype(np.float64))
+            array_paths[name] = path
+        
+        if workers <= 1:
+            _init_sweep_worker(array_paths)
+            try:
+                rows = [_run_sweep_job(job) for job in jobs]
+            finally:
+                _SWEEP_ARRAYS.clear()
+        else:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker,
+                                     initargs=(array_paths,)) as executor:
+                rows = list(executor.map(_run_sweep_job, jobs, chunksize=chunksize))
+    
+    return pd.DataFrame(rows)
+
+
+BATCH_EXTENSIONS = ('.csv', '.txt')
+
+
+def find_batch_files(source):
+    """
+    Resolve a batch source to a sorted list of data files.
+    
+    Args:
+        source (str): Directory (all .csv/.txt files in it) or glob pattern
+        
+    Returns:
+        list: Paths of the matching files
+        
+    Raises:
+        ValueError: If nothing matches
+    """
+    path = Path(source)
+    if path.is_dir():
+        files = [f for f in path.iterdir() if f.is_file() and f.suffix.lower() in BATCH_EXTENSIONS]
+    else:
+        files = [Path(f) for f in glob.glob(source, recursive=True) if Path(f).is_file()]
+    
+    if not files:
+        raise ValueError(f"No data files found for batch source: {source}")
+    
+    return sorted(files)
+
+
+def _run_batch_file(job):
+    """
+    Load, backtest and summarize a single instrument file.
+    
+    Returns:
+        dict: Statistics row on success, or a row with an 'Error' entry
+    """
+    filepath, capital, risk, trade_type, engine, trade_log_dir, load_options = job
+    row = {'File': str(filepath), 'Instrument': Path(filepath).stem}
+    
+    try:
+        calculator = NiftyTradeCalculator(initial_capital=capital, risk_per_trade=risk)
+        with _quiet():
+            df = calculator.load_data(filepath, **load_options)
+            calculator.run_strategy(df, trade_type=trade_type, engine=engine)
+            if trade_log_dir and calculator.trades:
+                calculator.write_trade_log(
+                    os.path.join(trade_log_dir, f"{row['Instrument']}_trades.csv"))
+        
+        stats = calculator.calculate_statistics()
+        if 'error' in stats:
+            # No trades: report the file as skipped rather than as an empty row
+            row['Error'] = stats['error']
+            return row
+        row['Bars'] = len(df)
+        row.update(stats)
+    except Exception as e:
+        row['Error'] = f"{type(e).__name__}: {e}"
+    
+    return row
+
+
+def batch_sort_columns():
+    """
+    Columns of the run_batch summary that it can be sorted by.
+    """
+    return ('Instrument', 'Bars', 'Initial_Capital') + RESULTS_STAT_COLUMNS
+
+
+def run_batch(files, capital=100000, risk=0.02, trade_type='both', workers=None,
+              engine='array', sort_by='Total_Return_Percent', ascending=False,
+              trade_log_dir=None, load_options=None):
+    """
+    Run the strategy over many instrument files on a worker pool.
+    
+    Every file goes through load_data, run_strategy and calculate_statistics
+    in its own worker. A file that fails to load or run is reported in the
+    failures list and left out of the summary; the rest of the batch goes on.
+    
+    Args:
+        files (list): Data file paths
+        capital (float): Initial capital for every instrument
+        risk (float): Risk per trade as fraction
+        trade_type (str): 'long', 'short' or 'both'
+        workers (int, optional): Worker processes (default: CPU count)
+        engine (str): Backtest engine, see run_strategy
+        sort_by (str): Statistic to sort the summary by
+        ascending (bool): Sort order of the summary
+        trade_log_dir (str, optional): Directory for per-file trade log CSVs
+        load_options (dict, optional): Extra keyword arguments for load_data
+            (cache_dir, start, end)
+        
+    Returns:
+        tuple: (summary DataFrame, list of (file, error) failures)
+        
+    Raises:
+        ValueError: If ``sort_by`` is not a summary column
+    """
+    if sort_by not in batch_sort_columns():
+        raise ValueError(f"Unknown statistic to sort by: {sort_by}. "
+                         f"Expected one of {', '.join(batch_sort_columns())}")
+    if trade_log_dir:
+        os.makedirs(trade_log_dir, exist_ok=True)
+    
+    jobs = [(str(f), capital, risk, trade_type, engine, trade_log_dir, load_options or {})
+            for f in files]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    
+    if workers <= 1:
+        rows = [_run_batch_file(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(_run_batch_file, jobs))
+    
+    failures = [(row['File'], row['Error']) for row in rows if 'Error' in row]
+    summary = pd.DataFrame([row for row in rows if 'Error' not in row])
+    
+    if not summary.empty:
+        summary = summary.sort_values(sort_by, ascending=ascending, kind='stable').reset_index(drop=True)
+    
+    return summary, failures
+
+
+JOB_FIELDS = ('input', 'capital', 'risk', 'type', 'output', 'summary')
+JOB_JSON_EXTENSIONS = ('.jsonl', '.ndjson', '.json')
+
+
+def read_job_file(path, defaults=None):
+    """
+    Read a file of backtest job specs.
+    
+    ``.jsonl``/``.ndjson``/``.json`` files hold one JSON object per line;
+    anything else is read as CSV with a header row. Each job has the fields
+    of JOB_FIELDS: ``input`` (required), ``capital``, ``risk``, ``type``,
+    ``output`` (trade log) and ``summary``. Missing or empty fields take the
+    value from ``defaults``.
+    
+    Args:
+        path (str): Job file
+        defaults (dict, optional): Default capital, risk and type
+        
+    Returns:
+        list: One dict per job with every field of JOB_FIELDS
+        
+    Raises:
+        FileNotFoundError: If the job file does not exist
+        ValueError: If a job has unknown fields, no input or invalid values
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Job file not found: {path}")
+    defaults = {'capital': 100000, 'risk': 0.02, 'type': 'both', **(defaults or {})}
+    
+    with open(path, newline='') as f:
+        if path.suffix.lower() in JOB_JSON_EXTENSIONS:
+            specs = []
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    specs.append((line_number, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path} line {line_number}: invalid JSON ({e})")
+        else:
+            # Line 1 is the header
+            specs = [(line_number, row) for line_number, row in enumerate(csv.DictReader(f), 2)]
+    
+    jobs = []
+    for line_number, spec in specs:
+        where = f"{path} line {line_number}"
+        if not isinstance(spec, dict):
+            raise ValueError(f"{where}: a job must be an object with fields {', '.join(JOB_FIELDS)}")
+        unknown = set(spec) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"{where}: unknown job fields {', '.join(sorted(map(str, unknown)))}")
+        
+        job = {field: defaults.get(field) for field in JOB_FIELDS}
+        job.update({field: value for field, value in spec.items() if value not in (None, '')})
+        if not job['input']:
+            raise ValueError(f"{where}: job has no input file")
+        try:
+            job['capital'] = float(job['capital'])
+            job['risk'] = float(job['risk'])
+        except (TypeError, ValueError):
+            raise ValueError(f"{where}: capital and risk must be numbers")
+        if job['type'] not in ('long', 'short', 'both'):
+            raise ValueError(f"{where}: type must be long, short or both, not {job['type']!r}")
+        jobs.append(job)
+    
+    return jobs
+
+
+def run_jobs(jobs, engine='array', load_options=None, results_store=None):
+    """
+    Run a list of job specs (see read_job_file) one after another in this process.
+    
+    Each input file is loaded once and its DataFrame reused by every job
+    that names the same file, then released after the last of them. A job
+    that fails is reported in the failures list and the rest go on.
+    
+    Args:
+        jobs (list): Job dicts with the fields of JOB_FIELDS
+        engine (str): Backtest engine, see run_strategy
+        load_options (dict, optional): Extra keyword arguments for load_data
+        results_store (ResultsStore, optional): Record every job's run,
+            statistics and trades
+        
+    Returns:
+        tuple: (summary DataFrame with one row per successful job in job
+        order, list of (job number, input, error) failures)
+    """
+    load_options = load_options or {}
+    last_use = {}
+    for number, job in enumerate(jobs, 1):
+        last_use[str(Path(job['input']).resolve())] = number
+    
+    datasets = {}
+    rows = []
+    failures = []
+    for number, job in enumerate(jobs, 1):
+        key = str(Path(job['input']).resolve())
+        row = {'Job': number, 'Input': job['input'], 'Capital': job['capital'],
+               'Risk_Per_Trade': job['risk'], 'Trade_Type': job['type']}
+        
+        try:
+            calculator = NiftyTradeCalculator(initial_capital=job['capital'], risk_per_trade=job['risk'])
+            with _quiet():
+                if key not in datasets:
+                    try:
+                        datasets[key] = (calculator.load_data(job['input'], **load_options),
+                                         calculator.load_info)
+                    except Exception as e:
+                        datasets[key] = e
+                if isinstance(datasets[key], Exception):
+                    raise datasets[key]
+                df, load_info = datasets[key]
+                calculator.load_info = dict(load_info)
+                
+                calculator.run_strategy(df, trade_type=job['type'], engine=engine)
+                if job['output'] and calculator.trades:
+                    calculator.write_trade_log(job['output'])
+                if job['summary']:
+                    calculator.save_summary(job['summary'])
+            
+            row['Bars'] = len(df)
+            row.update(calculator.calculate_statistics())
+            if results_store is not None:
+                row['Run_Id'] = results_store.record_run(
+                    row, trades=calculator.trades, instrument=Path(job['input']).stem,
+                    source=job['input'], strategy=DEFAULT_STRATEGY, engine=engine,
+                    trade_type=job['type'], initial_capital=job['capital'],
+                    risk_per_trade=job['risk'], bars=len(df),
+                    start_date=df['Date'].iloc[0] if len(df) else None,
+                    end_date=df['Date'].iloc[-1] if len(df) else None)
+            rows.append(row)
+        except Exception as e:
+            failures.append((number, job['input'], f"{type(e).__name__}: {e}"))
+        finally:
+            if last_use[key] == number:
+                datasets.pop(key, None)
+    
+    return pd.DataFrame(rows), failures
+
+
+def _simulate_window(highs, lows, min_capital, initial_capital, risk_per_trade,
+                     trade_long=True, trade_short=True, store=None):
+    """
+    simulate_high_low over one window, skipping bars that cannot trade.
+    
+    ``min_capital`` holds, per bar, the capital below which no leg of the bar
+    reaches one unit. Every high/low trade loses, so capital never rises and
+    a bar above the current capital stays untradeable for the rest of the
+    window. The remaining bars are filtered against the capital in blocks
+    that double in size, so once capital is exhausted only the few narrow
+    bars that can still trade one unit are simulated. The trades and final
+    capital are identical to simulate_high_low over the whole window.
+    
+    Returns:
+        tuple: (TradeStore, final capital)
+    """
+    capital = initial_capital
+    position, block = 0, 256
+    while position < len(highs):
+        # Small slack keeps every bar the engine's float rounding could trade
+        candidates = position + np.flatnonzero(min_capital[position:] <= capital * (1 + 1e-9))
+        if len(candidates) == 0:
+            break
+        bars = candidates[:block]
+        store, capital = simulate_high_low(highs[bars], lows[bars], capital, risk_per_trade,
+                                           trade_long=trade_long, trade_short=trade_short, store=store)
+        position, block = int(bars[-1]) + 1, block * 2
+    if store is None:
+        store = TradeStore(0)
+    return store, capital
+
+
+def _prefix_window_extent(capital, ranges, unit_fraction, tolerance):
+    """
+    Decide whether the fractional model answers a window exactly enough.
+    
+    ``capital`` is the fractional equity before each of the window's legs
+    (plus the final value). Truncating a quantity changes one trade's P&L by
+    less than its range, and every later trade scales that difference by its
+    own growth factor, so the integer engine's equity stays within ``D`` of
+    the model, with D_0 = 0 and D_k+1 = D_k * (1 + f_k) + range_k. A leg is
+    certainly executed while ``(capital - D) * unit_fraction >= 1``; from the
+    first leg where that fails, the integer engine must provably skip every
+    remaining leg, since its capital can no longer change.
+    
+    Returns:
+        tuple: (number of legs the integer engine executes, deviation bound
+        relative to the window's first peak), or (None, inf) when the window
+        needs an exact simulation
+    """
+    n = len(ranges)
+    if n == 0:
+        return 0, 0.0
+    with np.errstate(over='ignore', under='ignore', divide='ignore', invalid='ignore'):
+        deviation = capital[1:] * np.cumsum(ranges / capital[1:])
+        before = np.concatenate([[0.0], deviation[:-1]])
+        executed = (capital[:-1] - before) * unit_fraction >= 1 + 1e-9
+        count = n if executed.all() else int(np.argmin(executed))
+        if count < n:
+            # Capital is frozen at no more than capital + D from here on
+            ceiling = capital[count] + before[count]
+            if not np.all(ceiling * unit_fraction[count:] < 1 - 1e-9):
+                return None, np.inf
+        if count == 0:
+            return 0, 0.0
+        # Return and drawdown are relative to the window's first peak or the
+        # initial capital, both at least the first capital after minus D
+        floor = min(capital[0], capital[1] - deviation[0])
+        bound = 2 * deviation[:count].max() / floor if floor > 0 else np.inf
+    if not np.isfinite(bound) or bound > tolerance:
+        return None, bound
+    return count, bound
+
+
+def walk_forward(df, window_years=3, step_months=1, initial_capital=100000,
+                 risk_per_trade=0.02, trade_type='both', tolerance=1e-3):
+    """
+    Rolling-window backtests with capital reset at the start of every window.
+    
+    Instead of re-running the strategy per window, every trade's equity
+    multiplier is computed once in the fractional-unit model
+    (fractional_trade_legs) and each window is answered from shared prefix
+    arrays: log-equity prefix sums give the total return, prefix counts the
+    win rate, prefix sums of PnL_Percent and its square the Sharpe ratio, and
+    a DrawdownSegmentTree over log equity the max drawdown.
+    
+    Integer quantities make the real engine deviate from that model by less
+    than ``|high - low|`` of P&L per trade, compounded by the later trades
+    (see _prefix_window_extent). Once its quantities round to zero the engine
+    stops trading, so a window is answered from the prefix arrays up to that
+    leg when the engine provably trades nothing after it and the deviation
+    bound is within ``tolerance``. Other windows are simulated exactly, with
+    bars that cannot trade at the current capital skipped (_simulate_window).
+    
+    Args:
+        df (pandas.DataFrame): OHLC data as returned by load_data
+        window_years (int): Window length in years
+        step_months (int): Months between consecutive window starts
+        initial_capital (float): Capital at the start of every window
+        risk_per_trade (float): Maximum risk per trade as fraction
+        trade_type (str): 'long', 'short' or 'both'
+        tolerance (float): Largest accepted relative deviation of the prefix
+            result from the integer-quantity engine
+        
+    Returns:
+        pandas.DataFrame: One row per window with Window_Start, Window_End,
+        Total_Trades, Total_Return_Percent, Win_Rate_Percent, Sharpe_Ratio,
+        Max_Drawdown_Percent, Method ('prefix' or 'exact') and Deviation_Bound
+        (inf where the integer engine's trades cannot be pinned down)
+    """
+    dates = df['Date'].to_numpy()
+    highs = df['High'].to_numpy(dtype=np.float64)
+    lows = df['Low'].to_numpy(dtype=np.float64)
+    trade_long = trade_type in ['long', 'both']
+    trade_short = trade_type in ['short', 'both']
+    
+    legs = fractional_trade_legs(highs, lows, risk_per_trade, trade_long, trade_short)
+    leg_dates = dates[legs['Bar']]
+    # Units traded per unit of capital; the integer engine trades int(capital * this)
+    unit_fraction = np.minimum(risk_per_trade / legs['Range'], 1 / legs['Entry_Price'])
+    
+    # Prefix arrays over trades: position k holds the total of trades [0, k)
+    log_growth = np.log1p(legs['Fraction'])
+    log_equity = np.concatenate([[0.0], np.cumsum(log_growth)])
+    wins = np.concatenate([[0], np.cumsum(legs['Fraction'] > 0)])
+    returns = legs['PnL_Percent']
+    shift = returns.mean() if len(returns) else 0.0
+    centered = returns - shift
+    sum_returns = np.concatenate([[0.0], np.cumsum(centered)])
+    sum_squares = np.concatenate([[0.0], np.cumsum(centered * centered)])
+    drawdown_tree = DrawdownSegmentTree(log_equity[1:])
+    
+    # Smallest capital at which a bar trades one unit of its cheaper leg
+    with np.errstate(divide='ignore', invalid='ignore'):
+        min_capital = np.maximum(np.abs(highs - lows) / risk_per_trade, lows if trade_short else highs)
+    min_capital[(highs == lows) | np.isnan(min_capital)] = np.inf
+    if np.any(highs < lows):
+        # Such bars gain, so capital can rise again and no bar may be skipped
+        min_capital[:] = -np.inf
+    
+    first, last = pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])
+    window = pd.DateOffset(years=window_years)
+    step = pd.DateOffset(months=step_months)
+    
+    rows = []
+    start = first
+    while start + window <= last + pd.Timedelta(days=1):
+        end = start + window
+        lo, hi = np.searchsorted(leg_dates, [np.datetime64(start), np.datetime64(end)], side='left')
+        
+        with np.errstate(over='ignore', under='ignore'):
+            capital = initial_capital * np.exp(log_equity[lo:hi + 1] - log_equity[lo])
+        n, bound = _prefix_window_extent(capital, legs['Range'][lo:hi], unit_fraction[lo:hi], tolerance)
+        
+        row = {'Window_Start': start, 'Window_End': end - pd.Timedelta(days=1)}
+        
+        if n is not None:
+            stop = lo + n
+            mean = (sum_returns[stop] - sum_returns[lo]) / n + shift if n else np.nan
+            variance = ((sum_squares[stop] - sum_squares[lo]) - (sum_returns[stop] - sum_returns[lo]) ** 2 / n) / (n - 1) \
+                if n > 1 else np.nan
+            std = np.sqrt(max(variance, 0.0)) if n > 1 else np.nan
+            row.update({
+                'Total_Trades': n,
+                'Total_Return_Percent': np.expm1(log_equity[stop] - log_equity[lo]) * 100,
+                'Win_Rate_Percent': (wins[stop] - wins[lo]) / n * 100 if n else 0,
+                'Sharpe_Ratio': (mean / std) * np.sqrt(252) if std != 0 else 0,
+                'Max_Drawdown_Percent': np.expm1(drawdown_tree.query(lo, stop)) * 100,
+                'Method': 'prefix',
+            })
+        else:
+            bar_lo, bar_hi = np.searchsorted(dates, [np.datetime64(start), np.datetime64(end)], side='left')
+            calculator = NiftyTradeCalculator(initial_capital=initial_capital, risk_per_trade=risk_per_trade)
+            _, calculator.current_capital = _simulate_window(
+                highs[bar_lo:bar_hi], lows[bar_lo:bar_hi], min_capital[bar_lo:bar_hi],
+                initial_capital, risk_per_trade, trade_long=trade_long, trade_short=trade_short,
+                store=calculator.trades)
+            stats = calculator.calculate_statistics()
+            row.update({
+                'Total_Trades': stats.get('Total_Trades', 0),
+                'Total_Return_Percent': (calculator.current_capital / initial_capital - 1) * 100,
+                'Win_Rate_Percent': stats.get('Win_Rate_Percent', 0),
+                'Sharpe_Ratio': stats.get('Sharpe_Ratio', np.nan),
+                'Max_Drawdown_Percent': stats.get('Max_Drawdown_Percent', 0.0),
+                'Method': 'exact',
+            })
+        
+        row['Deviation_Bound'] = bound
+        rows.append(row)
+        start = start + step
+    
+    return pd.DataFrame(rows)
+
+
+MC_PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+MC_METHODS = ('bootstrap', 'permute')
+
+# Trade sequence being resampled, set once per Monte Carlo worker
+_MC_TRADES = {}
+
+
+def _init_monte_carlo_worker(fractions, pnl_percent, initial_capital, method):
+    _MC_TRADES.update(fractions=fractions, pnl_percent=pnl_percent,
+                      initial_capital=initial_capital, method=method)
+
+
+def _run_monte_carlo_chunk(job):
+    """
+    Simulate one chunk of resampled paths as a (paths x trades) array batch.
+    """
+    paths, seed = job
+    fractions = _MC_TRADES['fractions']
+    pnl_percent = _MC_TRADES['pnl_percent']
+    n = len(fractions)
+    rng = np.random.default_rng(seed)
+    
+    if _MC_TRADES['method'] == 'bootstrap':
+        index = rng.integers(0, n, size=(paths, n))
+    else:
+        index = rng.permuted(np.broadcast_to(np.arange(n), (paths, n)), axis=1)
+    
+    equity = np.cumprod(1 + fractions[index], axis=1)
+    equity *= _MC_TRADES['initial_capital']
+    running_max = np.maximum.accumulate(equity, axis=1)
+    max_drawdown = ((equity - running_max) / running_max).min(axis=1) * 100
+    
+    returns = pnl_percent[index]
+    std = returns.std(axis=1, ddof=1) if n > 1 else np.full(paths, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std != 0, returns.mean(axis=1) / std * np.sqrt(252), 0.0)
+    
+    return equity[:, -1], max_drawdown, sharpe
+
+
+def monte_carlo(trades, initial_capital, simulations=10000, method='bootstrap', seed=None,
+                chunk_elements=2_000_000, workers=None, return_samples=False):
+    """
+    Resample a finished run's trade sequence to estimate outcome distributions.
+    
+    Each trade's return fraction (PnL / capital before the trade) is either
+    bootstrapped (drawn with replacement) or permuted across thousands of
+    paths. Paths are compounded with batched NumPy operations in chunks of at
+    most ``chunk_elements`` path-trade cells, spread over a process pool.
+    Every chunk gets its own child of ``numpy.random.SeedSequence(seed)``, so a
+    fixed seed gives identical results for any number of workers.
+    
+    Args:
+        trades (TradeStore): Trades of a finished run
+        initial_capital (float): Starting capital of every path
+        simulations (int): Number of resampled paths
+        method (str): 'bootstrap' or 'permute'
+        seed (int, optional): Seed for reproducible results
+        chunk_elements (int): Memory bound per chunk, in path x trade cells
+        workers (int, optional): Worker processes (default: CPU count)
+        return_samples (bool): Also return the per-path samples
+        
+    Returns:
+        pandas.DataFrame: Percentiles (rows) of Final_Capital,
+        Total_Return_Percent, Max_Drawdown_Percent and Sharpe_Ratio; with
+        ``return_samples`` a (table, samples DataFrame) tuple
+    """
+    if method not in MC_METHODS:
+        raise ValueError(f"Unknown Monte Carlo method: {method}. Expected one of {MC_METHODS}")
+    if len(trades) == 0:
+        raise ValueError("Monte Carlo needs a run with at least one trade")
+    
+    pnl = trades.column('PnL')
+    capital_before = trades.column('Capital_After') - pnl
+    fractions = pnl / capital_before
+    pnl_percent = np.array(trades.column('PnL_Percent'))
+    
+    paths_per_chunk = max(1, chunk_elements // len(fractions))
+    sizes = [min(paths_per_chunk, simulations - start) for start in range(0, simulations, paths_per_chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = list(zip(sizes, seeds))
+    initargs = (fractions, pnl_percent, initial_capital, method)
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    
+    if workers <= 1:
+        _init_monte_carlo_worker(*initargs)
+        try:
+            results = [_run_monte_carlo_chunk(job) for job in jobs]
+        finally:
+            _MC_TRADES.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_monte_carlo_worker,
+                                 initargs=initargs) as executor:
+            results = list(executor.map(_run_monte_carlo_chunk, jobs))
+    
+    final_capital = np.concatenate([r[0] for r in results])
+    samples = pd.DataFrame({
+        'Final_Capital': final_capital,
+        'Total_Return_Percent': (final_capital / initial_capital - 1) * 100,
+        'Max_Drawdown_Percent': np.concatenate([r[1] for r in results]),
+        'Sharpe_Ratio': np.concatenate([r[2] for r in results]),
+    })
+    
+    table = samples.quantile([p / 100 for p in MC_PERCENTILES])
+    table.index = [f"P{p}" for p in MC_PERCENTILES]
+    table.index.name = 'Percentile'
+    
+    if return_samples:
+        return table, samples
+    return table
+
+
+# Memory-mapped dataset arrays opened by this server worker, by .npy path
+# Dataset path -> (array directory, memory-mapped arrays) in server workers
+_SERVER_ARRAYS = {}
+
+
+def _run_server_job(job):
+    """
+    Backtest bars [lo, hi) of a server dataset in a worker process.
+    
+    The worker keeps one set of mapped arrays per dataset and replaces it
+    when the dataset is reloaded into a new array directory.
+    
+    Returns:
+        NiftyTradeCalculator: Finished calculator with trimmed trades
+    """
+    dataset, array_paths, lo, hi, capital, risk, trade_type = job
+    directory = os.path.dirname(array_paths['Date'])
+    mapped = _SERVER_ARRAYS.get(dataset)
+    if mapped is None or mapped[0] != directory:
+        mapped = (directory, {name: np.load(path, mmap_mode='r') for name, path in array_paths.items()})
+        _SERVER_ARRAYS[dataset] = mapped
+    arrays = {name: values[lo:hi] for name, values in mapped[1].items()}
+    
+    calculator = NiftyTradeCalculator(initial_capital=capital, risk_per_trade=risk)
+    _, calculator.current_capital = simulate_high_low(
+        arrays['High'], arrays['Low'], capital, risk,
+        trade_long=trade_type in ['long', 'both'],
+        trade_short=trade_type in ['short', 'both'],
+        store=calculator.trades
+    )
+    calculator.trades.trim()
+    calculator.trades.column('Date')[:] = arrays['Date'][calculator.trades.column('Bar')]
+    calculator._sync_accumulator()
+    return calculator
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_finite(value):
+    """
+    Replace NaN and infinite floats (e.g. the Sharpe ratio of a single trade)
+    with None, since strict JSON has no representation for them.
+    """
+    if isinstance(value, dict):
+        return {key: _json_finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_finite(item) for item in value]
+    if isinstance(value, (float, np.floating)) and not np.isfinite(value):
+        return None
+    return value
+
+
+class BacktestServer:
+    """
+    Long-running backtest service over resident OHLC datasets.
+    
+    Datasets are loaded once (through load_data and its binary cache) and
+    kept in memory; their Date/High/Low columns are also saved as ``.npy``
+    files that the worker processes map read-only, as in run_sweep. Each
+    (dataset, capital, risk, type, date range) result is kept in an LRU cache
+    bounded by the bytes of its trade arrays, and concurrent identical
+    requests share one computation. A dataset whose file changes on disk is
+    reloaded and gets new cache keys; the superseded arrays and cached
+    results are dropped once no running backtest uses them.
+    
+    ``input`` paths are resolved against ``data_root`` and must lie inside
+    it, so a server exposed beyond loopback cannot read arbitrary files.
+    
+    Endpoints (GET with query parameters; /backtest also accepts a POST JSON
+    body): /health, /stats, /datasets, /backtest and /trades (paged with
+    ``offset`` and ``limit``). Backtest parameters are ``input``,
+    ``capital``, ``risk``, ``type``, ``start`` and ``end``.
+    """
+    
+    MAX_PAGE = 10000
+    
+    def __init__(self, workers=None, cache_bytes=256 * 2**20, load_options=None,
+                 defaults=None, data_root='.'):
+        """
+        Args:
+            workers (int, optional): Backtest worker processes (default: CPU
+                count); 1 runs backtests in a thread of this process
+            cache_bytes (int): Budget of the result cache in bytes
+            load_options (dict, optional): Extra keyword arguments for load_data
+                (start/end are per request and ignored here)
+            defaults (dict, optional): Default 'capital', 'risk' and 'type'
+            data_root (str): Directory that every ``input`` must lie in
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_bytes = cache_bytes
+        self.load_options = {key: value for key, value in (load_options or {}).items()
+                             if key not in ('start', 'end')}
+        self.defaults = {'capital': 100000.0, 'risk': 0.02, 'type': 'both', **(defaults or {})}
+        self.data_root = Path(data_root).resolve()
+        self.datasets = {}
+        self.retired = []
+        self.results = OrderedDict()
+        self.result_bytes = 0
+        self.pending = {}
+        self.counters = {'requests': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._tmpdir = tempfile.mkdtemp(prefix='nifty_server_')
+        self._generation = itertools.count()
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+    
+    def close(self):
+        self.executor.shutdown()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+    
+    def dataset(self, filepath):
+        """
+        Return the resident dataset for ``filepath``, loading it if needed.
+        
+        Raises:
+            PermissionError: If the path lies outside ``data_root``
+            FileNotFoundError: If the file does not exist
+        """
+        path = (self.data_root / filepath).resolve()
+        if not path.is_relative_to(self.data_root):
+            raise PermissionError(f"Data file is outside the server's data root: {filepath}")
+        if not path.is_file():
+            raise FileNotFoundError(f"Data file not found: {filepath}")
+        stat = path.stat()
+        version = (stat.st_size, stat.st_mtime_ns)
+        
+        # Resident and unchanged: no need to wait behind a load in progress
+        entry = self.datasets.get(str(path))
+        if entry is not None and entry['version'] == version:
+            return entry
+        
+        with self._load_lock:
+            entry = self.datasets.get(str(path))
+            if entry is None or entry['version'] != version:
+                calculator = NiftyTradeCalculator()
+                with _quiet():
+                    df = calculator.load_data(path, **self.load_options)
+                
+                directory = os.path.join(self._tmpdir, str(next(self._generation)))
+                os.makedirs(directory)
+                array_paths = {}
+                for name in ['Date', 'High', 'Low']:
+                    array_paths[name] = os.path.join(directory, f"{name}.npy")
+                    values = df[name].to_numpy()
+                    np.save(array_paths[name], values if name == 'Date' else values.astype(np.float64))
+                
+                entry = {
+                    'path': str(path),
+                    'version': version,
+                    'dates': df['Date'].to_numpy(),
+                    'array_paths': array_paths,
+                    'rows': len(df),
+                    'load_info': calculator.load_info,
+                    'active': 0,
+                }
+                with self._lock:
+                    superseded = self.datasets.get(str(path))
+                    self.datasets[str(path)] = entry
+                if superseded is not None:
+                    self._retire(superseded)
+        return entry
+    
+    def _retire(self, entry):
+        """
+        Drop the cached results of a superseded dataset version and queue its
+        array directory for removal.
+        """
+        with self._lock:
+            for key in [key for key in self.results if key[:2] == (entry['path'], entry['version'])]:
+                self.result_bytes -= self.results.pop(key)['size']
+            self.retired.append(entry)
+        self._purge_retired()
+    
+    def _purge_retired(self):
+        """
+        Delete the array directories of superseded datasets no backtest uses.
+        """
+        with self._lock:
+            idle = [entry for entry in self.retired if entry['active'] == 0]
+            self.retired = [entry for entry in self.retired if entry['active'] > 0]
+        for entry in idle:
+            shutil.rmtree(os.path.dirname(entry['array_paths']['Date']), ignore_errors=True)
+    
+    def backtest(self, params):
+        """
+        Run (or fetch from the cache) the backtest described by ``params``.
+        
+        Returns:
+            tuple: (result dict with 'calculator', 'bars' and 'key', cached flag)
+        """
+        if not params.get('input'):
+            raise ValueError("Missing required parameter: input")
+        capital = float(params.get('capital', self.defaults['capital']))
+        risk = float(params.get('risk', self.defaults['risk']))
+        trade_type = params.get('type', self.defaults['type'])
+        if trade_type not in ('long', 'short', 'both'):
+            raise ValueError(f"Invalid type: {trade_type}")
+        start, end = params.get('start') or None, params.get('end') or None
+        
+        entry = self.dataset(params['input'])
+        lo, hi = date_range_bounds(entry['dates'], start, end)
+        if lo == hi:
+            raise ValueError("No data rows in the requested date range")
+        key = (entry['path'], entry['version'], capital, risk, trade_type, lo, hi)
+        
+        with self._lock:
+            self.counters['requests'] += 1
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.counters['hits'] += 1
+                return self.results[key], True
+            future = self.pending.get(key)
+            if future is None:
+                self.counters['misses'] += 1
+                future = self.executor.submit(
+                    _run_server_job, (entry['path'], entry['array_paths'], lo, hi, capital, risk, trade_type))
+                self.pending[key] = future
+            entry['active'] += 1
+        
+        try:
+            calculator = future.result()
+        finally:
+            with self._lock:
+                self.pending.pop(key, None)
+                entry['active'] -= 1
+            if self.retired:
+                self._purge_retired()
+        result = {'calculator': calculator, 'bars': hi - lo, 'key': key}
+        if self.datasets.get(entry['path']) is entry:
+            self._remember(key, result)
+        return result, False
+    
+    def _remember(self, key, result):
+        size = sum(array.nbytes for array in result['calculator'].trades.arrays.values())
+        if size > self.cache_bytes:
+            return
+        with self._lock:
+            if key in self.results:
+                return
+            self.results[key] = dict(result, size=size)
+            self.result_bytes += size
+            while self.result_bytes > self.cache_bytes:
+                _, evicted = self.results.popitem(last=False)
+                self.result_bytes -= evicted['size']
+                self.counters['evictions'] += 1
+    
+    def handle(self, route, params):
+        """
+        Answer one request.
+        
+        Returns:
+            dict: JSON-serializable response, or None for an unknown endpoint
+        """
+        started = time.perf_counter()
+        
+        if route == '/health':
+            return {'status': 'ok'}
+        if route == '/stats':
+            with self._lock:
+                return dict(self.counters, cached_results=len(self.results),
+                            cache_bytes=self.result_bytes, cache_limit_bytes=self.cache_bytes,
+                            datasets=len(self.datasets), workers=self.workers)
+        if route == '/datasets':
+            # Snapshot, since a load on another handler thread may add an entry
+            with self._lock:
+                entries = list(self.datasets.values())
+            return {'datasets': [{'path': entry['path'], 'rows': entry['rows'],
+                                  'first_date': pd.Timestamp(entry['dates'][0]).date().isoformat(),
+                                  'last_date': pd.Timestamp(entry['dates'][-1]).date().isoformat()}
+                                 for entry in entries]}
+        if route not in ('/backtest', '/trades'):
+            return None
+        
+        result, cached = self.backtest(params)
+        calculator = result['calculator']
+        response = {'input': result['key'][0], 'bars': result['bars'], 'cached': cached,
+                    'total_trades': len(calculator.trades)}
+        
+        if route == '/backtest':
+            response['statistics'] = calculator.calculate_statistics()
+        else:
+            offset = max(0, int(params.get('offset', 0)))
+            limit = min(max(0, int(params.get('limit', 1000))), self.MAX_PAGE)
+            page = {name: calculator.trades.column(name)[offset:offset + limit]
+                    for name in TRADE_LOG_COLUMNS}
+            page['Date'] = np.datetime_as_string(page['Date'], unit='D')
+            page['Direction'] = np.asarray(DIRECTIONS)[page['Direction']]
+            response.update(offset=offset, limit=limit, trades=[
+                dict(zip(TRADE_LOG_COLUMNS, row))
+                for row in zip(*(page[name].tolist() for name in TRADE_LOG_COLUMNS))
+            ])
+        
+        response['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        return response
+    
+    def serve(self, host='127.0.0.1', port=8765):
+        """
+        Serve HTTP requests until interrupted.
+        """
+        httpd = ThreadingHTTPServer((host, port), _BacktestRequestHandler)
+        httpd.backtests = self
+        print(f"\nServing backtests on http://{host}:{httpd.server_address[1]} "
+              f"({self.workers} workers, {self.cache_bytes / 2**20:.0f} MB result cache)")
+        print("Press Ctrl+C to stop")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down server")
+        finally:
+            httpd.server_close()
+            self.close()
+
+
+class _BacktestRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of BacktestServer: JSON in, JSON out.
+    """
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self._respond(url.path, params)
+    
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            if length:
+                params.update(json.loads(self.rfile.read(length)))
+        except ValueError:
+            self._send(400, {'error': 'Request body is not valid JSON'})
+            return
+        self._respond(url.path, params)
+    
+    def _respond(self, route, params):
+        try:
+            response = self.server.backtests.handle(route.rstrip('/') or '/', params)
+            if response is None:
+                self._send(404, {'error': f"Unknown endpoint: {route}"})
+            else:
+                self._send(200, response)
+        except PermissionError as e:
+            self._send(403, {'error': str(e)})
+        except FileNotFoundError as e:
+            self._send(404, {'error': str(e)})
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            self._send(500, {'error': f"{type(e).__name__}: {e}"})
+    
+    def _send(self, status, payload):
+        body = json.dumps(_json_finite(payload), default=_json_default, allow_nan=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def compare_strategies(df, specs, initial_capital=100000, risk_per_trade=0.02, trade_type='both'):
+    """
+    Backtest several registered strategies over one loaded dataset.
+    
+    Args:
+        df (pandas.DataFrame): OHLC data as returned by load_data
+        specs (list): Strategy specs (see parse_strategy_spec)
+        initial_capital (float): Starting capital of every run
+        risk_per_trade (float): Maximum risk per trade as fraction
+        trade_type (str): 'long', 'short' or 'both'
         
-        trade = {
-            'Date': date,
-            'Direction': 'SHORT',
-            'Entry_Price': entry_price,
-            'Exit_Price': exit_price,
-            'Quantity': quantity,
-            'PnL': pnl,
-            'PnL_Percent': pnl_percent,
-            'Capital_After': self.current_capital
-        }
+    Returns:
+        pandas.DataFrame: One row of calculate_statistics output per strategy
+    """
+    rows = []
+    for spec in specs:
+        calculator = NiftyTradeCalculator(initial_capital=initial_capital, risk_per_trade=risk_per_trade)
+        with _quiet():
+            calculator.run_strategy(df, trade_type=trade_type, strategy=spec)
+        row = {'Strategy': spec}
+        row.update(calculator.calculate_statistics())
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def merge_instrument_bars(date_arrays):
+    """
+    Merge date-sorted bar sequences of many instruments into one event stream.
+    
+    A k-way heap merge (heapq.merge) over one lazy iterator per instrument:
+    time is O(n log k) for n bars in total, and no date x instrument matrix is
+    built. Bars on the same date are ordered by instrument index.
+    
+    Args:
+        date_arrays (list): Ascending datetime64 arrays, one per instrument
         
-        return trade
+    Returns:
+        tuple: (int32 instrument index, int64 bar index) arrays in event order
+    """
+    streams = [zip(dates.astype('datetime64[ns]').view(np.int64).tolist(),
+                   itertools.repeat(k), range(len(dates)))
+               for k, dates in enumerate(date_arrays)]
+    total = sum(len(dates) for dates in date_arrays)
+    instruments = np.empty(total, dtype=np.int32)
+    bars = np.empty(total, dtype=np.int64)
+    for i, (_, k, bar) in enumerate(heapq.merge(*streams)):
+        instruments[i] = k
+        bars[i] = bar
+    return instruments, bars
+
+
+def load_portfolio(files, load_options=None):
+    """
+    Load the OHLC files of a portfolio, keyed by instrument name.
+    
+    Instruments are named after their file stems (made unique with a numeric
+    suffix). Files that fail to load are skipped and returned separately.
+    
+    Returns:
+        tuple: (dict of instrument name -> data, list of (file, error))
+    """
+    datasets, failures = {}, []
+    for filepath in files:
+        name = Path(filepath).stem
+        suffix = 2
+        while name in datasets:
+            name = f"{Path(filepath).stem}_{suffix}"
+            suffix += 1
+        try:
+            with _quiet():
+                datasets[name] = NiftyTradeCalculator().load_data(filepath, **(load_options or {}))
+        except (FileNotFoundError, ValueError) as e:
+            failures.append((str(filepath), f"{type(e).__name__}: {e}"))
+    return datasets, failures
+
+
+class PortfolioCalculator(NiftyTradeCalculator):
+    """
+    Strategy run over many instruments that share one capital pool.
+    
+    Each instrument's signals are computed vectorized (see strategy_legs);
+    the bars of all instruments are merged into one date-ordered event
+    stream (merge_instrument_bars), and simulate_signals sizes every trade
+    from the shared equity with the calculate_position_size rules. Statistics,
+    summaries and trade logs are portfolio-level; attribution() breaks the
+    result down by instrument.
+    """
+    
+    def __init__(self, initial_capital=100000, risk_per_trade=0.02):
+        super().__init__(initial_capital=initial_capital, risk_per_trade=risk_per_trade)
+        self.instruments = []
+        self.instrument_bars = np.empty(0, dtype=np.int64)
+        self.trade_instruments = np.empty(0, dtype=np.int32)
     
-    def run_strategy(self, df, trade_type='both'):
+    def run_portfolio(self, datasets, trade_type='both', strategy=DEFAULT_STRATEGY):
         """
-        Run the trading strategy on OHLC data.
+        Run the strategy over all instruments with shared capital.
         
         Args:
-            df (pandas.DataFrame): OHLC data
-            trade_type (str): Type of trades - 'long', 'short', or 'both'
+            datasets (dict): Instrument name -> OHLC data as returned by load_data
+            trade_type (str): 'long', 'short' or 'both'
+            strategy (str or callable): Strategy spec or function (see run_strategy)
             
         Returns:
-            list: List of all trades executed
+            TradeStore: All trades in execution order
         """
-        self.trades = []
+        self.instruments = list(datasets)
+        frames = list(datasets.values())
+        self.instrument_bars = np.array([len(df) for df in frames], dtype=np.int64)
+        self.stats = TradeStatsAccumulator()
+        self._stats_offset = 0
         
-        print(f"\nExecuting {trade_type.upper()} strategy...")
+        print(f"\nExecuting {trade_type.upper()} strategy on a {len(frames)}-instrument portfolio...")
         print(f"Initial Capital: ₹{self.initial_capital:,.2f}")
         print(f"Risk per trade: {self.risk_per_trade * 100}%")
         
-        for idx, row in df.iterrows():
-            date = row['Date']
-            high = row['High']
-            low = row['Low']
-            
-            # Skip if high equals low (no opportunity)
-            if high == low:
+        dates = [df['Date'].to_numpy() for df in frames]
+        event_instruments, event_bars = merge_instrument_bars(dates)
+        event_index = np.concatenate([[0], np.cumsum(self.instrument_bars)[:-1]])[event_instruments] + event_bars
+        
+        # Concatenate each instrument's legs, then reorder them into event order
+        per_instrument = [{leg['direction']: leg for leg in strategy_legs(df, strategy, trade_type)}
+                          for df in frames]
+        legs = []
+        for direction in (LONG, SHORT):
+            if not any(direction in instrument for instrument in per_instrument):
                 continue
-            
-            if trade_type in ['long', 'both']:
-                trade = self.execute_long_trade(date, high, low)
-                if trade:
-                    self.trades.append(trade)
-            
-            if trade_type in ['short', 'both']:
-                trade = self.execute_short_trade(date, high, low)
-                if trade:
-                    self.trades.append(trade)
+            leg = {'direction': direction}
+            for field, empty in (('entry', np.nan), ('exit', np.nan), ('stop', np.nan), ('mask', False)):
+                leg[field] = np.concatenate([
+                    instrument[direction][field] if direction in instrument
+                    else np.full(bars, empty, dtype=bool if field == 'mask' else np.float64)
+                    for instrument, bars in zip(per_instrument, self.instrument_bars)
+                ])[event_index]
+            legs.append(leg)
+        
+        self.trades = TradeStore(len(legs) * len(event_index))
+        if legs:
+            _, self.current_capital = simulate_signals(legs, self.current_capital,
+                                                       self.risk_per_trade, store=self.trades)
+        
+        events = self.trades.column('Bar').copy()
+        self.trade_instruments = event_instruments[events]
+        self.trades.column('Bar')[:] = event_bars[events]
+        all_dates = np.concatenate(dates)[event_index] if dates else np.empty(0, 'datetime64[ns]')
+        self.trades.column('Date')[:] = all_dates[events]
+        self._sync_accumulator()
+        if len(all_dates):
+            self.last_date = all_dates[-1]
         
         print(f"Total trades executed: {len(self.trades)}")
         
         return self.trades
     
-    def calculate_statistics(self):
+    def attribution(self):
         """
-        Calculate comprehensive trading statistics.
+        Per-instrument breakdown of the portfolio result.
         
         Returns:
-            dict: Dictionary containing all statistics
+            pandas.DataFrame: Bars, trades, wins, P&L and its share of the
+            initial capital for each instrument
         """
-        if not self.trades:
-            return {
-                'error': 'No trades executed'
-            }
-        
-        df_trades = pd.DataFrame(self.trades)
-        
-        # Basic statistics
-        total_trades = len(df_trades)
-        winning_trades = df_trades[df_trades['PnL'] > 0]
-        losing_trades = df_trades[df_trades['PnL'] < 0]
-        
-        total_return = self.current_capital - self.initial_capital
-        total_return_percent = (total_return / self.initial_capital) * 100
-        
-        # Win/Loss statistics
-        num_wins = len(winning_trades)
-        num_losses = len(losing_trades)
-        win_rate = (num_wins / total_trades) * 100 if total_trades > 0 else 0
+        count = len(self.instruments)
+        codes = self.trade_instruments
+        pnl = self.trades.column('PnL')
+        trades = np.bincount(codes, minlength=count)
+        wins = np.bincount(codes, weights=pnl > 0, minlength=count).astype(np.int64)
+        total_pnl = np.bincount(codes, weights=pnl, minlength=count)
         
-        avg_win = winning_trades['PnL'].mean() if num_wins > 0 else 0
-        avg_loss = losing_trades['PnL'].mean() if num_losses > 0 else 0
-        
-        # Calculate drawdown
-        df_trades['Cumulative_Return'] = (df_trades['Capital_After'] / self.initial_capital - 1) * 100
-        df_trades['Running_Max'] = df_trades['Capital_After'].cummax()
-        df_trades['Drawdown'] = ((df_trades['Capital_After'] - df_trades['Running_Max']) / 
-                                  df_trades['Running_Max']) * 100
-        
-        max_drawdown = df_trades['Drawdown'].min()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            win_rate = np.where(trades > 0, wins / trades * 100, 0.0)
+        return pd.DataFrame({
+            'Instrument': self.instruments,
+            'Bars': self.instrument_bars,
+            'Total_Trades': trades,
+            'Winning_Trades': wins,
+            'Win_Rate_Percent': win_rate,
+            'PnL': total_pnl,
+            'Contribution_Percent': total_pnl / self.initial_capital * 100,
+        })
+    
+    def generate_trade_log(self, output_file=None, append=False):
+        """
+        Generate the portfolio trade log, with an Instrument column after Date.
         
-        # Risk-adjusted metrics
-        returns_series = df_trades['PnL_Percent']
-        avg_return = returns_series.mean()
-        std_return = returns_series.std()
+        See NiftyTradeCalculator.generate_trade_log.
+        """
+        df_trades = super().generate_trade_log()
+        if df_trades is None:
+            return None
         
-        # Sharpe Ratio (assuming 0% risk-free rate, annualized)
-        # Using 252 trading days per year approximation
-        sharpe_ratio = (avg_return / std_return) * np.sqrt(252) if std_return != 0 else 0
+        df_trades.insert(1, 'Instrument', pd.Categorical.from_codes(self.trade_instruments,
+                                                                    categories=self.instruments))
+        if output_file:
+            self.write_trade_log(output_file, append=append)
+        return df_trades
+    
+    def write_trade_log(self, output_file, append=False):
+        """
+        Stream the portfolio trade log, with an Instrument column after Date.
         
-        # Profit factor
-        total_wins = winning_trades['PnL'].sum() if num_wins > 0 else 0
-        total_losses = abs(losing_trades['PnL'].sum()) if num_losses > 0 else 1
-        profit_factor = total_wins / total_losses if total_losses != 0 else float('inf')
+        See NiftyTradeCalculator.write_trade_log.
+        """
+        if not self.trades:
+            print("No trades to log")
+            return 0
         
-        # Expectancy
-        expectancy = (win_rate/100 * avg_win) - ((100-win_rate)/100 * abs(avg_loss))
+        with TradeLogWriter(output_file, append=append, instruments=self.instruments) as writer:
+            writer.write_store(self.trades, instrument_codes=self.trade_instruments)
+        print(f"\nTrade log {'appended to' if append else 'saved to'}: {output_file}")
+        return len(self.trades)
+
+
+RESULTS_DB_VERSION = 1
+# Initial_Capital is the runs.initial_capital column
+RESULTS_STAT_COLUMNS = (
+    'Final_Capital', 'Total_Return', 'Total_Return_Percent', 'Total_Trades',
+    'Winning_Trades', 'Losing_Trades', 'Win_Rate_Percent', 'Average_Win', 'Average_Loss',
+    'Largest_Win', 'Largest_Loss', 'Average_Trade_Return_Percent', 'Max_Drawdown_Percent',
+    'Sharpe_Ratio', 'Profit_Factor', 'Expectancy',
+)
+RESULTS_RUN_COLUMNS = ('run_date', 'instrument', 'source', 'strategy', 'engine', 'trade_type',
+                       'initial_capital', 'risk_per_trade', 'bars', 'start_date', 'end_date',
+                       'code_version')
+# Batch/sweep/comparison table column -> runs column (see ResultsStore.record_table)
+RESULTS_TABLE_COLUMNS = {
+    'Instrument': 'instrument',
+    'File': 'source',
+    'Strategy': 'strategy',
+    'Trade_Type': 'trade_type',
+    'Capital': 'initial_capital',
+    'Risk_Per_Trade': 'risk_per_trade',
+    'Bars': 'bars',
+}
+RESULTS_DB_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    run_date TEXT NOT NULL,
+    instrument TEXT,
+    source TEXT,
+    strategy TEXT,
+    engine TEXT,
+    trade_type TEXT,
+    initial_capital REAL,
+    risk_per_trade REAL,
+    bars INTEGER,
+    start_date TEXT,
+    end_date TEXT,
+    code_version TEXT
+);
+CREATE TABLE IF NOT EXISTS statistics (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(run_id) ON DELETE CASCADE,
+    {', '.join(f'{name} REAL' for name in RESULTS_STAT_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    instrument TEXT,
+    direction TEXT,
+    entry_price REAL,
+    exit_price REAL,
+    quantity NUMERIC,
+    pnl REAL,
+    pnl_percent REAL,
+    capital_after REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_instrument ON runs(instrument, run_date);
+CREATE INDEX IF NOT EXISTS idx_runs_run_date ON runs(run_date);
+CREATE INDEX IF NOT EXISTS idx_runs_parameters ON runs(risk_per_trade, initial_capital, trade_type, strategy);
+CREATE INDEX IF NOT EXISTS idx_trades_run ON trades(run_id);
+CREATE INDEX IF NOT EXISTS idx_trades_date ON trades(date);
+CREATE INDEX IF NOT EXISTS idx_trades_instrument ON trades(instrument, date);
+"""
+
+
+class ResultsStore:
+    """
+    SQLite database of backtest runs, their statistics and their trades.
+    
+    Every run becomes one row in ``runs`` (instrument, parameters, run date,
+    data period), one row in ``statistics`` (the calculate_statistics
+    figures, one column each) and optionally its trades in ``trades``. A run
+    is written in a single transaction, the trades with batched
+    ``executemany``. Indexes on instrument, run date, parameters and trade
+    date keep cross-run queries fast. Dates are stored as ISO text, trade
+    dates as YYYY-MM-DD.
+    
+    A ``read_only`` store (used by ``--db-query``) opens an existing
+    database with SQLite's read-only mode and only runs single SELECT/WITH
+    statements, so a query can never modify or recreate the tables.
+    """
+    
+    QUERIES = ('runs', 'best', 'trades')
+    
+    def __init__(self, path, read_only=False):
+        """
+        Open the database at ``path``, creating it unless ``read_only``.
         
-        stats = {
-            'Initial_Capital': self.initial_capital,
-            'Final_Capital': self.current_capital,
-            'Total_Return': total_return,
-            'Total_Return_Percent': total_return_percent,
-            'Total_Trades': total_trades,
-            'Winning_Trades': num_wins,
-            'Losing_Trades': num_losses,
-            'Win_Rate_Percent': win_rate,
-            'Average_Win': avg_win,
-            'Average_Loss': avg_loss,
-            'Largest_Win': winning_trades['PnL'].max() if num_wins > 0 else 0,
-            'Largest_Loss': losing_trades['PnL'].min() if num_losses > 0 else 0,
-            'Average_Trade_Return_Percent': avg_return,
-            'Max_Drawdown_Percent': max_drawdown,
-            'Sharpe_Ratio': sharpe_ratio,
-            'Profit_Factor': profit_factor,
-            'Expectancy': expectancy
-        }
+        Raises:
+            FileNotFoundError: If a read-only database does not exist
+            ValueError: If the database was written by an incompatible version
+        """
+        self.path = str(path)
+        self.read_only = read_only
+        if read_only:
+            if not Path(path).is_file():
+                raise FileNotFoundError(f"Results database not found: {path}")
+            self.connection = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+            self.connection.execute('PRAGMA query_only = ON')
+        else:
+            self.connection = sqlite3.connect(self.path)
         
-        return stats
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        expected = (RESULTS_DB_VERSION,) if read_only else (0, RESULTS_DB_VERSION)
+        if version not in expected:
+            self.connection.close()
+            raise ValueError(f"Results database {path} has version {version}, expected {RESULTS_DB_VERSION}")
+        if not read_only:
+            self.connection.execute('PRAGMA foreign_keys = ON')
+            self.connection.executescript(RESULTS_DB_SCHEMA)
+            self.connection.execute(f'PRAGMA user_version = {RESULTS_DB_VERSION}')
     
-    def generate_trade_log(self, output_file=None):
+    def record_run(self, stats, trades=None, trade_instruments=None,
+                   batch_rows=TRADE_LOG_BATCH_ROWS, **meta):
         """
-        Generate detailed trade log.
+        Insert one run with its statistics and (optionally) its trades.
         
         Args:
-            output_file (str, optional): Path to save CSV file
+            stats (dict): calculate_statistics output; a result with an
+                'error' entry is recorded without statistics
+            trades (TradeStore, optional): Trades to store
+            trade_instruments (numpy.ndarray, optional): Instrument name of
+                every trade (portfolio runs); defaults to the run's instrument
+            batch_rows (int): Trades per executemany batch
+            **meta: Columns of RESULTS_RUN_COLUMNS (instrument, source,
+                strategy, engine, trade_type, initial_capital, risk_per_trade,
+                bars, start_date, end_date); run_date defaults to now and
+                code_version to this module's hash
             
         Returns:
-            pandas.DataFrame: Trade log dataframe
+            int: The new run_id
         """
-        if not self.trades:
-            print("No trades to log")
-            return None
-        
-        df_trades = pd.DataFrame(self.trades)
-        
-        # Format for better readability
-        df_trades['Date'] = pd.to_datetime(df_trades['Date']).dt.strftime('%Y-%m-%d')
-        
-        # Round numeric columns
-        numeric_cols = ['Entry_Price', 'Exit_Price', 'PnL', 'PnL_Percent', 'Capital_After']
-        for col in numeric_cols:
-            df_trades[col] = df_trades[col].round(2)
+        with self.connection:
+            return self._insert_run(stats, trades, trade_instruments, batch_rows, meta)
+    
+    def record_table(self, table, **meta):
+        """
+        Insert one run (statistics only) per row of a batch, sweep or
+        strategy-comparison table, all in one transaction.
         
-        if output_file:
-            df_trades.to_csv(output_file, index=False)
-            print(f"\nTrade log saved to: {output_file}")
+        Columns named in RESULTS_TABLE_COLUMNS override the matching ``meta``
+        entries row by row.
         
-        return df_trades
+        Returns:
+            list: The new run_ids
+        """
+        run_ids = []
+        with self.connection:
+            for row in table.to_dict('records'):
+                if isinstance(row.get('error'), str):
+                    stats = {'error': row['error']}
+                else:
+                    stats = {name: row[name] for name in RESULTS_STAT_COLUMNS if name in row}
+                row_meta = dict(meta)
+                row_meta.update({column: row[name] for name, column in RESULTS_TABLE_COLUMNS.items()
+                                 if name in row and pd.notna(row[name])})
+                run_ids.append(self._insert_run(stats, None, None, TRADE_LOG_BATCH_ROWS, row_meta))
+        return run_ids
     
-    def print_summary(self):
+    def _insert_run(self, stats, trades, trade_instruments, batch_rows, meta):
         """
-        Print a formatted summary of trading results.
+        Insert a run inside the caller's transaction.
         """
-        stats = self.calculate_statistics()
+        unknown = set(meta) - set(RESULTS_RUN_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown run columns: {', '.join(sorted(unknown))}")
+        meta = {'run_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'code_version': code_version(), **meta}
+        for name in ('start_date', 'end_date'):
+            if meta.get(name) is not None:
+                meta[name] = pd.Timestamp(meta[name]).strftime('%Y-%m-%d')
         
-        if 'error' in stats:
-            print(f"\nError: {stats['error']}")
-            return
+        columns = [name for name in RESULTS_RUN_COLUMNS if meta.get(name) is not None]
+        cursor = self.connection.execute(
+            f"INSERT INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [_sql_value(meta[name]) for name in columns]
+        )
+        run_id = cursor.lastrowid
         
-        print("\n" + "="*70)
-        print("NIFTY OHLC TRADING STRATEGY - SUMMARY REPORT")
-        print("="*70)
+        if 'error' not in stats:
+            self.connection.execute(
+                f"INSERT INTO statistics (run_id, {', '.join(RESULTS_STAT_COLUMNS)}) "
+                f"VALUES (?{', ?' * len(RESULTS_STAT_COLUMNS)})",
+                [run_id] + [_sql_value(stats.get(name)) for name in RESULTS_STAT_COLUMNS]
+            )
         
-        print("\n📊 CAPITAL & RETURNS")
-        print(f"  Initial Capital:        ₹{stats['Initial_Capital']:,.2f}")
-        print(f"  Final Capital:          ₹{stats['Final_Capital']:,.2f}")
-        print(f"  Total Return:           ₹{stats['Total_Return']:,.2f}")
-        print(f"  Total Return (%):       {stats['Total_Return_Percent']:.2f}%")
+        total = len(trades) if trades is not None else 0
+        for start in range(0, total, batch_rows):
+            window = slice(start, start + batch_rows)
+            count = min(batch_rows, total - start)
+            if trade_instruments is not None:
+                instruments = np.asarray(trade_instruments[window], dtype=object).tolist()
+            else:
+                instruments = itertools.repeat(meta.get('instrument'), count)
+            self.connection.executemany(
+                "INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                zip(itertools.repeat(run_id, count),
+                    np.datetime_as_string(trades.column('Date')[window], unit='D').tolist(),
+                    instruments,
+                    np.asarray(DIRECTIONS)[trades.column('Direction')[window]].tolist(),
+                    *(trades.column(name)[window].tolist() for name in TRADE_LOG_COLUMNS[2:]))
+            )
         
-        print("\n📈 TRADE STATISTICS")
-        print(f"  Total Trades:           {stats['Total_Trades']}")
-        print(f"  Winning Trades:         {stats['Winning_Trades']}")
-        print(f"  Losing Trades:          {stats['Losing_Trades']}")
-        print(f"  Win Rate:               {stats['Win_Rate_Percent']:.2f}%")
+        return run_id
+    
+    def query(self, sql, params=()):
+        """
+        Run a read query and return its result as a DataFrame.
         
-        print("\n💰 PROFIT/LOSS ANALYSIS")
-        print(f"  Average Win:            ₹{stats['Average_Win']:,.2f}")
-        print(f"  Average Loss:           ₹{stats['Average_Loss']:,.2f}")
-        print(f"  Largest Win:            ₹{stats['Largest_Win']:,.2f}")
-        print(f"  Largest Loss:           ₹{stats['Largest_Loss']:,.2f}")
-        print(f"  Avg Trade Return (%):   {stats['Average_Trade_Return_Percent']:.2f}%")
+        Raises:
+            ValueError: If the statement is not a single SELECT/WITH query or
+                SQLite rejects it
+        """
+        statement = sql.strip().rstrip(';').strip()
+        if not statement.split(None, 1) or statement.split(None, 1)[0].upper() not in ('SELECT', 'WITH'):
+            raise ValueError("Results queries must be a single SELECT or WITH statement")
+        try:
+            cursor = self.connection.execute(sql, params)
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            raise ValueError(f"Results query failed: {e}")
+        return pd.DataFrame.from_records(rows, columns=[column[0] for column in cursor.description or ()])
+    
+    def runs(self, instrument=None, since=None, until=None):
+        """
+        Runs with their statistics, newest first.
         
-        print("\n⚠️  RISK METRICS")
-        print(f"  Max Drawdown:           {stats['Max_Drawdown_Percent']:.2f}%")
-        print(f"  Sharpe Ratio:           {stats['Sharpe_Ratio']:.2f}")
-        print(f"  Profit Factor:          {stats['Profit_Factor']:.2f}")
-        print(f"  Expectancy:             ₹{stats['Expectancy']:.2f}")
+        Args:
+            instrument (str, optional): Only runs of this instrument
+            since (str, optional): Only runs on or after this date
+            until (str, optional): Only runs on or before this date
+        """
+        where, params = self._run_filter(instrument, since, until)
+        return self.query(
+            f"SELECT runs.*, {', '.join(RESULTS_STAT_COLUMNS)} FROM runs "
+            f"LEFT JOIN statistics USING (run_id){where} ORDER BY run_date DESC, run_id DESC",
+            params
+        )
+    
+    def best(self, metric='Total_Return_Percent', instrument=None, since=None, until=None,
+             ascending=False):
+        """
+        The best run of every instrument by ``metric``, e.g. the best risk
+        setting per instrument over the last quarter.
         
-        print("\n" + "="*70)
+        Args:
+            metric (str): Column of RESULTS_STAT_COLUMNS to rank by
+            instrument (str, optional): Only this instrument
+            since (str, optional): Only runs on or after this date
+            until (str, optional): Only runs on or before this date
+            ascending (bool): Lowest value is best
+        """
+        if metric not in RESULTS_STAT_COLUMNS:
+            raise ValueError(f"Unknown statistic: {metric}. Expected one of {', '.join(RESULTS_STAT_COLUMNS)}")
+        where, params = self._run_filter(instrument, since, until)
+        order = 'ASC' if ascending else 'DESC'
+        return self.query(
+            f"SELECT * FROM (SELECT runs.run_id, run_date, instrument, strategy, trade_type, "
+            f"initial_capital, risk_per_trade, {', '.join(RESULTS_STAT_COLUMNS)}, "
+            f"ROW_NUMBER() OVER (PARTITION BY instrument ORDER BY {metric} {order}, run_id DESC) AS rank "
+            f"FROM runs JOIN statistics USING (run_id){where}) WHERE rank = 1 ORDER BY {metric} {order}",
+            params
+        ).drop(columns='rank')
     
-    def save_summary(self, output_file):
+    def trades(self, instrument=None, start=None, end=None, run_id=None):
         """
-        Save summary statistics to a text file.
+        Stored trades in date order.
         
         Args:
-            output_file (str): Path to output file
+            instrument (str, optional): Only trades of this instrument
+            start (str, optional): Only trades on or after this date
+            end (str, optional): Only trades on or before this date
+            run_id (int, optional): Only trades of this run
         """
-        stats = self.calculate_statistics()
+        conditions, params = [], []
+        for column, operator, value in (('instrument', '=', instrument), ('date', '>=', start),
+                                        ('date', '<=', end), ('run_id', '=', run_id)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(pd.Timestamp(value).strftime('%Y-%m-%d') if column == 'date' else value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self.query(f"SELECT * FROM trades{where} ORDER BY date, run_id", params)
+    
+    @staticmethod
+    def _run_filter(instrument, since, until):
+        conditions, params = [], []
+        if instrument is not None:
+            conditions.append("instrument = ?")
+            params.append(instrument)
+        if since is not None:
+            conditions.append("run_date >= ?")
+            params.append(pd.Timestamp(since).strftime('%Y-%m-%d %H:%M:%S'))
+        if until is not None:
+            conditions.append("run_date < ?")
+            params.append((pd.Timestamp(until).normalize() + pd.Timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'))
+        return (f" WHERE {' AND '.join(conditions)}" if conditions else ''), params
+    
+    def close(self):
+        self.connection.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _sql_value(value):
+    """
+    Convert NumPy scalars to the Python types sqlite3 accepts.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def print_range_statistics(calculator, ranges, output_file=None):
+    """
+    Print (and optionally save) the statistics of a finished run over date ranges.
+    """
+    table = calculator.range_statistics(ranges)
+    columns = ['Range', 'First_Trade', 'Last_Trade', 'Total_Trades', 'Total_Return_Percent',
+               'Win_Rate_Percent', 'Max_Drawdown_Percent', 'Sharpe_Ratio']
+    print(f"\nStatistics over {len(table)} date ranges:")
+    print("\n" + table.reindex(columns=columns).to_string(
+        index=False, formatters={'First_Trade': _format_date, 'Last_Trade': _format_date}))
+    
+    if output_file:
+        table.to_csv(output_file, index=False, date_format='%Y-%m-%d')
+        print(f"\nRange statistics saved to: {output_file}")
+    return table
+
+
+def _format_date(value):
+    return '-' if pd.isna(value) else pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def parse_sweep_grid(specs, defaults):
+    """
+    Parse ``--sweep`` grid specs of the form ``key=v1,v2,...``.
+    
+    Args:
+        specs (list): Specs such as ['risk=0.01,0.02', 'type=long,both']
+        defaults (dict): Single-value defaults for 'risk', 'capital' and 'type'
         
-        if 'error' in stats:
-            print(f"Cannot save summary: {stats['error']}")
-            return
+    Returns:
+        dict: Lists of values keyed by 'risk', 'capital' and 'type'
         
-        with open(output_file, 'w') as f:
-            f.write("="*70 + "\n")
-            f.write("NIFTY OHLC TRADING STRATEGY - SUMMARY REPORT\n")
-            f.write("="*70 + "\n\n")
-            
-            f.write("CAPITAL & RETURNS\n")
-            f.write(f"  Initial Capital:        ₹{stats['Initial_Capital']:,.2f}\n")
-            f.write(f"  Final Capital:          ₹{stats['Final_Capital']:,.2f}\n")
-            f.write(f"  Total Return:           ₹{stats['Total_Return']:,.2f}\n")
-            f.write(f"  Total Return (%):       {stats['Total_Return_Percent']:.2f}%\n\n")
-            
-            f.write("TRADE STATISTICS\n")
-            f.write(f"  Total Trades:           {stats['Total_Trades']}\n")
-            f.write(f"  Winning Trades:         {stats['Winning_Trades']}\n")
-            f.write(f"  Losing Trades:          {stats['Losing_Trades']}\n")
-            f.write(f"  Win Rate:               {stats['Win_Rate_Percent']:.2f}%\n\n")
-            
-            f.write("PROFIT/LOSS ANALYSIS\n")
-            f.write(f"  Average Win:            ₹{stats['Average_Win']:,.2f}\n")
-            f.write(f"  Average Loss:           ₹{stats['Average_Loss']:,.2f}\n")
-            f.write(f"  Largest Win:            ₹{stats['Largest_Win']:,.2f}\n")
-            f.write(f"  Largest Loss:           ₹{stats['Largest_Loss']:,.2f}\n")
-            f.write(f"  Avg Trade Return (%):   {stats['Average_Trade_Return_Percent']:.2f}%\n\n")
-            
-            f.write("RISK METRICS\n")
-            f.write(f"  Max Drawdown:           {stats['Max_Drawdown_Percent']:.2f}%\n")
-            f.write(f"  Sharpe Ratio:           {stats['Sharpe_Ratio']:.2f}\n")
-            f.write(f"  Profit Factor:          {stats['Profit_Factor']:.2f}\n")
-            f.write(f"  Expectancy:             ₹{stats['Expectancy']:.2f}\n\n")
-            
-            f.write("="*70 + "\n")
+    Raises:
+        ValueError: If a spec is malformed or a value is invalid
+    """
+    grid = {key: [value] for key, value in defaults.items()}
+    
+    for spec in specs:
+        key, sep, values = spec.partition('=')
+        key = key.strip().lower()
+        if not sep or key not in grid:
+            raise ValueError(f"Invalid sweep grid '{spec}'. Expected risk=..., capital=... or type=...")
         
-        print(f"\nSummary saved to: {output_file}")
+        items = [v.strip() for v in values.split(',') if v.strip()]
+        if not items:
+            raise ValueError(f"Empty sweep grid for '{key}'")
+        
+        if key == 'type':
+            invalid = set(items) - {'long', 'short', 'both'}
+            if invalid:
+                raise ValueError(f"Invalid trade type(s) in sweep grid: {invalid}")
+            grid[key] = items
+        else:
+            try:
+                grid[key] = [float(v) for v in items]
+            except ValueError:
+                raise ValueError(f"Invalid number in sweep grid '{spec}'")
+    
+    return grid
+
+
+class PhaseProfiler:
+    """
+    Opt-in timing and memory instrumentation of the calculator's phases.
+    
+    Each ``phase()`` block records wall time, CPU time and, when rows/trades
+    are reported, the throughput. With ``memory`` it also records the peak
+    traced memory (tracemalloc, reset per phase). tracemalloc hooks every
+    allocation and cProfile every call, which slows allocation-heavy phases
+    several-fold, so the report lists the instrumentation that was active
+    and times taken under it are marked as traced; profile time and memory
+    in separate runs for undistorted timings. ``write()`` saves the records
+    as JSON, and with ``cprofile_file`` a cProfile dump of the whole run plus
+    a text listing of the hottest functions. A disabled profiler adds no
+    overhead.
+    """
+    
+    def __init__(self, output_file=None, cprofile_file=None, top=25, memory=False):
+        """
+        Args:
+            output_file (str, optional): JSON metrics file; enables phase timing
+            cprofile_file (str, optional): cProfile stats file; enables cProfile
+            top (int): Number of functions in the cProfile text listing
+            memory (bool): Also trace peak memory per phase with tracemalloc
+        """
+        self.output_file = output_file
+        self.cprofile_file = cprofile_file
+        self.top = top
+        self.enabled = bool(output_file or cprofile_file)
+        self.memory = memory and self.enabled
+        self.instrumentation = [name for name, active in (('tracemalloc', self.memory),
+                                                           ('cProfile', bool(cprofile_file))) if active]
+        self.phases = []
+        self.started = time.perf_counter()
+        self._cprofile = None
+        
+        if self.memory:
+            tracemalloc.start()
+        if cprofile_file:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Measure one phase. The yielded dict accepts 'rows' and 'trades' counts.
+        """
+        counts = {}
+        if not self.enabled:
+            yield counts
+            return
+        
+        if self.memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            record = {
+                'phase': name,
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                'timing_traced': bool(self.instrumentation),
+            }
+            if self.memory:
+                record['peak_memory_mb'] = (tracemalloc.get_traced_memory()[1] - traced_before) / 2**20
+            for key in ('rows', 'trades'):
+                if key in counts:
+                    record[key] = counts[key]
+                    record[f"{key}_per_second"] = counts[key] / wall if wall > 0 else None
+            self.phases.append(record)
+    
+    def write(self, meta=None):
+        """
+        Stop profiling and write the JSON metrics and cProfile outputs.
+        """
+        if not self.enabled:
+            return
+        
+        if self._cprofile:
+            import pstats
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_file)
+            with open(f"{self.cprofile_file}.txt", 'w') as f:
+                pstats.Stats(self._cprofile, stream=f).sort_stats('cumulative').print_stats(self.top)
+            print(f"\ncProfile stats saved to: {self.cprofile_file} (top {self.top}: {self.cprofile_file}.txt)")
+        
+        total_wall = time.perf_counter() - self.started
+        peak_total = None
+        if self.memory:
+            peak_total = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        
+        if self.output_file:
+            report = {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'meta': meta or {},
+                'instrumentation': self.instrumentation,
+                'total_wall_seconds': total_wall,
+                'peak_memory_mb': peak_total,
+                'phases': self.phases,
+            }
+            with open(self.output_file, 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+            print(f"\nProfile saved to: {self.output_file}")
 
 
 def main():
@@ -513,6 +4651,31 @@ Examples:
   
   # Run only long trades
   python nifty_returns_calculator.py --input nifty_data.csv --type long
+  
+  # Run every file in a directory and rank instruments by Sharpe ratio
+  python nifty_returns_calculator.py --batch data/ --sort-by Sharpe_Ratio --batch-output batch.csv
+  
+  # Run many job specs (input, capital, risk, type, output, summary) in one process
+  python nifty_returns_calculator.py --jobs nightly.jsonl --jobs-output results.csv
+  
+  # Return, drawdown and win rate of a finished run over several date ranges
+  python nifty_returns_calculator.py --input nifty_data.csv --range 2019 2020 2020-02-19:2020-03-23 2021:
+  
+  # Record runs in a SQLite results database, then query the best run per instrument
+  python nifty_returns_calculator.py --input nifty_data.csv --results-db results.db
+  python nifty_returns_calculator.py --results-db results.db --db-query best --since 2025-07-01
+  
+  # Aggregate 1-minute bars to daily bars while streaming the file
+  python nifty_returns_calculator.py --input nifty_1min.csv --intraday --chunk-size 500000
+  
+  # Rolling 3-year windows stepped monthly
+  python nifty_returns_calculator.py --input nifty_data.csv --walk-forward 3 --wf-output windows.csv
+  
+  # 10,000 bootstrapped trade sequences with a fixed seed
+  python nifty_returns_calculator.py --input nifty_data.csv --monte-carlo 10000 --seed 42
+  
+  # Sweep risk and trade type in parallel, loading the data once
+  python nifty_returns_calculator.py --input nifty_data.csv --sweep risk=0.005,0.01,0.02 type=long,short,both
 
 Strategy Details:
   - Long trades: Buy at day's HIGH, sell at day's LOW
@@ -524,10 +4687,31 @@ Strategy Details:
     
     parser.add_argument(
         '--input', '-i',
-        required=True,
         help='Input CSV/TXT file with OHLC data (Date, Open, High, Low, Close)'
     )
     
+    parser.add_argument(
+        '--batch', '-b',
+        help='Directory or glob pattern of OHLC files to run as a batch (instead of --input)'
+    )
+    
+    parser.add_argument(
+        '--jobs',
+        metavar='FILE',
+        help='JSONL or CSV file of job specs (input, capital, risk, type, output, summary) '
+             'to run in one process, loading each input once'
+    )
+    
+    parser.add_argument(
+        '--portfolio',
+        help='Directory or glob pattern of OHLC files traded as one portfolio with shared capital'
+    )
+    
+    parser.add_argument(
+        '--attribution-output',
+        help='Output CSV file for the per-instrument portfolio attribution (optional)'
+    )
+    
     parser.add_argument(
         '--capital', '-c',
         type=float,
@@ -549,9 +4733,85 @@ Strategy Details:
         help='Type of trades to execute (default: both)'
     )
     
+    parser.add_argument(
+        '--intraday',
+        action='store_true',
+        help='Input holds intraday bars: stream it and aggregate to daily OHLC'
+    )
+    
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=INTRADAY_CHUNK_ROWS,
+        help=f'Rows per chunk when streaming intraday data (default: {INTRADAY_CHUNK_ROWS})'
+    )
+    
+    parser.add_argument(
+        '--start',
+        help='Only use data on or after this date (YYYY-MM-DD)'
+    )
+    
+    parser.add_argument(
+        '--end',
+        help='Only use data on or before this date (YYYY-MM-DD)'
+    )
+    
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Hold prices as float32 and dates as int32 day numbers where exact (less memory)'
+    )
+    
+    parser.add_argument(
+        '--date-format',
+        help="Format of the Date column, e.g. '%%d/%%m/%%Y', or epoch:s / epoch:ms "
+             "(default: inferred from a sample)"
+    )
+    
+    parser.add_argument(
+        '--cache-dir',
+        help=f'Keep the parsed data and backtest results in this directory, e.g. '
+             f'{DEFAULT_CACHE_DIR} (default: no caching)'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always parse the input file and rerun the backtest; do not read or write '
+             'the data or result caches even with --cache-dir'
+    )
+    
+    parser.add_argument(
+        '--result-cache-mb',
+        type=float,
+        default=512,
+        help='Size limit of the on-disk result cache in MB (default: 512)'
+    )
+    
+    parser.add_argument(
+        '--result-cache-days',
+        type=float,
+        default=30,
+        help='Remove cached results not used for this many days (default: 30)'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        choices=list(ENGINES),
+        default='array',
+        help='Backtest engine: array (NumPy kernel), rows (DataFrame row loop) or fractional '
+             '(fractional units in closed form, for fast screening) (default: array)'
+    )
+    
+    parser.add_argument(
+        '--fractional-check',
+        action='store_true',
+        help='With --engine fractional, also run the exact engine and report the maximum equity deviation'
+    )
+    
     parser.add_argument(
         '--output', '-o',
-        help='Output CSV file for trade log (optional)'
+        help='Output file for trade log (optional); format by extension: .csv, .csv.gz, .csv.zst, .parquet, .feather'
     )
     
     parser.add_argument(
@@ -559,36 +4819,634 @@ Strategy Details:
         help='Output text file for summary statistics (optional)'
     )
     
+    parser.add_argument(
+        '--checkpoint',
+        help='Checkpoint file: resume from it if present (processing only rows appended '
+             'since), then update it'
+    )
+    
+    parser.add_argument(
+        '--walk-forward',
+        type=int,
+        metavar='YEARS',
+        help='Run rolling walk-forward windows of this many years (capital reset per window)'
+    )
+    
+    parser.add_argument(
+        '--wf-step',
+        type=int,
+        default=1,
+        metavar='MONTHS',
+        help='Months between walk-forward window starts (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--wf-tolerance',
+        type=float,
+        default=1e-3,
+        help='Deviation bound (fraction of capital) allowed before a window is simulated '
+             'exactly (default: 0.001)'
+    )
+    
+    parser.add_argument(
+        '--wf-output',
+        help='Output CSV file for the walk-forward window table (optional)'
+    )
+    
+    parser.add_argument(
+        '--monte-carlo',
+        type=int,
+        metavar='PATHS',
+        help='Resample the trade sequence this many times and report percentile tables'
+    )
+    
+    parser.add_argument(
+        '--mc-method',
+        choices=list(MC_METHODS),
+        default='bootstrap',
+        help='Monte Carlo resampling: bootstrap (with replacement) or permute (default: bootstrap)'
+    )
+    
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Random seed for reproducible Monte Carlo results'
+    )
+    
+    parser.add_argument(
+        '--mc-output',
+        help='Output CSV file for the Monte Carlo percentile table (optional)'
+    )
+    
+    parser.add_argument(
+        '--sweep',
+        nargs='+',
+        metavar='KEY=VALUES',
+        help='Parameter sweep grids: risk=..., capital=..., type=... (comma-separated values); '
+             'unspecified keys use --risk/--capital/--type'
+    )
+    
+    parser.add_argument(
+        '--strategy',
+        nargs='+',
+        default=[DEFAULT_STRATEGY],
+        metavar='SPEC',
+        help=f"Strategy to run: {', '.join(STRATEGIES)}, optionally with parameters "
+             f"(e.g. wide_range:min_range_pct=1.5). Several specs, or 'all', print a "
+             f"comparison table (default: {DEFAULT_STRATEGY})"
+    )
+    
+    parser.add_argument(
+        '--strategy-output',
+        help='Output CSV file for the strategy comparison table (optional)'
+    )
+    
+    parser.add_argument(
+        '--sweep-output',
+        help='Output CSV file for the sweep results table (optional)'
+    )
+    
+    parser.add_argument(
+        '--batch-output',
+        help='Output CSV file for the consolidated batch summary (optional)'
+    )
+    
+    parser.add_argument(
+        '--jobs-output',
+        help='Output CSV file for the results of all --jobs (optional)'
+    )
+    
+    parser.add_argument(
+        '--sort-by',
+        default='Total_Return_Percent',
+        help='Statistic to sort the batch summary by (default: Total_Return_Percent)'
+    )
+    
+    parser.add_argument(
+        '--ascending',
+        action='store_true',
+        help='Sort the batch summary in ascending order'
+    )
+    
+    parser.add_argument(
+        '--trade-log-dir',
+        help='Directory for per-file trade logs in batch mode (optional)'
+    )
+    
+    parser.add_argument(
+        '--serve',
+        type=int,
+        metavar='PORT',
+        help='Run a local HTTP backtest server on this port (0 picks a free port)'
+    )
+    
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Interface for --serve (default: 127.0.0.1)'
+    )
+    
+    parser.add_argument(
+        '--server-cache-mb',
+        type=float,
+        default=256,
+        help='Memory budget of the --serve result cache in MB (default: 256)'
+    )
+    
+    parser.add_argument(
+        '--data-root',
+        default='.',
+        help='Directory the --serve input paths must lie in; relative paths are resolved '
+             'against it (default: current directory)'
+    )
+    
+    parser.add_argument(
+        '--range',
+        nargs='+',
+        metavar='START:END',
+        help='Statistics of the finished run over these date ranges; either side may be empty, '
+             'and a bare period such as 2020 or 2020Q1 covers that period'
+    )
+    
+    parser.add_argument(
+        '--range-output',
+        help='Output CSV file for the --range statistics (optional)'
+    )
+    
+    parser.add_argument(
+        '--results-db',
+        metavar='FILE',
+        help='SQLite database to record runs, statistics and trades in (created if missing)'
+    )
+    
+    parser.add_argument(
+        '--db-query',
+        metavar='QUERY',
+        help='Query --results-db instead of running a backtest: runs, best (best run per '
+             'instrument by --sort-by), trades, or an SQL SELECT statement'
+    )
+    
+    parser.add_argument(
+        '--instrument',
+        help='Instrument name recorded in --results-db (default: input file stem); '
+             'with --db-query, only this instrument'
+    )
+    
+    parser.add_argument(
+        '--since',
+        help='With --db-query runs/best, only runs on or after this date (YYYY-MM-DD)'
+    )
+    
+    parser.add_argument(
+        '--until',
+        help='With --db-query runs/best, only runs on or before this date (YYYY-MM-DD)'
+    )
+    
+    parser.add_argument(
+        '--db-output',
+        help='Output CSV file for the --db-query result (optional)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        metavar='JSON',
+        help='Record per-phase wall/CPU time and throughput to this JSON file'
+    )
+    
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='Also trace per-phase peak memory for --profile (tracemalloc; slows the run, '
+             'so its times are marked as traced)'
+    )
+    
+    parser.add_argument(
+        '--cprofile',
+        metavar='FILE',
+        help='Also dump cProfile stats to FILE and the hottest functions to FILE.txt'
+    )
+    
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        help='Worker processes for parallel modes (default: CPU count)'
+    )
+    
     args = parser.parse_args()
     
+    if args.db_query and not args.results_db:
+        parser.error("--db-query needs --results-db")
+    if (not args.input and not args.batch and not args.portfolio and not args.jobs and
+            args.serve is None and not args.db_query):
+        parser.error("one of the arguments --input/-i, --batch/-b, --portfolio, --jobs, --serve "
+                     "or --db-query is required")
+    if args.jobs and (args.input or args.batch or args.portfolio or args.checkpoint or args.sweep or
+                      args.walk_forward or args.serve is not None or args.strategy != [DEFAULT_STRATEGY]):
+        parser.error("--jobs cannot be combined with --input, --batch, --portfolio, --checkpoint, "
+                     "--sweep, --walk-forward, --serve or --strategy")
+    if args.portfolio and (args.input or args.batch or args.checkpoint or args.sweep or
+                           args.walk_forward or args.serve is not None):
+        parser.error("--portfolio cannot be combined with --input, --batch, --checkpoint, "
+                     "--sweep, --walk-forward or --serve")
+    if args.checkpoint and (args.batch or args.sweep or args.walk_forward or args.end or args.intraday):
+        parser.error("--checkpoint cannot be combined with --batch, --sweep, --walk-forward, --end or --intraday")
+    if args.batch and args.sort_by not in batch_sort_columns():
+        parser.error(f"Unknown --sort-by statistic: {args.sort_by}. "
+                     f"Expected one of {', '.join(batch_sort_columns())}")
+    args.strategy = [name for spec in args.strategy for name in (STRATEGIES if spec == 'all' else [spec])]
+    for spec in args.strategy:
+        try:
+            parse_strategy_spec(spec)
+        except ValueError as e:
+            parser.error(str(e))
+    if len(args.strategy) > 1 and args.portfolio:
+        parser.error("--portfolio runs a single --strategy")
+    if args.strategy != [DEFAULT_STRATEGY] and (args.checkpoint or args.batch or args.sweep or
+                                                args.walk_forward or args.serve is not None):
+        parser.error("--strategy cannot be combined with --checkpoint, --batch, --sweep, "
+                     "--walk-forward or --serve")
+    for spec in args.range or []:
+        try:
+            parse_date_range(spec)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.range and (args.batch or args.jobs or args.sweep or args.walk_forward or
+                       args.serve is not None or len(args.strategy) > 1):
+        parser.error("--range needs a single run (--input or --portfolio)")
+    if args.range and args.checkpoint:
+        # A resumed run only holds the trades since the checkpoint
+        parser.error("--range cannot be combined with --checkpoint")
+    if args.fractional_check and args.engine != 'fractional':
+        parser.error("--fractional-check needs --engine fractional")
+    if args.checkpoint and args.output and not trade_log_format(args.output).startswith('csv'):
+        parser.error("--checkpoint appends to the trade log, which needs a .csv, .csv.gz or .csv.zst --output")
+    
+    load_options = {
+        'cache_dir': None if args.no_cache else args.cache_dir,
+        'start': args.start,
+        'end': args.end,
+        'intraday': args.intraday,
+        'chunksize': args.chunk_size,
+        'date_format': args.date_format,
+        'compact': args.compact,
+    }
+    
+    profiler = PhaseProfiler(args.profile, args.cprofile, memory=args.profile_memory)
+    results_store = None
+    
     try:
         print("\n" + "="*70)
         print("NIFTY OHLC TRADING STRATEGY CALCULATOR")
         print("="*70)
         
+        if args.results_db:
+            results_store = ResultsStore(args.results_db, read_only=bool(args.db_query))
+        
+        if args.db_query:
+            if args.db_query in ResultsStore.QUERIES:
+                print(f"\nQuerying {args.db_query} from: {args.results_db}")
+            if args.db_query == 'runs':
+                table = results_store.runs(args.instrument, args.since, args.until)
+            elif args.db_query == 'best':
+                table = results_store.best(args.sort_by, args.instrument, args.since, args.until,
+                                           ascending=args.ascending)
+            elif args.db_query == 'trades':
+                table = results_store.trades(args.instrument, args.start, args.end)
+            else:
+                table = results_store.query(args.db_query)
+            
+            print("\n" + (table.to_string(index=False) if not table.empty else "No matching rows"))
+            print(f"\nRows: {len(table)}")
+            
+            if args.db_output:
+                table.to_csv(args.db_output, index=False)
+                print(f"\nQuery result saved to: {args.db_output}")
+            return
+        
+        if args.serve is not None:
+            server = BacktestServer(
+                workers=args.workers, cache_bytes=int(args.server_cache_mb * 2**20),
+                load_options=load_options,
+                defaults={'capital': args.capital, 'risk': args.risk, 'type': args.type},
+                data_root=args.data_root
+            )
+            if args.input:
+                entry = server.dataset(args.input)
+                print(f"\nPreloaded {entry['path']} ({entry['rows']} records)")
+            server.serve(args.host, args.serve)
+            return
+        
+        if args.batch:
+            files = find_batch_files(args.batch)
+            print(f"\nRunning batch over {len(files)} files...")
+            
+            with profiler.phase('run_batch') as counts:
+                summary, failures = run_batch(
+                    files, capital=args.capital, risk=args.risk, trade_type=args.type,
+                    workers=args.workers, engine=args.engine, sort_by=args.sort_by,
+                    ascending=args.ascending, trade_log_dir=args.trade_log_dir,
+                    load_options=load_options
+                )
+                counts['rows'] = int(summary['Bars'].sum()) if not summary.empty else 0
+            
+            for filepath, error in failures:
+                print(f"⚠️  Skipped {filepath}: {error}")
+            
+            if summary.empty:
+                raise ValueError("No file in the batch completed successfully")
+            
+            columns = ['Instrument', 'Bars', 'Total_Trades', 'Total_Return_Percent',
+                       'Win_Rate_Percent', 'Max_Drawdown_Percent', 'Sharpe_Ratio']
+            if args.sort_by not in columns:
+                columns.append(args.sort_by)
+            print("\n" + summary.reindex(columns=columns).to_string(index=False))
+            print(f"\nCompleted: {len(summary)} files, skipped: {len(failures)}")
+            if results_store:
+                results_store.record_table(summary, strategy=DEFAULT_STRATEGY, engine=args.engine,
+                                           trade_type=args.type, initial_capital=args.capital,
+                                           risk_per_trade=args.risk)
+                print(f"Recorded {len(summary)} runs (statistics only) in: {args.results_db}")
+            
+            if args.batch_output:
+                summary.to_csv(args.batch_output, index=False)
+                print(f"\nBatch summary saved to: {args.batch_output}")
+            
+            print("\n✅ Calculation completed successfully!")
+            return
+        
+        if args.jobs:
+            jobs = read_job_file(args.jobs, {'capital': args.capital, 'risk': args.risk, 'type': args.type})
+            inputs = len({str(Path(job['input']).resolve()) for job in jobs})
+            print(f"\nRunning {len(jobs)} jobs over {inputs} input files...")
+            
+            with profiler.phase('run_jobs') as counts:
+                summary, failures = run_jobs(jobs, engine=args.engine, load_options=load_options,
+                                             results_store=results_store)
+                counts['rows'] = int(summary['Bars'].sum()) if not summary.empty else 0
+            
+            for number, filepath, error in failures:
+                print(f"⚠️  Job {number} ({filepath}) failed: {error}")
+            
+            if summary.empty:
+                raise ValueError("No job completed successfully")
+            
+            columns = ['Job', 'Input', 'Capital', 'Risk_Per_Trade', 'Trade_Type', 'Total_Trades',
+                       'Total_Return_Percent', 'Win_Rate_Percent', 'Max_Drawdown_Percent', 'Sharpe_Ratio']
+            print("\n" + summary.reindex(columns=columns).to_string(index=False))
+            print(f"\nCompleted: {len(summary)} jobs, failed: {len(failures)}")
+            if results_store:
+                print(f"Recorded {len(summary)} runs in: {args.results_db}")
+            
+            if args.jobs_output:
+                summary.to_csv(args.jobs_output, index=False)
+                print(f"\nJob results saved to: {args.jobs_output}")
+            
+            print("\n✅ Calculation completed successfully!")
+            return
+        
+        if args.portfolio:
+            files = find_batch_files(args.portfolio)
+            print(f"\nLoading portfolio of {len(files)} files...")
+            
+            with profiler.phase('load_data') as counts:
+                datasets, failures = load_portfolio(files, load_options)
+                counts['rows'] = sum(len(df) for df in datasets.values())
+            for filepath, error in failures:
+                print(f"⚠️  Skipped {filepath}: {error}")
+            if not datasets:
+                raise ValueError("No file in the portfolio could be loaded")
+            
+            calculator = PortfolioCalculator(initial_capital=args.capital, risk_per_trade=args.risk)
+            with profiler.phase('run_portfolio') as counts:
+                calculator.run_portfolio(datasets, trade_type=args.type, strategy=args.strategy[0])
+                counts['rows'] = int(calculator.instrument_bars.sum())
+                counts['trades'] = len(calculator.trades)
+            
+            calculator.print_summary()
+            attribution = calculator.attribution().sort_values('PnL', ascending=False)
+            print("\n" + attribution.to_string(index=False))
+            if args.range:
+                print_range_statistics(calculator, args.range, args.range_output)
+            
+            if args.attribution_output:
+                attribution.to_csv(args.attribution_output, index=False)
+                print(f"\nAttribution saved to: {args.attribution_output}")
+            if results_store:
+                first_dates = [df['Date'].iloc[0] for df in datasets.values() if len(df)]
+                last_dates = [df['Date'].iloc[-1] for df in datasets.values() if len(df)]
+                results_store.record_run(
+                    calculator.calculate_statistics(), trades=calculator.trades,
+                    trade_instruments=np.asarray(calculator.instruments, dtype=object)[calculator.trade_instruments],
+                    instrument=args.instrument or 'PORTFOLIO', source=args.portfolio,
+                    strategy=args.strategy[0], engine='array', trade_type=args.type,
+                    initial_capital=args.capital, risk_per_trade=args.risk,
+                    bars=int(calculator.instrument_bars.sum()),
+                    start_date=min(first_dates, default=None), end_date=max(last_dates, default=None))
+                print(f"\nRun recorded in: {args.results_db}")
+            if args.output:
+                calculator.write_trade_log(args.output)
+            if args.summary:
+                calculator.save_summary(args.summary)
+            
+            print("\n✅ Calculation completed successfully!")
+            return
+        
         # Initialize calculator
         calculator = NiftyTradeCalculator(
             initial_capital=args.capital,
             risk_per_trade=args.risk
         )
         
-        # Load data
-        print(f"\nLoading data from: {args.input}")
-        df = calculator.load_data(args.input)
+        # Load data (only the newly appended rows when resuming)
+        df, resumed, append_log = None, False, False
+        if args.checkpoint and Path(args.checkpoint).exists():
+            df, append_log = calculator.resume_from_checkpoint(
+                args.checkpoint, args.input, args.type, trade_log=args.output,
+                date_format=args.date_format, engine=args.engine)
+            resumed = df is not None
+        
+        if df is None:
+            print(f"\nLoading data from: {args.input}")
+            with profiler.phase('load_data') as counts:
+                df = calculator.load_data(args.input, **load_options)
+                counts['rows'] = len(df)
+        
+        # Run columns for --results-db
+        run_meta = {
+            'instrument': args.instrument or Path(args.input).stem,
+            'source': str(args.input),
+            'engine': args.engine,
+            'trade_type': args.type,
+            'initial_capital': args.capital,
+            'risk_per_trade': args.risk,
+            # A resumed run only loaded the rows since the checkpoint
+            'bars': None if resumed else len(df),
+            'start_date': df['Date'].iloc[0] if len(df) and not resumed else None,
+            'end_date': df['Date'].iloc[-1] if len(df) else None,
+        }
+        
+        if args.walk_forward:
+            print(f"\nRunning {args.walk_forward}-year walk-forward windows every {args.wf_step} month(s)...")
+            with profiler.phase('walk_forward') as counts:
+                windows = walk_forward(
+                    df, window_years=args.walk_forward, step_months=args.wf_step,
+                    initial_capital=args.capital, risk_per_trade=args.risk,
+                    trade_type=args.type, tolerance=args.wf_tolerance
+                )
+                counts['rows'] = len(df)
+            if windows.empty:
+                raise ValueError(f"Data covers less than one {args.walk_forward}-year window")
+            
+            print("\n" + windows.to_string(index=False))
+            exact = (windows['Method'] == 'exact').mean()
+            print(f"\nWindows: {len(windows)} ({exact:.0%} simulated exactly, "
+                  f"{1 - exact:.0%} answered from prefix sums)")
+            if exact > 0.5:
+                print("Note: most windows were simulated exactly because the fractional model "
+                      "could not be matched within --wf-tolerance (Deviation_Bound inf: the "
+                      "integer engine trades differently once quantities round to zero)")
+            
+            if args.wf_output:
+                windows.to_csv(args.wf_output, index=False)
+                print(f"\nWalk-forward results saved to: {args.wf_output}")
+            
+            print("\n✅ Calculation completed successfully!")
+            return
+        
+        if args.sweep:
+            grid = parse_sweep_grid(args.sweep, {
+                'risk': args.risk, 'capital': args.capital, 'type': args.type
+            })
+            combinations = len(grid['risk']) * len(grid['capital']) * len(grid['type'])
+            print(f"\nRunning parameter sweep over {combinations} combinations...")
+            
+            with profiler.phase('run_sweep') as counts:
+                results = run_sweep(df, grid['risk'], grid['capital'], grid['type'],
+                                    workers=args.workers, engine=args.engine)
+                counts['rows'] = len(df) * combinations
+            
+            columns = ['Risk_Per_Trade', 'Capital', 'Trade_Type', 'Total_Trades',
+                       'Total_Return_Percent', 'Win_Rate_Percent', 'Max_Drawdown_Percent',
+                       'Sharpe_Ratio']
+            print("\n" + results.reindex(columns=columns).to_string(index=False))
+            
+            if args.sweep_output:
+                results.to_csv(args.sweep_output, index=False)
+                print(f"\nSweep results saved to: {args.sweep_output}")
+            if results_store:
+                results_store.record_table(results, strategy=DEFAULT_STRATEGY, **run_meta)
+                print(f"Recorded {len(results)} runs (statistics only) in: {args.results_db}")
+            
+            print("\n✅ Calculation completed successfully!")
+            return
+        
+        if len(args.strategy) > 1:
+            print(f"\nComparing {len(args.strategy)} strategies...")
+            
+            with profiler.phase('compare_strategies') as counts:
+                results = compare_strategies(df, args.strategy, initial_capital=args.capital,
+                                             risk_per_trade=args.risk, trade_type=args.type)
+                counts['rows'] = len(df) * len(args.strategy)
+            
+            columns = ['Strategy', 'Total_Trades', 'Total_Return_Percent', 'Win_Rate_Percent',
+                       'Max_Drawdown_Percent', 'Sharpe_Ratio', 'Profit_Factor']
+            print("\n" + results.reindex(columns=columns).to_string(index=False))
+            
+            if args.strategy_output:
+                results.to_csv(args.strategy_output, index=False)
+                print(f"\nStrategy comparison saved to: {args.strategy_output}")
+            if results_store:
+                results_store.record_table(results, **dict(run_meta, engine='array'))
+                print(f"Recorded {len(results)} runs (statistics only) in: {args.results_db}")
+            
+            print("\n✅ Calculation completed successfully!")
+            return
+        strategy = args.strategy[0]
+        
+        # Reuse a memoized result of the same data, parameters and code
+        result_cache = None
+        if args.cache_dir and not args.no_cache and not args.checkpoint:
+            result_cache = ResultCache(args.cache_dir, max_bytes=int(args.result_cache_mb * 2**20),
+                                       max_age_days=args.result_cache_days)
+            result_key = ResultCache.key(df, capital=args.capital, risk=args.risk, type=args.type,
+                                         strategy=strategy, fractional=args.engine == 'fractional')
+        need_trades = bool(args.output or args.monte_carlo or args.results_db or args.range)
         
         # Run strategy
-        calculator.run_strategy(df, trade_type=args.type)
+        with profiler.phase('run_strategy') as counts:
+            if result_cache and result_cache.load(result_key, calculator, need_trades):
+                print(f"\nResults loaded from result cache (key {result_key[:12]})")
+            else:
+                calculator.run_strategy(df, trade_type=args.type, engine=args.engine, resume=resumed,
+                                        strategy=strategy)
+                if result_cache:
+                    result_cache.store(result_key, calculator, with_trades=need_trades)
+            counts['rows'] = len(df)
+            counts['trades'] = len(calculator.trades)
+        
+        with profiler.phase('calculate_statistics') as counts:
+            stats = calculator.calculate_statistics()
+            counts['trades'] = calculator.stats.count
         
         # Generate outputs
         calculator.print_summary()
         
+        if args.range:
+            with profiler.phase('range_statistics') as counts:
+                print_range_statistics(calculator, args.range, args.range_output)
+                counts['trades'] = len(calculator.trades)
+        
+        if args.fractional_check:
+            with profiler.phase('fractional_check') as counts:
+                deviation = fractional_deviation(
+                    df['High'].to_numpy(dtype=np.float64), df['Low'].to_numpy(dtype=np.float64),
+                    calculator.initial_capital, calculator.risk_per_trade,
+                    trade_long=args.type in ['long', 'both'], trade_short=args.type in ['short', 'both'])
+                counts['rows'] = len(df)
+            worst_date = pd.Timestamp(df['Date'].iloc[deviation['Max_Deviation_Bar']]).strftime('%Y-%m-%d')
+            print("\nFractional vs exact integer-quantity engine:")
+            print(f"  Final capital (exact): ₹{deviation['Final_Capital_Exact']:,.2f}")
+            print(f"  Final capital deviation: {deviation['Final_Capital_Deviation_Percent']:.4f}%")
+            print(f"  Max equity deviation: {deviation['Max_Equity_Deviation_Percent']:.4f}% (on {worst_date})")
+        
         # Save trade log
         if args.output:
-            calculator.generate_trade_log(args.output)
+            with profiler.phase('generate_trade_log') as counts:
+                calculator.write_trade_log(args.output, append=append_log)
+                counts['trades'] = len(calculator.trades)
         
         # Save summary
         if args.summary:
-            calculator.save_summary(args.summary)
+            with profiler.phase('save_summary'):
+                calculator.save_summary(args.summary)
+        
+        if args.monte_carlo:
+            print(f"\nRunning {args.monte_carlo:,} Monte Carlo paths ({args.mc_method})...")
+            with profiler.phase('monte_carlo') as counts:
+                table = monte_carlo(
+                    calculator.trades, calculator.initial_capital, simulations=args.monte_carlo,
+                    method=args.mc_method, seed=args.seed, workers=args.workers
+                )
+                counts['trades'] = len(calculator.trades) * args.monte_carlo
+            print("\n" + table.to_string(float_format=lambda v: f"{v:,.2f}"))
+            
+            if args.mc_output:
+                table.to_csv(args.mc_output)
+                print(f"\nMonte Carlo percentiles saved to: {args.mc_output}")
+        
+        if results_store:
+            # A resumed run holds only the trades since the checkpoint while its
+            # statistics cover the whole run, so only the statistics are recorded
+            with profiler.phase('record_results') as counts:
+                run_id = results_store.record_run(stats, trades=None if resumed else calculator.trades,
+                                                  strategy=strategy, **run_meta)
+                counts['trades'] = 0 if resumed else len(calculator.trades)
+            print(f"\nRun {run_id} recorded in: {args.results_db}"
+                  f"{' (statistics only, resumed from checkpoint)' if resumed else ''}")
+        
+        if args.checkpoint:
+            calculator.save_checkpoint(args.checkpoint, args.input, args.type, trade_log=args.output,
+                                       engine=args.engine)
         
         print("\n✅ Calculation completed successfully!")
         
@@ -598,11 +5456,21 @@ Strategy Details:
     except ValueError as e:
         print(f"\n❌ Error: {e}")
         sys.exit(1)
+    except ImportError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
+    except PermissionError as e:
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if results_store:
+            results_store.close()
+        profiler.write(meta={key: value for key, value in vars(args).items() if value is not None})
 
 
 if __name__ == "__main__":
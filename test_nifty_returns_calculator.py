@@ -0,0 +1,355 @@
+"""
+Tests for the Nifty OHLC Trading Strategy Returns Calculator
+
+Run with: python -m pytest -q
+
+Author: SMBC Trading Analytics
+"""
+
+import contextlib
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import nifty_benchmark
+import nifty_returns_calculator as nrc
+
+HERE = Path(__file__).resolve().parent
+
+
+def load(path, **options):
+    """
+    Load a data file with load_data, discarding its progress output.
+    """
+    calculator = nrc.NiftyTradeCalculator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = calculator.load_data(path, **options)
+    return calculator, df
+
+
+@pytest.fixture(scope='module')
+def synthetic():
+    """
+    Seeded random-walk OHLC data with one bar per calendar day.
+    """
+    df = nifty_benchmark.generate_synthetic_ohlc(2000, seed=7)
+    df['Date'] = pd.date_range('2000-01-01', periods=len(df), freq='D')
+    return df
+
+
+@pytest.mark.parametrize('intraday', [False, True])
+def test_load_data_strips_spaces_after_separators(tmp_path, intraday):
+    path = tmp_path / 'spaced.csv'
+    path.write_text('Date, Open, High, Low, Close\n'
+                    ' 2020-01-01, 10, 12, 9, 11\n'
+                    ' 2020-01-02, 11, 13, 10, 12\n'
+                    ' 2020-01-03, 12, 14, 11, 13\n')
+
+    calculator, df = load(path, intraday=intraday)
+
+    assert list(df['Date']) == list(pd.date_range('2020-01-01', periods=3))
+    assert list(df['Close']) == [11.0, 12.0, 13.0]
+    assert calculator.load_info['date_failures'] == 0
+
+
+def _heavy_modules_after(code):
+    """
+    Run ``code`` in a fresh interpreter; return which of numpy/pandas it imported.
+    """
+    probe = (f"import sys\n{code}\n"
+             "print(','.join(name for name in ('numpy', 'pandas') if name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', probe], cwd=HERE, capture_output=True,
+                            text=True, check=True)
+    return result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+
+def test_import_does_not_load_numpy_or_pandas():
+    assert _heavy_modules_after("import nifty_returns_calculator") == ''
+
+
+def test_help_does_not_load_numpy_or_pandas():
+    code = ("import contextlib, io, nifty_returns_calculator\n"
+            "sys.argv = ['nifty_returns_calculator.py', '--help']\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    try:\n"
+            "        nifty_returns_calculator.main()\n"
+            "    except SystemExit:\n"
+            "        pass")
+    assert _heavy_modules_after(code) == ''
+
+
+def _window_reference(df, start, end, capital, risk, trade_type):
+    """
+    Statistics of one walk-forward window from a full simulate_high_low run.
+    """
+    dates = df['Date'].to_numpy()
+    lo, hi = dates.searchsorted([pd.Timestamp(start).to_datetime64(),
+                                 (pd.Timestamp(end) + pd.Timedelta(days=1)).to_datetime64()])
+    calculator = nrc.NiftyTradeCalculator(initial_capital=capital, risk_per_trade=risk)
+    _, calculator.current_capital = nrc.simulate_high_low(
+        df['High'].to_numpy()[lo:hi], df['Low'].to_numpy()[lo:hi], capital, risk,
+        trade_long=trade_type != 'short', trade_short=trade_type != 'long', store=calculator.trades)
+    stats = calculator.calculate_statistics()
+    return {
+        'Total_Trades': stats.get('Total_Trades', 0),
+        'Total_Return_Percent': (calculator.current_capital / capital - 1) * 100,
+        'Win_Rate_Percent': stats.get('Win_Rate_Percent', 0),
+        'Max_Drawdown_Percent': stats.get('Max_Drawdown_Percent', 0.0),
+        'Sharpe_Ratio': stats.get('Sharpe_Ratio', float('nan')),
+    }
+
+
+@pytest.mark.parametrize('capital, trade_type', [(1e5, 'both'), (1e14, 'long')])
+def test_walk_forward_matches_full_simulation_per_window(synthetic, capital, trade_type):
+    windows = nrc.walk_forward(synthetic, window_years=2, step_months=6, initial_capital=capital,
+                               trade_type=trade_type)
+
+    assert not windows.empty
+    for row in windows.itertuples():
+        expected = _window_reference(synthetic, row.Window_Start, row.Window_End, capital, 0.02, trade_type)
+        assert row.Total_Trades == expected['Total_Trades']
+        assert row.Win_Rate_Percent == expected['Win_Rate_Percent']
+        if row.Method == 'exact':
+            assert row.Total_Return_Percent == expected['Total_Return_Percent']
+            assert row.Max_Drawdown_Percent == expected['Max_Drawdown_Percent']
+        else:
+            for key in ('Total_Return_Percent', 'Max_Drawdown_Percent'):
+                assert abs(getattr(row, key) - expected[key]) / 100 <= row.Deviation_Bound
+            assert row.Sharpe_Ratio == pytest.approx(expected['Sharpe_Ratio'], rel=1e-9)
+
+
+def run(df, **options):
+    """
+    Run the strategy on ``df``, discarding its progress output.
+    """
+    calculator = nrc.NiftyTradeCalculator()
+    with contextlib.redirect_stdout(io.StringIO()):
+        calculator.run_strategy(df, **options)
+    return calculator
+
+
+@pytest.mark.parametrize('trade_type', ['both', 'long', 'short'])
+def test_array_engine_matches_row_loop(synthetic, trade_type):
+    array = run(synthetic, trade_type=trade_type, engine='array')
+    rows = run(synthetic, trade_type=trade_type, engine='rows')
+
+    assert len(array.trades) > 0
+    pd.testing.assert_frame_equal(array.trades.to_frame(), rows.trades.to_frame())
+    assert array.current_capital == rows.current_capital
+    # The array engine feeds the accumulator in batches, the row loop one
+    # trade at a time, so the moments may differ in the last bits
+    assert array.calculate_statistics() == pytest.approx(rows.calculate_statistics(), rel=1e-12)
+
+
+def _reference_statistics(trades, initial_capital, final_capital):
+    """
+    calculate_statistics recomputed from the whole trade log with pandas.
+    """
+    winning = trades[trades['PnL'] > 0]
+    losing = trades[trades['PnL'] < 0]
+    num_wins, num_losses = len(winning), len(losing)
+    win_rate = num_wins / len(trades) * 100
+    avg_win = winning['PnL'].mean() if num_wins else 0
+    avg_loss = losing['PnL'].mean() if num_losses else 0
+    running_max = trades['Capital_After'].cummax()
+    returns = trades['PnL_Percent']
+    std = returns.std()
+    total_wins = winning['PnL'].sum() if num_wins else 0
+    total_losses = abs(losing['PnL'].sum()) if num_losses else 1
+    return {
+        'Initial_Capital': initial_capital,
+        'Final_Capital': final_capital,
+        'Total_Return': final_capital - initial_capital,
+        'Total_Return_Percent': (final_capital - initial_capital) / initial_capital * 100,
+        'Total_Trades': len(trades),
+        'Winning_Trades': num_wins,
+        'Losing_Trades': num_losses,
+        'Win_Rate_Percent': win_rate,
+        'Average_Win': avg_win,
+        'Average_Loss': avg_loss,
+        'Largest_Win': winning['PnL'].max() if num_wins else 0,
+        'Largest_Loss': losing['PnL'].min() if num_losses else 0,
+        'Average_Trade_Return_Percent': returns.mean(),
+        'Max_Drawdown_Percent': ((trades['Capital_After'] - running_max) / running_max * 100).min(),
+        'Sharpe_Ratio': returns.mean() / std * np.sqrt(252) if std != 0 else 0,
+        'Profit_Factor': total_wins / total_losses if total_losses != 0 else float('inf'),
+        'Expectancy': win_rate / 100 * avg_win - (100 - win_rate) / 100 * abs(avg_loss),
+    }
+
+
+@pytest.mark.parametrize('engine, strategy', [('array', 'high_low'), ('rows', 'high_low'),
+                                              ('array', 'open_close')])
+def test_statistics_match_full_trade_log(synthetic, engine, strategy):
+    calculator = run(synthetic, engine=engine, strategy=strategy)
+    trades = calculator.trades.to_frame()
+    expected = _reference_statistics(trades, calculator.initial_capital, calculator.current_capital)
+
+    assert calculator.calculate_statistics() == pytest.approx(expected, rel=1e-9)
+
+
+def _random_trades(n, seed):
+    """
+    Compounded trades with wins, losses and flat trades in random order.
+    """
+    rng = np.random.default_rng(seed)
+    pnl_percent = rng.normal(0.05, 1.5, n).round(2)
+    capital_after = 100000.0 * np.cumprod(1 + pnl_percent / 100)
+    pnl = capital_after - np.concatenate([[100000.0], capital_after[:-1]])
+    pnl[pnl_percent == 0] = 0.0
+    return pnl, pnl_percent, capital_after
+
+
+@pytest.mark.parametrize('batches', [None, [5000], [1, 0, 17, 400, 4582], [2500, 2500]])
+def test_accumulator_matches_numpy(batches):
+    pnl, pnl_percent, capital_after = _random_trades(5000, seed=3)
+    accumulator = nrc.TradeStatsAccumulator()
+    if batches is None:
+        for trade in zip(pnl, pnl_percent, capital_after):
+            accumulator.update(*trade)
+    else:
+        for lo, hi in zip(np.cumsum([0] + batches[:-1]), np.cumsum(batches)):
+            accumulator.update_arrays(pnl[lo:hi], pnl_percent[lo:hi], capital_after[lo:hi])
+
+    running_max = np.maximum.accumulate(capital_after)
+    assert (accumulator.count, accumulator.wins, accumulator.losses) == \
+        (len(pnl), (pnl > 0).sum(), (pnl < 0).sum())
+    assert (pnl == 0).any()
+    assert accumulator.gross_profit == pytest.approx(pnl[pnl > 0].sum(), rel=1e-12)
+    assert accumulator.gross_loss == pytest.approx(pnl[pnl < 0].sum(), rel=1e-12)
+    assert accumulator.largest_win == pnl.max()
+    assert accumulator.largest_loss == pnl.min()
+    assert accumulator.mean == pytest.approx(pnl_percent.mean(), rel=1e-12)
+    assert accumulator.std == pytest.approx(pnl_percent.std(ddof=1), rel=1e-12)
+    assert accumulator.peak == capital_after.max()
+    assert accumulator.max_drawdown == pytest.approx(
+        ((capital_after - running_max) / running_max).min() * 100, rel=1e-12)
+
+    restored = nrc.TradeStatsAccumulator.from_state(accumulator.state())
+    assert restored.state() == accumulator.state()
+
+
+def run_cli(monkeypatch, *args):
+    """
+    Run main() with the given command-line arguments and return its output.
+    """
+    monkeypatch.setattr(sys, 'argv', ['nifty_returns_calculator.py', *map(str, args)])
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        nrc.main()
+    return output.getvalue()
+
+
+def test_resume_after_appended_rows_matches_full_run(synthetic, tmp_path, monkeypatch):
+    frame = synthetic[['Date', 'Open', 'High', 'Low', 'Close']]
+    full, growing = tmp_path / 'full.csv', tmp_path / 'growing.csv'
+    frame.to_csv(full, index=False, date_format='%Y-%m-%d')
+    frame.iloc[:1200].to_csv(growing, index=False, date_format='%Y-%m-%d')
+
+    run_cli(monkeypatch, '--input', full, '--output', tmp_path / 'full_trades.csv',
+            '--summary', tmp_path / 'full_summary.txt')
+    resumed = ['--input', growing, '--output', tmp_path / 'trades.csv',
+               '--summary', tmp_path / 'summary.txt', '--checkpoint', tmp_path / 'state.json']
+    run_cli(monkeypatch, *resumed)
+    for lo, hi in [(1200, 1201), (1201, 1700), (1700, len(frame))]:
+        frame.iloc[lo:hi].to_csv(growing, mode='a', header=False, index=False, date_format='%Y-%m-%d')
+        output = run_cli(monkeypatch, *resumed)
+        assert f"New records: {hi - lo} " in output
+
+    assert (tmp_path / 'trades.csv').read_text() == (tmp_path / 'full_trades.csv').read_text()
+    assert (tmp_path / 'summary.txt').read_text() == (tmp_path / 'full_summary.txt').read_text()
+
+
+@pytest.fixture(scope='module')
+def minute_bars():
+    """
+    Seeded 09:15-15:29 minute bars, 375 per session, plus a short final session.
+    """
+    sessions = pd.bdate_range('2021-01-04', periods=8)
+    stamps = [day + pd.Timedelta(hours=9, minutes=15 + minute)
+              for day in sessions for minute in range(375)] + \
+             [sessions[-1] + pd.Timedelta(days=1, hours=9, minutes=15 + minute) for minute in range(100)]
+    df = nifty_benchmark.generate_synthetic_ohlc(len(stamps), seed=11)
+    df['Date'] = stamps
+    return df
+
+
+@pytest.mark.parametrize('chunksize', [37, 374, 375, 376, 749, 750, 751, 3100, nrc.INTRADAY_CHUNK_ROWS])
+def test_intraday_chunks_match_daily_groupby(minute_bars, tmp_path, chunksize):
+    path = tmp_path / 'minutes.csv'
+    minute_bars.to_csv(path, index=False, date_format='%Y-%m-%d %H:%M')
+    expected = minute_bars.groupby(minute_bars['Date'].dt.normalize()).agg(
+        Open=('Open', 'first'), High=('High', 'max'), Low=('Low', 'min'), Close=('Close', 'last'))
+    expected = expected.rename_axis('Date').reset_index()
+
+    _, df = load(path, intraday=True, chunksize=chunksize)
+
+    assert len(df) == 9
+    pd.testing.assert_frame_equal(df[['Date', 'Open', 'High', 'Low', 'Close']], expected,
+                                  check_dtype=False)
+
+
+def _sliced_range_statistics(trades, start, end):
+    """
+    TradeRangeIndex.query recomputed from the trades sliced to [start, end].
+    """
+    sliced = trades[(trades['Date'] >= pd.Timestamp(start)) & (trades['Date'] <= pd.Timestamp(end))]
+    if sliced.empty:
+        return {'First_Trade': pd.NaT, 'Last_Trade': pd.NaT, 'Total_Trades': 0,
+                'Max_Drawdown_Percent': 0.0}
+    starting = sliced['Capital_After'].iloc[0] - sliced['PnL'].iloc[0]
+    ending = sliced['Capital_After'].iloc[-1]
+    equity = np.concatenate([[starting], sliced['Capital_After']])
+    running_max = np.maximum.accumulate(equity)
+    returns = sliced['PnL_Percent']
+    std = returns.std()
+    wins, losses = (sliced['PnL'] > 0).sum(), (sliced['PnL'] < 0).sum()
+    total_losses = abs(sliced['PnL'][sliced['PnL'] < 0].sum()) if losses else 1
+    return {
+        'First_Trade': sliced['Date'].iloc[0],
+        'Last_Trade': sliced['Date'].iloc[-1],
+        'Total_Trades': len(sliced),
+        'Winning_Trades': wins,
+        'Losing_Trades': losses,
+        'Win_Rate_Percent': wins / len(sliced) * 100,
+        'Starting_Capital': starting,
+        'Ending_Capital': ending,
+        'Total_Return': ending - starting,
+        'Total_Return_Percent': (ending - starting) / starting * 100,
+        'Average_Trade_Return_Percent': returns.mean(),
+        'Max_Drawdown_Percent': ((equity - running_max) / running_max).min() * 100,
+        'Sharpe_Ratio': returns.mean() / std * np.sqrt(252) if std != 0 else 0,
+        'Profit_Factor': sliced['PnL'][sliced['PnL'] > 0].sum() / total_losses,
+    }
+
+
+@pytest.mark.parametrize('trade_type, strategy', [('both', 'high_low'), ('long', 'high_low'),
+                                                  ('both', 'open_close')])
+def test_trade_range_index_matches_slicing(synthetic, trade_type, strategy):
+    calculator = run(synthetic, trade_type=trade_type, strategy=strategy)
+    trades = calculator.trades.to_frame()
+    index = nrc.TradeRangeIndex(calculator.trades)
+    rng = np.random.default_rng(5)
+    dates = synthetic['Date']
+    ranges = [(dates.iloc[0], dates.iloc[-1]), (dates.iloc[500], dates.iloc[500]),
+              (dates.iloc[1998], dates.iloc[1999])]
+    ranges += [tuple(dates.iloc[sorted(rng.choice(len(dates), 2, replace=False))]) for _ in range(20)]
+
+    for start, end in ranges:
+        expected = _sliced_range_statistics(trades, start, end)
+        result = index.query(start, end)
+        for key in ('First_Trade', 'Last_Trade'):
+            got, want = result.pop(key), expected.pop(key)
+            assert got == want or (pd.isna(got) and pd.isna(want))
+        assert {key: result[key] for key in expected} == \
+            pytest.approx(expected, rel=1e-9, abs=1e-9, nan_ok=True)
+
+    table = calculator.range_statistics(ranges)
+    assert list(table['Total_Trades']) == [index.query(start, end)['Total_Trades'] for start, end in ranges]
+
+    empty = index.query('1990-01-01', '1999-12-31')
+    assert (empty['Total_Trades'], empty['Max_Drawdown_Percent']) == (0, 0.0)